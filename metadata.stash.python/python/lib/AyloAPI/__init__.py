@@ -10,17 +10,30 @@ Supports scraping from Aylo/MindGeek network sites including:
 - Primal Fetish Network
 """
 
+import copy
 import json
 import ssl
 import sys
+import threading
+import time
 import xbmc
+from collections import OrderedDict
+
+try:
+    from ..py_common.jsonstream import JSONArrayStream
+    from ..py_common import metrics, timing
+except (ImportError, ValueError):
+    from py_common.jsonstream import JSONArrayStream
+    from py_common import metrics, timing
+
+from . import images as aylo_images
 
 try:
     from urllib import urlencode
-    from urllib2 import Request, urlopen, HTTPError, URLError
+    from urllib2 import Request, HTTPError, URLError
 except ImportError:  # py2 / py3
     from urllib.parse import urlencode
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
     from urllib.error import HTTPError, URLError
 
 
@@ -30,6 +43,18 @@ class AyloAPI:
     # Base API URL
     API_BASE = "https://site-api.project1service.com/v2"
     
+    # Scene IDs per batched list request (get_scenes)
+    BATCH_SIZE = 50
+    
+    # Parsed scenes kept across invocations, shared by all instances
+    SCENE_CACHE_SIZE = 500
+    SCENE_CACHE_TTL = 1800
+    _scene_cache = OrderedDict()  # (API_BASE, authenticated, id) -> (expires, scene)
+    _scene_cache_lock = threading.Lock()
+    
+    # Local mirror of the site scene lists (catalog.SceneCatalog), or None
+    catalog = None
+    
     # Authentication endpoints for different sites
     AUTH_ENDPOINTS = {
         'primalfetish': 'https://www.primalfetishnetwork.com/api/auth/login',
@@ -106,7 +131,8 @@ class AyloAPI:
             }
             
             request = Request(auth_url, data=login_data, headers=headers)
-            response = urlopen(request, timeout=30, context=self.ssl_context)
+            response = timing.urlopen(request, timeout=30, context=self.ssl_context,
+                                      scraper='aylo', operation='login')
             result = json.loads(response.read().decode('utf-8'))
             
             # Extract token from response
@@ -126,8 +152,8 @@ class AyloAPI:
             xbmc.log("AyloAPI: Login error - {}".format(str(e)), xbmc.LOGERROR)
             return False
     
-    def _make_request(self, endpoint, params=None):
-        """Make API request"""
+    def _open_request(self, endpoint, params=None):
+        """Open an API request; returns the response, or an error dict"""
         try:
             url = "{}/{}".format(self.API_BASE, endpoint)
             if params:
@@ -143,8 +169,8 @@ class AyloAPI:
                 headers['Authorization'] = 'Bearer {}'.format(self.auth_token)
             
             request = Request(url, headers=headers)
-            response = urlopen(request, timeout=30, context=self.ssl_context)
-            return json.loads(response.read().decode('utf-8'))
+            return timing.urlopen(request, timeout=30, context=self.ssl_context, scraper='aylo',
+                                  operation=timing.operation_from_url(endpoint))
             
         except HTTPError as e:
             xbmc.log("AyloAPI HTTP Error {}: {}".format(e.code, e.reason), xbmc.LOGERROR)
@@ -153,8 +179,45 @@ class AyloAPI:
             xbmc.log("AyloAPI Error: {}".format(str(e)), xbmc.LOGERROR)
             return {'error': str(e)}
     
+    def _make_request(self, endpoint, params=None):
+        """Make API request"""
+        response = self._open_request(endpoint, params)
+        if isinstance(response, dict):
+            return response
+        
+        try:
+            # json.loads accepts bytes directly - no decoded str copy of the body
+            return json.loads(response.read())
+        except Exception as e:
+            xbmc.log("AyloAPI Error: {}".format(str(e)), xbmc.LOGERROR)
+            return {'error': str(e)}
+        finally:
+            response.close()
+    
+    def _stream_list(self, endpoint, params, parse):
+        """
+        Make a list request and parse the ``data`` array item by item as it
+        arrives, so large result pages are never held in memory as a whole.
+        """
+        response = self._open_request(endpoint, params)
+        if isinstance(response, dict):
+            return response
+        
+        stream = JSONArrayStream(response, ('data',))
+        try:
+            return [parse(item) for item in stream]
+        except Exception as e:
+            xbmc.log("AyloAPI Error: {}".format(str(e)), xbmc.LOGERROR)
+            return {'error': str(e)}
+        finally:
+            stream.close()
+    
     def search_scenes(self, query, domains=None):
         """Search for scenes across domains"""
+        local = self._catalog_search(query, domains)
+        if local:
+            return local
+        
         params = {
             'search': query,
             'limit': 20
@@ -163,25 +226,182 @@ class AyloAPI:
         if domains:
             params['sites'] = ','.join([self.DOMAIN_MAP.get(d, d) for d in domains])
         
-        result = self._make_request('scenes', params)
-        
-        if 'error' in result:
-            return result
-        
-        scenes = []
-        for item in result.get('data', []):
-            scenes.append(self._parse_scene_summary(item))
-        
-        return scenes
+        return self._stream_list('scenes', params, self._parse_scene_summary)
     
     def get_scene(self, scene_id):
         """Get detailed scene information"""
+        cached = self._cached_scene(scene_id)
+        if cached is None:
+            cached = self._catalog_scene(scene_id)
+        if cached is not None:
+            return cached
+        
+        # Bulk refreshes: scenes listed next to this one in the local mirror
+        # are likely asked for next, so fetch them in the same request
+        neighbours = self._catalog_neighbours(scene_id)
+        if neighbours:
+            scene = self.get_scenes([scene_id] + neighbours).get(str(scene_id))
+            if scene is not None and 'error' not in scene:
+                return scene
+        
         result = self._make_request('scenes/{}'.format(scene_id))
         
         if 'error' in result:
             return result
         
-        return self._parse_scene_detail(result.get('data', {}))
+        scene = self._parse_scene_detail(result.get('data', {}))
+        self._cache_scene(scene_id, copy.deepcopy(scene))
+        self._catalog_add_details([scene])
+        return scene
+    
+    def get_scenes(self, scene_ids, batch_size=None):
+        """
+        Get detailed information for many scenes with few requests.
+        
+        IDs not in the scene cache are fetched ``batch_size`` at a time from
+        the list endpoint's ``id`` filter; the scenes returned are cached, so
+        a later get_scene for one of them needs no request.
+        
+        Returns:
+            dict: scene id -> parsed scene, or {'error': ...} for IDs that
+            were not returned or whose batch failed
+        """
+        ids = []
+        for scene_id in scene_ids:
+            scene_id = str(scene_id)
+            if scene_id and scene_id not in ids:
+                ids.append(scene_id)
+        
+        results = {}
+        missing = []
+        for scene_id in ids:
+            cached = self._cached_scene(scene_id)
+            if cached is None:
+                cached = self._catalog_scene(scene_id)
+            if cached is not None:
+                results[scene_id] = cached
+            else:
+                missing.append(scene_id)
+        
+        batch_size = batch_size or self.BATCH_SIZE
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            params = {'id': ','.join(batch), 'limit': len(batch)}
+            scenes = self._stream_list('scenes', params, self._parse_scene_detail)
+            if isinstance(scenes, dict):
+                for scene_id in batch:
+                    results[scene_id] = scenes
+                continue
+            
+            # The API ignores the order of the ID filter; match results by ID
+            found = dict((scene['id'], scene) for scene in scenes)
+            for scene_id in batch:
+                scene = found.get(scene_id)
+                if scene is None:
+                    results[scene_id] = {'error': 'Scene not found'}
+                else:
+                    self._cache_scene(scene_id, copy.deepcopy(scene))
+                    results[scene_id] = scene
+            self._catalog_add_details([found[scene_id] for scene_id in batch if scene_id in found])
+        
+        xbmc.log("AyloAPI: {} scenes, {} from cache, {} requests".format(
+            len(ids), len(ids) - len(missing), (len(missing) + batch_size - 1) // batch_size), xbmc.LOGDEBUG)
+        return results
+    
+    @classmethod
+    def clear_scene_cache(cls):
+        with cls._scene_cache_lock:
+            cls._scene_cache.clear()
+    
+    def _scene_key(self, scene_id):
+        return (self.API_BASE, bool(self.auth_token), str(scene_id))
+    
+    def _cached_scene(self, scene_id):
+        """Copy of a cached parsed scene, or None"""
+        key = self._scene_key(scene_id)
+        with self._scene_cache_lock:
+            entry = self._scene_cache.pop(key, None)
+            if entry is not None and entry[0] < time.time():
+                entry = None
+            if entry is not None:
+                self._scene_cache[key] = entry
+        metrics.CACHE.inc(cache='aylo_scenes', result='miss' if entry is None else 'hit')
+        # Postprocessing must not change the cached scene
+        return copy.deepcopy(entry[1]) if entry is not None else None
+    
+    def _cache_scene(self, scene_id, scene):
+        with self._scene_cache_lock:
+            self._scene_cache.pop(self._scene_key(scene_id), None)
+            self._scene_cache[self._scene_key(scene_id)] = (time.time() + self.SCENE_CACHE_TTL, scene)
+            while len(self._scene_cache) > self.SCENE_CACHE_SIZE:
+                self._scene_cache.popitem(last=False)
+    
+    @classmethod
+    def attach_catalog(cls, catalog):
+        """Answer searches and details from ``catalog`` when fresh; None detaches it"""
+        cls.catalog = catalog
+    
+    def _catalog_search(self, query, domains):
+        """
+        Search results from the local mirror, or None to search live.
+        
+        Stale sites, and sites whose older scenes are not all mirrored yet,
+        are synced in the background and searched live until the sync is
+        done; a partial mirror could return a similar newer title instead
+        of the scene searched for. A fresh, complete mirror without a match
+        is searched live too, for scenes released since the last sync.
+        """
+        catalog = self.catalog
+        if catalog is None or not domains or self.auth_token:
+            return None
+        sites = sorted(set(self.DOMAIN_MAP.get(d, d) for d in domains))
+        if not catalog.is_fresh(sites) or not catalog.is_complete(sites):
+            catalog.sync_in_background(AyloAPI(), sites)
+            metrics.CACHE.inc(cache='aylo_catalog', result='stale')
+            return None
+        try:
+            results = catalog.search(query, sites)
+        except Exception as e:
+            xbmc.log("AyloAPI catalog search error: {}".format(str(e)), xbmc.LOGWARNING)
+            results = None
+        metrics.CACHE.inc(cache='aylo_catalog', result='hit' if results else 'miss')
+        return results
+    
+    def _catalog_scene(self, scene_id):
+        """Parsed scene from the local mirror, or None; premium logins always fetch live"""
+        catalog = self.catalog
+        if catalog is None or self.auth_token:
+            return None
+        try:
+            scene = catalog.get_scene(scene_id)
+        except Exception as e:
+            xbmc.log("AyloAPI catalog lookup error: {}".format(str(e)), xbmc.LOGWARNING)
+            return None
+        if scene is not None:
+            metrics.CACHE.inc(cache='aylo_catalog', result='hit')
+            self._cache_scene(scene_id, copy.deepcopy(scene))
+        return scene
+    
+    def _catalog_neighbours(self, scene_id):
+        """IDs of mirrored scenes without details released around ``scene_id``, for one batch"""
+        catalog = self.catalog
+        if catalog is None or self.auth_token:
+            return []
+        try:
+            return catalog.incomplete_near(scene_id, self.BATCH_SIZE - 1)
+        except Exception as e:
+            xbmc.log("AyloAPI catalog lookup error: {}".format(str(e)), xbmc.LOGWARNING)
+            return []
+    
+    def _catalog_add_details(self, scenes):
+        """Store batch-fetched details in the local mirror, for scenes it lists"""
+        catalog = self.catalog
+        if catalog is None or self.auth_token or not scenes:
+            return
+        try:
+            catalog.add_details(scenes)
+        except Exception as e:
+            xbmc.log("AyloAPI catalog update error: {}".format(str(e)), xbmc.LOGWARNING)
     
     def get_scene_by_url(self, url):
         """Get scene by URL"""
@@ -202,16 +422,7 @@ class AyloAPI:
         if domains:
             params['sites'] = ','.join([self.DOMAIN_MAP.get(d, d) for d in domains])
         
-        result = self._make_request('models', params)
-        
-        if 'error' in result:
-            return result
-        
-        performers = []
-        for item in result.get('data', []):
-            performers.append(self._parse_performer_summary(item))
-        
-        return performers
+        return self._stream_list('models', params, self._parse_performer_summary)
     
     def get_performer(self, performer_id):
         """Get detailed performer information"""
@@ -259,6 +470,8 @@ class AyloAPI:
                 'image': self._get_best_image(p.get('images', {}))
             })
         
+        images, previews = aylo_images.select_images(data.get('images', {}))
+        
         return {
             'id': str(data.get('id', '')),
             'title': data.get('title', 'Untitled'),
@@ -273,7 +486,8 @@ class AyloAPI:
             },
             'tags': tags,
             'performers': performers,
-            'images': self._get_all_images(data.get('images', {}))
+            'images': images,
+            'previews': previews
         }
     
     def _parse_performer_summary(self, data):
@@ -296,43 +510,12 @@ class AyloAPI:
         }
     
     def _get_best_image(self, images):
-        """Get the best quality image from images dict"""
-        if not images:
-            return ''
-        
-        # Priority: poster > listing > thumb
-        for key in ['poster', 'listing', 'thumb', 'screenshot']:
-            if key in images and images[key]:
-                img = images[key]
-                if isinstance(img, list) and img:
-                    return img[0].get('url', '') if isinstance(img[0], dict) else str(img[0])
-                elif isinstance(img, dict):
-                    return img.get('url', '')
-                elif isinstance(img, str):
-                    return img
-        
-        return ''
+        """Preview-size variant of the first poster, listing, thumb or screenshot image"""
+        return aylo_images.best_image(images)
     
     def _get_all_images(self, images):
-        """Get all images from images dict"""
-        all_imgs = []
-        if not images:
-            return all_imgs
-        
-        for _, value in images.items():
-            if isinstance(value, list):
-                for img in value:
-                    url = img.get('url', '') if isinstance(img, dict) else str(img)
-                    if url:
-                        all_imgs.append(url)
-            elif isinstance(value, dict):
-                url = value.get('url', '')
-                if url:
-                    all_imgs.append(url)
-            elif isinstance(value, str) and value:
-                all_imgs.append(value)
-        
-        return all_imgs
+        """One full-size URL per distinct image"""
+        return aylo_images.select_images(images)[0]
 
 
 # Global API instance
@@ -374,6 +557,30 @@ def scene_search(name, search_domains=None, postprocess=None):
     return result
 
 
+def scenes_from_ids(scene_ids, postprocess=None):
+    """
+    Get many scenes by ID with batched requests, for bulk refreshes and
+    cache warm-up. Returns a dict of scene id -> scene or {'error': ...};
+    a failure affects only the scenes it belongs to.
+    """
+    try:
+        results = _api.get_scenes(scene_ids)
+    except Exception as e:
+        xbmc.log("AyloAPI batch details error: {}".format(str(e)), xbmc.LOGERROR)
+        return dict((str(scene_id), {'error': str(e)}) for scene_id in scene_ids)
+    
+    if postprocess:
+        for scene_id, result in results.items():
+            if not isinstance(result, dict) or 'error' not in result:
+                try:
+                    results[scene_id] = postprocess(result, _api)
+                except Exception as e:
+                    xbmc.log("AyloAPI postprocess error for scene {}: {}".format(scene_id, str(e)), xbmc.LOGERROR)
+                    results[scene_id] = {'error': str(e)}
+    
+    return results
+
+
 def scene_from_url(url, postprocess=None):
     """Get scene from URL"""
     result = _api.get_scene_by_url(url)
@@ -0,0 +1,387 @@
+"""
+Aylo Scene Catalog
+Local mirror of the Aylo network scene lists, kept in SQLite
+
+Each site's scene list is paged newest first (``orderBy=-dateReleased``) and
+stored as one compact record per scene. A sync reads at most ``max_pages``
+pages: first the scenes released since the newest one stored, then older
+pages continuing where the previous sync stopped (the backfill), until a
+short page shows the whole site is mirrored. Keeping a complete mirror
+current then costs a page or two a day instead of one live search per lookup.
+
+Scene details are answered from the mirror while a site's last sync is
+younger than ``max_age``. Searches are answered from it only once the site
+is also complete, since a partial mirror can hold a similar newer title but
+miss the scene searched for. Stale and incomplete sites are synced on a
+background thread and searched live in the meantime.
+"""
+
+import difflib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import xbmc
+from contextlib import closing
+
+try:
+    from ..py_common import metrics
+except (ImportError, ValueError):
+    from py_common import metrics
+
+DEFAULT_MAX_AGE = 24 * 3600
+DEFAULT_MAX_PAGES = 50
+PAGE_SIZE = 100
+CANDIDATES = 200
+# Scenes the backfill re-reads above where it stopped, in case scenes were
+# removed from the site since and the older ones moved up the list
+BACKFILL_OVERLAP = 10
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS scenes (
+        id TEXT PRIMARY KEY,
+        site TEXT NOT NULL,
+        title_key TEXT NOT NULL,
+        release_date TEXT NOT NULL,
+        complete INTEGER NOT NULL,
+        record BLOB NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS scenes_site_date ON scenes (site, release_date)",
+    """CREATE TABLE IF NOT EXISTS sync_state (
+        site TEXT PRIMARY KEY,
+        newest TEXT NOT NULL,
+        synced REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS backfill (
+        site TEXT PRIMARY KEY,
+        next_offset INTEGER NOT NULL,
+        complete INTEGER NOT NULL
+    )""",
+)
+
+
+def title_key(title):
+    """Lower-case words only, the form titles are searched in"""
+    return ' '.join(WORD.findall((title or '').lower()))
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("AyloAPI catalog: {}".format(msg), level)
+
+
+class SceneCatalog(object):
+    """SQLite mirror of the scene lists of the Aylo network sites"""
+
+    def __init__(self, path, max_age=DEFAULT_MAX_AGE, max_pages=DEFAULT_MAX_PAGES, page_size=PAGE_SIZE):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            max_age: Seconds a site's mirror is used after its last sync
+            max_pages: Pages read per sync; a large site is backfilled over several syncs
+            page_size: Scenes per list request
+        """
+        self.path = path
+        self.max_age = max_age or DEFAULT_MAX_AGE
+        self.max_pages = max_pages or DEFAULT_MAX_PAGES
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._syncing = set()
+        self._state = {}  # site -> (newest release date, last sync time)
+        self._backfill = {}  # site -> (offset of the next older page, complete)
+        with closing(self._connect()) as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            for site, newest, synced in conn.execute("SELECT site, newest, synced FROM sync_state"):
+                self._state[site] = (newest, synced)
+            for site, offset, complete in conn.execute("SELECT site, next_offset, complete FROM backfill"):
+                self._backfill[site] = (offset, bool(complete))
+
+    def _connect(self):
+        # One short-lived connection per operation: searches run on the
+        # caller's thread while a sync writes from its own
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass  # not supported on every filesystem; the default journal works too
+        return conn
+
+    # ----------------------------
+    # Freshness and syncing
+    # ----------------------------
+    def is_fresh(self, sites):
+        """True if every site was synced within ``max_age``"""
+        now = time.time()
+        with self._lock:
+            for site in sites:
+                state = self._state.get(site)
+                if state is None or now - state[1] > self.max_age:
+                    return False
+        return bool(sites)
+
+    def is_complete(self, sites):
+        """True if every site's scene list has been mirrored back to its oldest scene"""
+        with self._lock:
+            return bool(sites) and all(self._backfill.get(site, (0, False))[1] for site in sites)
+
+    def sync_in_background(self, api, sites):
+        """Sync the stale or incomplete sites on a daemon thread unless one is already on it"""
+        now = time.time()
+        with self._lock:
+            stale = [site for site in sites if site not in self._syncing and
+                     (now - self._state.get(site, ('', 0))[1] > self.max_age or
+                      not self._backfill.get(site, (0, False))[1])]
+            self._syncing.update(stale)
+        if not stale:
+            return None
+
+        def run():
+            try:
+                for site in stale:
+                    self.sync(api, site)
+            finally:
+                with self._lock:
+                    self._syncing.difference_update(stale)
+
+        worker = threading.Thread(target=run, name='aylo-catalog-sync')
+        worker.daemon = True
+        worker.start()
+        return worker
+
+    def sync(self, api, site):
+        """
+        Fetch the scenes of ``site`` released since the last sync, then
+        continue the backfill of older scenes with the pages left.
+
+        Args:
+            api: AyloAPI instance making the list requests
+            site: Site domain as sent in ``sites``, e.g. 'brazzers.com'
+
+        Returns:
+            int: Scenes stored, or an {'error': ...} dict; a failed sync
+            leaves the site stale so the next lookup retries it
+        """
+        started = time.time()
+        with self._lock:
+            newest = self._state.get(site, ('', 0))[0]
+            offset, complete = self._backfill.get(site, (0, False))
+        latest = newest
+        seen = set()
+        stored = 0
+        pages = 0
+
+        # New releases, newest first, down to the newest scene already stored.
+        # A first sync has none; its pages are all backfill.
+        added = 0
+        while newest and pages < self.max_pages:
+            records = self._page(api, site, pages * self.page_size)
+            pages += 1
+            if isinstance(records, dict):
+                return records
+
+            # A page of scenes already seen in this run means the offset was ignored
+            fresh = [r for r in records if r[0] not in seen]
+            seen.update(r[0] for r in fresh)
+            # Scenes older than the newest stored one are already in the mirror
+            new = [r for r in fresh if not r[2] or r[2] >= newest]
+            # Scenes not stored before push the backfill position down the list
+            added += len(new) - len(self._known([r[0] for r in new]))
+            self._store(site, new)
+            stored += len(new)
+            for record in new:
+                latest = max(latest, record[2])
+
+            # Sorted newest first: once older scenes show up the rest are known
+            caught_up = any(r[2] and r[2] < newest for r in fresh)
+            if caught_up or not fresh or len(records) < self.page_size:
+                break
+
+        # Backfill, from where the last sync stopped
+        if not complete and offset:
+            offset = max(0, offset + added - BACKFILL_OVERLAP)
+        while not complete and pages < self.max_pages:
+            records = self._page(api, site, offset)
+            pages += 1
+            if isinstance(records, dict):
+                return records
+            fresh = [r for r in records if r[0] not in seen]
+            seen.update(r[0] for r in fresh)
+            self._store(site, fresh)
+            stored += len(fresh)
+            offset += len(records)
+            for record in fresh:
+                latest = max(latest, record[2])
+            if len(records) < self.page_size:
+                complete = True
+            elif not fresh:
+                break  # the offset is ignored; searches stay live for this site
+
+        synced = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (site, newest, synced) VALUES (?, ?, ?)",
+                         (site, latest, synced))
+            conn.execute("INSERT OR REPLACE INTO backfill (site, next_offset, complete) VALUES (?, ?, ?)",
+                         (site, offset, int(complete)))
+            conn.commit()
+        with self._lock:
+            self._state[site] = (latest, synced)
+            self._backfill[site] = (offset, complete)
+        metrics.AYLO_CATALOG_SYNCED.inc(stored, site=site)
+        _log("synced {}: {} scenes in {} pages, {:.1f} s, newest {}, {}".format(
+            site, stored, pages, synced - started, latest or '-',
+            'complete' if complete else 'backfilled to {}'.format(offset)), xbmc.LOGINFO)
+        return stored
+
+    def _page(self, api, site, offset):
+        """Records of one page of ``site``'s scene list, or an {'error': ...} dict"""
+        params = {
+            'sites': site,
+            'orderBy': '-dateReleased',
+            'limit': self.page_size,
+            'offset': offset
+        }
+        records = api._stream_list('scenes', params, lambda data: self._record(api, data))
+        if isinstance(records, dict):
+            _log("sync of {} failed at offset {}: {}".format(site, offset, records.get('error')), xbmc.LOGWARNING)
+        return records
+
+    def _known(self, scene_ids):
+        """The IDs among ``scene_ids`` already in the mirror"""
+        if not scene_ids:
+            return set()
+        with closing(self._connect()) as conn:
+            return set(row[0] for row in conn.execute(
+                "SELECT id FROM scenes WHERE id IN ({})".format(','.join('?' * len(scene_ids))), scene_ids))
+
+    def _record(self, api, data):
+        """(id, title key, release date, complete, parsed scene) for one list item"""
+        scene = api._parse_scene_detail(data)
+        scene['image'] = api._get_best_image(data.get('images', {}))
+        # List items without a description only serve searches, not details
+        return (scene['id'], title_key(scene['title']), scene['date'] or '', 'description' in data, scene)
+
+    def _store(self, site, records):
+        if not records:
+            return
+        rows = [(scene_id, site, key, date, int(complete),
+                 sqlite3.Binary(zlib.compress(json.dumps(scene, separators=(',', ':')).encode('utf-8'))))
+                for scene_id, key, date, complete, scene in records]
+        with closing(self._connect()) as conn:
+            conn.executemany("INSERT OR REPLACE INTO scenes (id, site, title_key, release_date, complete, record) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+
+    @staticmethod
+    def _load(blob):
+        return json.loads(zlib.decompress(bytes(blob)).decode('utf-8'))
+
+    # ----------------------------
+    # Lookups
+    # ----------------------------
+    def search(self, query, sites, limit=20):
+        """
+        Scenes of ``sites`` whose title contains every word of ``query``,
+        best match first, in the shape of ``AyloAPI._parse_scene_summary``.
+        """
+        words = title_key(query).split()
+        if not words or not sites:
+            return []
+        sql = "SELECT title_key, release_date, record FROM scenes WHERE site IN ({})".format(
+            ','.join('?' * len(sites)))
+        args = list(sites)
+        for word in words:
+            sql += " AND title_key LIKE ? ESCAPE '\\'"
+            args.append('%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        sql += " ORDER BY release_date DESC LIMIT ?"
+        args.append(CANDIDATES)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, args).fetchall()
+
+        wanted = ' '.join(words)
+        scored = []
+        for index, (key, date, blob) in enumerate(rows):
+            similarity = difflib.SequenceMatcher(None, wanted, key).ratio()
+            scored.append((-similarity, index, blob))
+        scored.sort(key=lambda item: item[:2])
+        return [self._summary(self._load(blob)) for _, _, blob in scored[:limit]]
+
+    @staticmethod
+    def _summary(scene):
+        return {
+            'id': scene['id'],
+            'title': scene['title'],
+            'url': scene['url'],
+            'date': scene['date'],
+            'image': scene.get('image', ''),
+            'studio': {'name': scene['studio']['name'], 'url': scene['studio']['url']},
+            'performers': [{'name': p['name'], 'url': p['url']} for p in scene['performers']]
+        }
+
+    def get_scene(self, scene_id):
+        """Parsed scene details from a fresh site's mirror, or None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT site, record FROM scenes WHERE id = ? AND complete = 1",
+                               (str(scene_id),)).fetchone()
+        if row is None or not self.is_fresh([row[0]]):
+            return None
+        scene = self._load(row[1])
+        scene.pop('image', None)
+        return scene
+
+    def incomplete_near(self, scene_id, limit):
+        """
+        IDs of up to ``limit`` scenes of the same site as ``scene_id`` whose
+        list item carried no details, nearest in release date first. Empty
+        if ``scene_id`` is not mirrored.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT site, release_date FROM scenes WHERE id = ?", (str(scene_id),)).fetchone()
+            if row is None or limit <= 0:
+                return []
+            site, date = row
+            older = conn.execute("SELECT id FROM scenes WHERE site = ? AND complete = 0 AND id != ? "
+                                 "AND release_date <= ? ORDER BY release_date DESC LIMIT ?",
+                                 (site, str(scene_id), date, limit)).fetchall()
+            newer = conn.execute("SELECT id FROM scenes WHERE site = ? AND complete = 0 AND id != ? "
+                                 "AND release_date > ? ORDER BY release_date LIMIT ?",
+                                 (site, str(scene_id), date, limit)).fetchall()
+        ids = []
+        for index in range(limit):
+            for rows in (older, newer):
+                if index < len(rows) and len(ids) < limit:
+                    ids.append(rows[index][0])
+        return ids
+
+    def add_details(self, scenes):
+        """
+        Store full details fetched for scenes already in the mirror, so
+        ``get_scene`` answers them from now on. Scenes not mirrored are skipped.
+        """
+        scenes = dict((scene['id'], scene) for scene in scenes if scene.get('id'))
+        if not scenes:
+            return
+        ids = list(scenes)
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT id, site, title_key, release_date, record FROM scenes "
+                                "WHERE complete = 0 AND id IN ({})".format(','.join('?' * len(ids))), ids).fetchall()
+        by_site = {}
+        for scene_id, site, key, date, blob in rows:
+            scene = dict(scenes[scene_id])
+            # The list image is kept for search results
+            scene['image'] = self._load(blob).get('image', '')
+            by_site.setdefault(site, []).append((scene_id, key, date, True, scene))
+        for site, records in by_site.items():
+            self._store(site, records)
+
+    def stats(self):
+        """{site: (scenes, newest release date, last sync time, complete)}"""
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT site, COUNT(*) FROM scenes GROUP BY site"))
+        with self._lock:
+            return dict((site, (counts.get(site, 0), newest, synced, self._backfill.get(site, (0, False))[1]))
+                        for site, (newest, synced) in self._state.items())
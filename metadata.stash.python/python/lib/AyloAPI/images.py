@@ -0,0 +1,155 @@
+"""
+Aylo Image Selection
+Picks one size variant per image instead of passing on every URL
+
+The Aylo API lists each image (a "shot") in several sizes:
+
+    "images": {"poster": {"0": {"xs": {"url": ..., "width": 320, ...},
+                                "sm": {...}, ..., "xx": {...}},
+                          "1": {...}},
+               "cover": {...}}
+
+Older payloads give a list of ``{"url": ...}`` entries or plain URLs per art
+type instead. Either way each shot is reduced to one full-size URL for
+poster/fanart (the smallest variant at least ``FULL_WIDTH`` wide) and one
+small preview for thumbs and Kodi's art chooser. Shots that are the same
+picture under another art type or size are dropped.
+"""
+
+import re
+from collections import namedtuple
+
+FULL_WIDTH = 1920
+PREVIEW_WIDTH = 480
+
+# Widths assumed for size keys whose entries carry no width
+NOMINAL_WIDTHS = {'xs': 320, 'sm': 640, 'md': 960, 'lg': 1280, 'xl': 1920, 'xx': 3840}
+
+# Art types searched for a scene's single best image, in order
+BEST_IMAGE_TYPES = ('poster', 'listing', 'thumb', 'screenshot')
+
+Variant = namedtuple('Variant', 'url width')
+
+# Parts of an image URL that only encode its size or transform
+SIZE_MARKERS = re.compile(
+    r'/m=[^/]*|[_-](?:xs|sm|md|lg|xl|xx)(?=\.\w+$)|[_-]?\d{2,4}x\d{2,4}(?=[/._-]|$)', re.IGNORECASE)
+
+
+def shot_key(url):
+    """URL with query and size markers removed; equal for variants of one shot"""
+    url = url.split('?', 1)[0].split('#', 1)[0].lower()
+    return SIZE_MARKERS.sub('', url.split('://', 1)[-1])
+
+
+def _width(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _variants(entry):
+    """Size variants of one shot"""
+    if isinstance(entry, str):
+        return [Variant(entry, 0)] if entry else []
+    if not isinstance(entry, dict):
+        return []
+    if isinstance(entry.get('url'), str):
+        return [Variant(entry['url'], _width(entry.get('width')))] if entry['url'] else []
+    variants = []
+    for size, value in entry.items():
+        if isinstance(value, dict) and isinstance(value.get('url'), str) and value['url']:
+            variants.append(Variant(value['url'], _width(value.get('width')) or NOMINAL_WIDTHS.get(size, 0)))
+        elif isinstance(value, str) and value and size in NOMINAL_WIDTHS:
+            variants.append(Variant(value, NOMINAL_WIDTHS[size]))
+    return variants
+
+
+def _index(key):
+    try:
+        return (0, int(key), '')
+    except (TypeError, ValueError):
+        return (1, 0, str(key))
+
+
+def _entries(value):
+    """The shots listed for one art type"""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        if 'url' in value or any(key in NOMINAL_WIDTHS for key in value):
+            return [value]
+        return [value[key] for key in sorted(value, key=_index)]
+    return [value]
+
+
+def shots(images, art_types=None):
+    """
+    List of shots (each a list of Variants) in payload order, without
+    repeats of the same picture.
+    """
+    if not images:
+        return []
+    if isinstance(images, (list, str)):
+        images = {'': images}
+    result = []
+    seen = set()
+    for art_type, value in images.items():
+        if art_types is not None and art_type not in art_types:
+            continue
+        for entry in _entries(value):
+            variants = _variants(entry)
+            if not variants:
+                continue
+            keys = set(shot_key(v.url) for v in variants)
+            if keys & seen:
+                continue
+            seen.update(keys)
+            result.append(variants)
+    return result
+
+
+def pick(variants, width):
+    """URL of the smallest variant at least ``width`` wide, else of the largest"""
+    sized = sorted((v for v in variants if v.width), key=lambda v: v.width)
+    if not sized:
+        return variants[0].url
+    for variant in sized:
+        if variant.width >= width:
+            return variant.url
+    return sized[-1].url
+
+
+def select_images(images, full_width=FULL_WIDTH, preview_width=PREVIEW_WIDTH):
+    """
+    One full-size URL per distinct shot, plus previews.
+
+    Returns:
+        (urls, previews): list of full-size URLs in payload order, and a dict
+        of full-size URL -> preview URL for shots that have a smaller variant
+    """
+    urls = []
+    previews = {}
+    for variants in shots(images):
+        url = pick(variants, full_width)
+        if url in previews or url in urls:
+            continue
+        urls.append(url)
+        preview = pick(variants, preview_width)
+        if preview != url:
+            previews[url] = preview
+    return urls, previews
+
+
+def best_image(images, width=PREVIEW_WIDTH):
+    """One URL for a search result or performer: the first poster, listing, ... image"""
+    if not images:
+        return ''
+    if not isinstance(images, dict):
+        found = shots(images)
+        return pick(found[0], width) if found else ''
+    for art_type in BEST_IMAGE_TYPES:
+        found = shots(images, (art_type,))
+        if found:
+            return pick(found[0], width)
+    return ''
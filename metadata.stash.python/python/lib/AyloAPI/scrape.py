@@ -6,6 +6,7 @@ from . import (
     scraper_args,
     scene_search,
     scene_from_url,
+    scenes_from_ids,
     scene_from_fragment,
     performer_search,
     performer_from_url,
@@ -19,6 +20,7 @@ __all__ = [
     'scraper_args',
     'scene_search',
     'scene_from_url',
+    'scenes_from_ids',
     'scene_from_fragment',
     'performer_search',
     'performer_from_url',
@@ -0,0 +1,230 @@
+"""
+Indexed LRU file cache
+Tracks the files of a cache directory in SQLite so it never has to be scanned
+
+Every cached file is recorded with its size, last access time and source
+URL. The index is loaded into memory once per process, in least recently
+used order, so a lookup is a dict access with no filesystem call, and the
+cache knows its total size without listing the directory.
+
+The directory is kept under a byte budget: after each new file, at most
+``EVICT_SLICE`` of the least recently used files are removed, so a cache
+far over its budget (e.g. after the budget was lowered) shrinks over a few
+calls instead of stalling one. Access times are written back in batches by
+``flush``; the addon calls ``flush_all`` once at the end of every action.
+
+Example:
+    index = CacheIndex.open(cache_dir, max_bytes=200 * 1024 * 1024)
+    path = index.lookup(name)
+    if path is None:
+        ...download to os.path.join(cache_dir, name)...
+        index.add(name, size, source=url)
+    flush_all()  # once per action
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+import xbmc
+
+DB_NAME = 'index.db'
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+EVICT_SLICE = 16
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS files (
+        name TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        last_access REAL NOT NULL,
+        source TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)",
+)
+
+# One index per directory and process, shared by every cache user
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("Cache index: {}".format(msg), level)
+
+
+def flush_all():
+    """Write the pending access times of every index open in this process"""
+    with _INDEXES_LOCK:
+        indexes = list(_INDEXES.values())
+    for index in indexes:
+        try:
+            index.flush()
+        except sqlite3.Error as e:
+            _log("cannot write access times to {}: {}".format(index.path, e), xbmc.LOGWARNING)
+
+
+class CacheIndex(object):
+    """Size-capped LRU index of the files in one cache directory"""
+
+    @classmethod
+    def open(cls, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """The process-wide index of ``directory``, with its budget set to ``max_bytes``"""
+        key = os.path.abspath(directory)
+        with _INDEXES_LOCK:
+            index = _INDEXES.get(key)
+            if index is None:
+                index = _INDEXES[key] = cls(directory, max_bytes)
+            else:
+                index.max_bytes = max_bytes
+        return index
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Cache directory; the index is stored in it as ``index.db``
+            max_bytes: Byte budget for the cached files, 0 for no limit
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.path = os.path.join(directory, DB_NAME)
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # name -> [size, last access, source], least recently used first
+        self._touched = set()        # names whose access time is not written yet
+        self.total = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with closing(self._connect()) as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            rows = conn.execute("SELECT name, size, last_access, source FROM files ORDER BY last_access").fetchall()
+        if rows:
+            for name, size, last_access, source in rows:
+                self._files[name] = [size, last_access, source]
+                self.total += size
+        else:
+            self._adopt()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _adopt(self):
+        """Index the files of a cache that predates the index; the only directory scan"""
+        rows = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(DB_NAME) or name.endswith('.part') or not os.path.isfile(path):
+                continue
+            rows.append((name, os.path.getsize(path), os.path.getmtime(path), ''))
+        if not rows:
+            return
+        rows.sort(key=lambda row: row[2])
+        with closing(self._connect()) as conn:
+            conn.executemany("INSERT OR REPLACE INTO files (name, size, last_access, source) VALUES (?, ?, ?, ?)",
+                             rows)
+            conn.commit()
+        for name, size, last_access, source in rows:
+            self._files[name] = [size, last_access, source]
+            self.total += size
+        _log("indexed {} existing files, {} bytes".format(len(rows), self.total), xbmc.LOGINFO)
+
+    # ----------------------------
+    # Lookups
+    # ----------------------------
+    def lookup(self, name):
+        """Path of the cached file ``name`` (marked as used), or None"""
+        with self._lock:
+            entry = self._files.pop(name, None)
+            if entry is None:
+                return None
+            entry[1] = time.time()
+            self._files[name] = entry  # most recently used now
+            self._touched.add(name)
+        return os.path.join(self.directory, name)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._files
+
+    def __len__(self):
+        return len(self._files)
+
+    # ----------------------------
+    # Changes
+    # ----------------------------
+    def add(self, name, size, source=''):
+        """Record a new file in the cache and evict a slice of old ones if over budget"""
+        now = time.time()
+        with self._lock:
+            previous = self._files.pop(name, None)
+            if previous:
+                self.total -= previous[0]
+            self._files[name] = [size, now, source or '']
+            self.total += size
+            self._touched.discard(name)
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO files (name, size, last_access, source) VALUES (?, ?, ?, ?)",
+                         (name, size, now, source or ''))
+            conn.commit()
+        self.evict()
+
+    def evict(self, limit=EVICT_SLICE):
+        """
+        Remove up to ``limit`` least recently used files while the cache is
+        over its budget.
+
+        Returns:
+            int: Files removed
+        """
+        if not self.max_bytes:
+            return 0
+        victims = []
+        with self._lock:
+            while self.total > self.max_bytes and len(victims) < limit and len(self._files) > 1:
+                name, entry = self._files.popitem(last=False)
+                self.total -= entry[0]
+                self._touched.discard(name)
+                victims.append(name)
+        self._delete(victims)
+        return len(victims)
+
+    def expire(self, max_age):
+        """Remove files not used for ``max_age`` seconds; returns the number removed"""
+        cutoff = time.time() - max_age
+        victims = []
+        with self._lock:
+            for name, entry in list(self._files.items()):
+                if entry[1] >= cutoff:
+                    break  # the rest were used more recently
+                del self._files[name]
+                self.total -= entry[0]
+                self._touched.discard(name)
+                victims.append(name)
+        self._delete(victims)
+        return len(victims)
+
+    def _delete(self, names):
+        if not names:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass  # already gone
+        with closing(self._connect()) as conn:
+            conn.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in names])
+            conn.commit()
+        _log("removed {} files, {} bytes cached".format(len(names), self.total))
+
+    def flush(self):
+        """Write the access times of the files used since the last flush"""
+        with self._lock:
+            rows = [(self._files[name][1], name) for name in self._touched if name in self._files]
+            self._touched.clear()
+        if not rows:
+            return
+        with closing(self._connect()) as conn:
+            conn.executemany("UPDATE files SET last_access = ? WHERE name = ?", rows)
+            conn.commit()
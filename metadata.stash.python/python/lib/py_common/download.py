@@ -0,0 +1,249 @@
+"""
+Streaming file downloads for the image caches
+Chunked reads into a ``.part`` file that is renamed into place when complete
+
+A file at its final path is therefore always whole: a download that fails
+half way leaves only the ``.part`` file, and the next request for the same
+URL resumes it with an HTTP Range request where the server allows it.
+Responses over ``max_bytes``, of the wrong content type or that do not look
+like an image are dropped before they reach the cache.
+
+``fetch_all`` downloads several URLs on up to ``workers`` threads. A URL
+that is already being downloaded (by another thread, or another caller of
+the same Downloader) is not requested twice; the second caller waits for
+the first download and shares its result.
+
+Example:
+    downloader = Downloader(scraper='web_image_search')
+    result = downloader.fetch(url, os.path.join(cache_dir, 'abc.jpg'))
+    if result:
+        log(result.path, result.size)
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+import xbmc
+
+from . import metrics, timing
+
+try:
+    from urllib2 import Request, HTTPError
+except ImportError:  # py3
+    from urllib.request import Request
+    from urllib.error import HTTPError
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 15
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Leading bytes of the image formats Kodi reads
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM')
+
+Download = namedtuple('Download', 'path size content_type')
+
+
+class DownloadError(Exception):
+    """A response that must not be stored; ``reason`` labels the metric"""
+
+    def __init__(self, reason, message):
+        Exception.__init__(self, message)
+        self.reason = reason
+
+
+def looks_like_image(head):
+    """True if ``head`` (the first bytes of a file) starts like a JPEG, PNG, GIF, BMP or WebP"""
+    return head.startswith(IMAGE_SIGNATURES) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+
+
+def replace_file(source, target):
+    """Rename ``source`` to ``target``, replacing it (os.replace on Py2 and Windows)"""
+    try:
+        os.replace(source, target)
+    except AttributeError:  # Py2
+        if os.name == 'nt' and os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("Download: {}".format(msg), level)
+
+
+class _Flight(object):
+    """One download in progress, shared by every caller asking for its URL"""
+
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class Downloader(object):
+    """Chunked, size-capped, resumable downloads with atomic writes"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 scraper='download', images_only=True):
+        """
+        Args:
+            max_bytes: Largest response stored; bigger ones are dropped
+            workers: Concurrent downloads in ``fetch_all``
+            timeout: Socket timeout per request in seconds
+            scraper: Label for the request timing and metrics
+            images_only: Require an image/* content type and image file signature
+        """
+        self.max_bytes = max_bytes
+        self.workers = max(1, int(workers or DEFAULT_WORKERS))
+        self.timeout = timeout
+        self.scraper = scraper
+        self.images_only = images_only
+        self._lock = threading.Lock()
+        self._flights = {}  # url -> _Flight
+
+    def fetch(self, url, path, headers=None):
+        """
+        Download ``url`` to ``path`` unless that file exists already.
+
+        Returns:
+            Download(path, size, content_type), or None if the download failed
+            or was rejected
+        """
+        if os.path.exists(path):
+            return Download(path, os.path.getsize(path), '')
+
+        with self._lock:
+            flight = self._flights.get(url)
+            owner = flight is None
+            if owner:
+                flight = self._flights[url] = _Flight()
+        if not owner:
+            flight.done.wait()
+            metrics.DOWNLOADS.inc(scraper=self.scraper, result='shared')
+            return flight.result
+
+        try:
+            flight.result = self._download(url, path, headers)
+        finally:
+            with self._lock:
+                del self._flights[url]
+            flight.done.set()
+        return flight.result
+
+    def fetch_all(self, items, headers=None):
+        """
+        Download ``[(url, path), ...]`` on up to ``workers`` threads.
+
+        Args:
+            items: URLs and the paths to store them at
+            headers: Optional callable(url) -> dict of extra request headers
+
+        Returns:
+            dict: url -> Download, for the URLs that could be fetched
+        """
+        results = {}
+        pending = list(items)
+        if not pending:
+            return results
+
+        def work():
+            while True:
+                with self._lock:
+                    if not pending:
+                        return
+                    url, path = pending.pop(0)
+                result = self.fetch(url, path, headers(url) if headers else None)
+                if result:
+                    with self._lock:
+                        results[url] = result
+
+        if len(pending) == 1:
+            work()
+            return results
+        threads = [threading.Thread(target=work, name='download') for _ in range(min(self.workers, len(pending)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    # ----------------------------
+    # One download
+    # ----------------------------
+    def _download(self, url, path, headers):
+        part = path + PART_SUFFIX
+        try:
+            content_type, resumed = self._stream(url, part, headers)
+            self._check_file(part)
+            size = os.path.getsize(part)
+            replace_file(part, path)
+        except DownloadError as e:
+            _log("rejected {}: {}".format(url, e), xbmc.LOGWARNING)
+            metrics.DOWNLOADS.inc(scraper=self.scraper, result=e.reason)
+            _remove(part)
+            return None
+        except Exception as e:
+            # Network errors keep the .part file for the next attempt to resume
+            if isinstance(e, HTTPError) and e.code == 416:
+                _remove(part)
+            _log("failed {}: {}".format(url, e), xbmc.LOGWARNING)
+            metrics.DOWNLOADS.inc(scraper=self.scraper, result='error')
+            return None
+        metrics.DOWNLOADS.inc(scraper=self.scraper, result='resumed' if resumed else 'ok')
+        return Download(path, size, content_type)
+
+    def _stream(self, url, part, headers):
+        """Append the response to ``part``; returns (content type, resumed)"""
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        request = Request(url)
+        request.add_header('User-Agent', USER_AGENT)
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        if offset:
+            request.add_header('Range', 'bytes={}-'.format(offset))
+
+        response = timing.urlopen(request, timeout=self.timeout, scraper=self.scraper, operation='download')
+        try:
+            content_type = response.info().get('Content-Type', '') or ''
+            if self.images_only and content_type and not content_type.lower().startswith('image/'):
+                raise DownloadError('wrong_type', "not an image ({})".format(content_type))
+            length = response.info().get('Content-Length')
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise DownloadError('too_large', "{} bytes".format(length))
+
+            # Servers that ignore the Range header send the whole file again
+            resumed = bool(offset) and response.getcode() == 206
+            total = offset if resumed else 0
+            with open(part, 'ab' if resumed else 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    if total > self.max_bytes:
+                        raise DownloadError('too_large', "over {} bytes".format(self.max_bytes))
+                    f.write(chunk)
+        finally:
+            response.close()
+        return content_type, resumed
+
+    def _check_file(self, part):
+        if not os.path.getsize(part):
+            raise DownloadError('empty', "empty response")
+        if self.images_only:
+            with open(part, 'rb') as f:
+                if not looks_like_image(f.read(12)):
+                    raise DownloadError('not_image', "content is not a known image format")
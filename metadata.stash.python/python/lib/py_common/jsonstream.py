@@ -0,0 +1,206 @@
+"""
+Incremental JSON parsing for large API responses
+Yields the items of one array in a JSON document as the bytes arrive,
+so big result pages never have to be held in memory as a whole.
+"""
+
+import codecs
+import json
+import re
+
+_WHITESPACE = ' \t\n\r'
+_STRUCTURAL = re.compile(r'["{}\[\]:,]')
+_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+_decoder = json.JSONDecoder()
+
+
+class JSONArrayStream(object):
+    """
+    Iterate the items of the array found at ``path`` inside a JSON document
+    read from a file-like object (e.g. an HTTP response).
+
+    Only the array items are decoded one at a time; everything around the
+    array is kept as text and can be parsed afterwards with ``envelope()``,
+    where the streamed array is replaced by an empty list.
+
+    Example:
+        stream = JSONArrayStream(response, ('data', 'findScenes', 'scenes'))
+        for scene in stream:
+            handle(scene)
+        errors = stream.envelope().get('errors')
+    """
+
+    def __init__(self, fp, path, chunk_size=16384, encoding='utf-8'):
+        self.fp = fp
+        self.path = list(path)
+        self.chunk_size = chunk_size
+        self.found = False
+        self.bytes_read = 0
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._buf = ''
+        self._eof = False
+        self._prefix = []
+        self._tail = []
+        self._done = False
+        self._started = False
+
+    # ----------------------------
+    # Input
+    # ----------------------------
+    def _read_more(self):
+        """Append the next chunk to the buffer; returns False at end of input"""
+        if self._eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buf += self._decoder.decode(b'', final=True)
+            return False
+        self.bytes_read += len(chunk)
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        self._buf += chunk
+        return True
+
+    # ----------------------------
+    # Locate the array
+    # ----------------------------
+    def _locate(self):
+        """
+        Scan forward until the array at ``self.path`` opens.
+        Consumed text is moved to the prefix; returns True if the array was found.
+        """
+        stack = []          # [container_type, current_key] per open container
+        expecting_key = False
+        pos = 0
+
+        while True:
+            m = _STRUCTURAL.search(self._buf, pos)
+            if not m:
+                self._prefix.append(self._buf)
+                self._buf = ''
+                pos = 0
+                if not self._read_more():
+                    self._prefix.append(self._buf)
+                    self._buf = ''
+                    return False
+                continue
+
+            ch = m.group(0)
+            pos = m.end()
+
+            if ch == '"':
+                end = _STRING_END.match(self._buf, pos)
+                if not end:
+                    # Incomplete string - keep it in the buffer and read more
+                    self._prefix.append(self._buf[:m.start()])
+                    self._buf = self._buf[m.start():]
+                    pos = 0
+                    if not self._read_more():
+                        self._prefix.append(self._buf)
+                        self._buf = ''
+                        return False
+                    continue
+                if expecting_key and stack and stack[-1][0] == '{':
+                    stack[-1][1] = json.loads(self._buf[m.start():end.end()])
+                    expecting_key = False
+                pos = end.end()
+            elif ch == '{':
+                stack.append(['{', None])
+                expecting_key = True
+            elif ch == '[':
+                if (len(stack) == len(self.path)
+                        and all(c[0] == '{' for c in stack)
+                        and [c[1] for c in stack] == self.path):
+                    self._prefix.append(self._buf[:m.start()])
+                    self._buf = self._buf[pos:]
+                    return True
+                stack.append(['[', None])
+                expecting_key = False
+            elif ch in '}]':
+                if stack:
+                    stack.pop()
+                expecting_key = False
+            elif ch == ',':
+                expecting_key = bool(stack) and stack[-1][0] == '{'
+            # ':' needs no handling - the key was recorded with its string
+
+    # ----------------------------
+    # Iteration
+    # ----------------------------
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError("JSONArrayStream can only be iterated once")
+        self._started = True
+
+        self.found = self._locate()
+        if not self.found:
+            self._done = True
+            return
+
+        pos = 0
+        while True:
+            while pos < len(self._buf) and self._buf[pos] in _WHITESPACE + ',':
+                pos += 1
+
+            if pos >= len(self._buf):
+                self._buf = ''
+                pos = 0
+                if not self._read_more():
+                    raise ValueError("Unexpected end of JSON array")
+                continue
+
+            if self._buf[pos] == ']':
+                self._tail.append(self._buf[pos + 1:])
+                self._buf = ''
+                self._drain_tail()
+                self._done = True
+                return
+
+            try:
+                item, end = _decoder.raw_decode(self._buf, pos)
+            except ValueError:
+                item, end = None, None
+
+            # A value ending exactly at the buffer edge may be truncated (numbers)
+            if end is None or (end >= len(self._buf) and not self._eof):
+                if not self._read_more():
+                    if end is None:
+                        raise ValueError("Truncated JSON array item")
+                else:
+                    continue
+
+            self._buf = self._buf[end:]
+            pos = 0
+            yield item
+
+    def _drain_tail(self):
+        while self._read_more():
+            self._tail.append(self._buf)
+            self._buf = ''
+        self._tail.append(self._buf)
+        self._buf = ''
+
+    def envelope(self):
+        """
+        Parse the document around the streamed array.
+        If the stream was never iterated the items are skipped first.
+        """
+        if not self._started:
+            for _ in self:
+                pass
+        elif not self._done:
+            raise RuntimeError("envelope() called before the stream was exhausted")
+
+        if self.found:
+            text = ''.join(self._prefix) + '[]' + ''.join(self._tail)
+        else:
+            text = ''.join(self._prefix)
+        return json.loads(text) if text.strip() else {}
+
+    def close(self):
+        try:
+            self.fp.close()
+        except Exception:
+            pass
@@ -0,0 +1,358 @@
+"""
+Metrics registry for the scrapers
+Counters, gauges and histograms that aggregate across invocations and are
+flushed to the addon profile directory as
+
+    metrics.prom   Prometheus text format (node-exporter textfile collector)
+    metrics.json   JSON snapshot, also used to carry totals across restarts
+
+Counters and histograms continue from the last snapshot when the
+interpreter is restarted; gauges describe the current process only.
+
+Example:
+    metrics.CACHE.inc(cache='settings', result='hit')
+    with metrics.DETAILS_STAGE_SECONDS.time(stage='nfo'):
+        create_nfo_file(details, settings)
+    metrics.REGISTRY.maybe_flush(profile_dir, interval=60)
+"""
+
+import json
+import os
+import threading
+import time
+
+import xbmc
+
+# Atomic rename where available (Py3), plain rename otherwise
+_replace = getattr(os, 'replace', os.rename)
+
+PREFIX = 'stash_scraper_'
+PROM_FILE = 'metrics.prom'
+JSON_FILE = 'metrics.json'
+
+# Seconds; covers a fast local Stash up to a login through a slow site
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("[Metrics] {}".format(msg), level)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(object):
+    kind = None
+
+    def __init__(self, name, help_text, labels, lock):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = lock
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("{} takes labels {}, got {}".format(self.name, self.labels, sorted(labels)))
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key, extra=None):
+        pairs = list(zip(self.labels, key)) + (extra or [])
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labels, key)), 'value': value}
+                    for key, value in sorted(self._values.items())]
+
+    def prometheus(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} {}'.format(self.name, self.kind)]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append('{}{} {}'.format(self.name, self._label_text(key), _format_value(value)))
+        return lines
+
+    def merge(self, samples):
+        """Add totals from an earlier snapshot"""
+        with self._lock:
+            for sample in samples:
+                key = self._key(sample['labels'])
+                self._values[key] = self._values.get(key, 0) + sample['value']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, samples):
+        pass  # a restarted process starts from its own state
+
+
+class _Timer(object):
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.time() - self._start, **self._labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, lock, buckets=LATENCY_BUCKETS):
+        _Metric.__init__(self, name, help_text, labels, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            entry['counts'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def time(self, **labels):
+        """Context manager observing the seconds spent in its block"""
+        self._key(labels)
+        return _Timer(self, labels)
+
+    def value(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return dict(entry, counts=list(entry['counts'])) if entry else None
+
+    def samples(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labels, key)), 'buckets': list(entry['counts']),
+                     'sum': entry['sum'], 'count': entry['count']}
+                    for key, entry in sorted(self._values.items())]
+
+    def prometheus(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), entry['counts']):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(
+                        self.name, self._label_text(key, [('le', _format_value(bound))]), cumulative))
+                lines.append('{}_sum{} {}'.format(self.name, self._label_text(key), _format_value(entry['sum'])))
+                lines.append('{}_count{} {}'.format(self.name, self._label_text(key), entry['count']))
+        return lines
+
+    def merge(self, samples, buckets=None):
+        if buckets is not None and tuple(buckets) != self.buckets:
+            _log("bucket layout of {} changed, not merging old totals".format(self.name), xbmc.LOGWARNING)
+            return
+        with self._lock:
+            for sample in samples:
+                key = self._key(sample['labels'])
+                entry = self._values.setdefault(
+                    key, {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0})
+                entry['counts'] = [a + b for a, b in zip(entry['counts'], sample['buckets'])]
+                entry['sum'] += sample['sum']
+                entry['count'] += sample['count']
+
+
+class StageTimer(object):
+    """
+    Observes the time between successive calls, one histogram sample per stage.
+
+    Example:
+        stage = StageTimer(metrics.DETAILS_STAGE_SECONDS, scraper='stash')
+        details = scraper.get_details(scene_id)
+        stage('lookup')
+    """
+
+    def __init__(self, histogram, **labels):
+        self._histogram = histogram
+        self._labels = labels
+        self._last = time.time()
+
+    def __call__(self, stage):
+        now = time.time()
+        self._histogram.observe(now - self._last, stage=stage, **self._labels)
+        self._last = now
+
+
+class Registry(object):
+    """All metrics of the process and their flush state"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._metrics = {}
+        self._restored = False
+        self._last_flush = 0
+
+    def _register(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labels, self._lock, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError("metric {} already registered differently".format(name))
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, PREFIX + name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge, PREFIX + name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, PREFIX + name, help_text, labels, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name) or self._metrics.get(PREFIX + name)
+
+    def snapshot(self):
+        """JSON-serializable state of every metric"""
+        with self._lock:
+            metrics = {}
+            for name, metric in sorted(self._metrics.items()):
+                entry = {'type': metric.kind, 'help': metric.help, 'labels': list(metric.labels),
+                         'samples': metric.samples()}
+                if metric.kind == 'histogram':
+                    entry['buckets'] = list(metric.buckets)
+                metrics[name] = entry
+            return {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'metrics': metrics}
+
+    def prometheus(self):
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            lines = []
+            for _, metric in sorted(self._metrics.items()):
+                lines.extend(metric.prometheus())
+            return '\n'.join(lines) + '\n'
+
+    def restore(self, snapshot):
+        """Continue counters and histograms from an earlier snapshot"""
+        with self._lock:
+            for name, entry in snapshot.get('metrics', {}).items():
+                metric = self._metrics.get(name)
+                if metric is None or metric.kind != entry.get('type') or list(metric.labels) != entry.get('labels'):
+                    continue
+                if metric.kind == 'histogram':
+                    metric.merge(entry.get('samples', []), entry.get('buckets'))
+                else:
+                    metric.merge(entry.get('samples', []))
+
+    def flush(self, directory):
+        """Write metrics.prom and metrics.json into ``directory``"""
+        json_path = os.path.join(directory, JSON_FILE)
+        with self._lock:
+            if not self._restored:
+                self._restored = True
+                if os.path.exists(json_path):
+                    try:
+                        with open(json_path) as f:
+                            self.restore(json.load(f))
+                    except (IOError, OSError, ValueError) as e:
+                        _log("could not restore {}: {}".format(json_path, e), xbmc.LOGWARNING)
+            self._last_flush = time.time()
+            LAST_FLUSH.set(self._last_flush)
+            files = ((PROM_FILE, self.prometheus()),
+                     (JSON_FILE, json.dumps(self.snapshot(), indent=1, sort_keys=True)))
+
+        try:
+            for filename, text in files:
+                path = os.path.join(directory, filename)
+                # Write then rename, so collectors never read half a file
+                with open(path + '.tmp', 'w') as f:
+                    f.write(text)
+                _replace(path + '.tmp', path)
+        except (IOError, OSError) as e:
+            _log("could not write metrics to {}: {}".format(directory, e), xbmc.LOGWARNING)
+            return False
+        _log("flushed to {}".format(directory))
+        return True
+
+    def maybe_flush(self, directory, interval):
+        """Flush if ``interval`` seconds passed since the last flush (always on the first call)"""
+        if time.time() - self._last_flush >= interval:
+            return self.flush(directory)
+        return False
+
+    def reset(self):
+        """Drop every recorded value, keeping the registered metrics"""
+        with self._lock:
+            for metric in self._metrics.values():
+                metric._values.clear()
+
+
+REGISTRY = Registry()
+
+# ----------------------------
+# Scraper metrics
+# ----------------------------
+REQUESTS = REGISTRY.counter('requests_total', 'HTTP requests per backend and status', ('scraper', 'status'))
+REQUEST_ERRORS = REGISTRY.counter('request_errors_total', 'Failed HTTP requests by error class',
+                                  ('scraper', 'error'))
+RESPONSE_BYTES = REGISTRY.counter('response_bytes_total', 'Response bytes read per backend', ('scraper',))
+REQUEST_SECONDS = REGISTRY.histogram('request_seconds', 'HTTP request duration per backend', ('scraper',))
+RETRIES = REGISTRY.counter('retries_total', 'Requests retried per backend and reason', ('scraper', 'reason'))
+ERRORS = REGISTRY.counter('errors_total', 'Scraper failures by stage and error class', ('stage', 'error'))
+CACHE = REGISTRY.counter('cache_requests_total', 'Cache lookups by cache and result (hit/miss)',
+                         ('cache', 'result'))
+ACTIONS = REGISTRY.counter('actions_total', 'Kodi actions handled', ('action',))
+ACTION_SECONDS = REGISTRY.histogram('action_seconds', 'Duration of Kodi actions', ('action',))
+DETAILS_STAGE_SECONDS = REGISTRY.histogram('details_stage_seconds', 'Duration of the get_details stages',
+                                           ('scraper', 'stage'))
+FEDERATED_RESULTS = REGISTRY.counter('federated_backend_results_total',
+                                     'Federated search outcome per backend (ok/empty/error/timeout)',
+                                     ('scraper', 'outcome'))
+FEDERATED_SECONDS = REGISTRY.histogram('federated_backend_seconds', 'Federated search answer time per backend',
+                                       ('scraper',))
+AYLO_CATALOG_SYNCED = REGISTRY.counter('aylo_catalog_synced_scenes_total',
+                                      'Scenes stored by Aylo catalog syncs per site', ('site',))
+DOWNLOADS = REGISTRY.counter('downloads_total',
+                             'File downloads per backend and result (ok/resumed/shared/error/too_large/...)',
+                             ('scraper', 'result'))
+POOLED_SCRAPERS = REGISTRY.gauge('pooled_scrapers', 'Scraper instances in the process pool')
+LAST_FLUSH = REGISTRY.gauge('last_flush_timestamp_seconds', 'Unix time of the last metrics flush')
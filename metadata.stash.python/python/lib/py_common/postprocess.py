@@ -0,0 +1,224 @@
+"""
+Compiled postprocessing for scraped scenes
+Replaces chains of util.replace_all / util.replace_at in site postprocessors
+
+A site describes its fixes once, at import time:
+
+    BRAZZERS = (Postprocess()
+                .replace('url', {'/scene/': '/video/', '/model/': '/pornstar/'})
+                .map_at(('studio', 'name'), studio_map)
+                .set_when_tag('Brazzers Live', ('studio', 'name'), 'Brazzers Live'))
+
+and applies it with ``BRAZZERS(scene)``. Every rule for a key is merged into
+one function (all substring replacements of a key into one regex), rules
+for the same path are composed, and tag rules are indexed by tag, so a
+scene is walked once whatever the number of rules.
+
+By default the scene is changed in place; AyloAPI hands every postprocessor
+a freshly parsed or copied scene. With ``copy=True`` only the dicts and
+lists on changed paths are copied and everything else is shared with the
+input.
+"""
+
+import re
+
+try:
+    string_types = (str, unicode)  # Py2
+except NameError:
+    string_types = (str,)
+
+# Compiled scene-dependent replacement tables kept per postprocessor
+MAX_COMPILED_TABLES = 64
+
+
+def _compile_replacements(replacements):
+    """One function applying every ``old -> new`` substring replacement in a single pass"""
+    table = dict((old, new) for old, new in replacements.items() if old and old != new)
+    if not table:
+        return None
+    # Longest first, so '/models/' wins over '/model/' where both match
+    pattern = re.compile('|'.join(re.escape(old) for old in sorted(table, key=len, reverse=True)))
+    substitute = pattern.sub
+
+    def expand(match):
+        return table[match.group(0)]
+
+    def replace(value):
+        if not isinstance(value, string_types):
+            return value
+        return substitute(expand, value)
+    return replace
+
+
+def _compose(first, second):
+    if first is None:
+        return second
+    return lambda value: second(first(value))
+
+
+def _tag_names(tags):
+    names = set()
+    for tag in tags or ():
+        name = tag.get('name') if isinstance(tag, dict) else tag
+        if name:
+            names.add(name)
+    return names
+
+
+class Postprocess(object):
+    """A site's scene fixes, compiled into one traversal"""
+
+    def __init__(self):
+        self._keys = {}             # key -> function applied to every value of that key
+        self._dynamic = {}          # key -> [scene -> replacements dict]
+        self._paths = []            # [(path, function)], one entry per path
+        self._tag_rules = {}        # tag name -> [(order, path, function)]
+        self._tables = {}           # frozen replacements -> compiled function
+
+    # ----------------------------
+    # Rules
+    # ----------------------------
+    def rewrite(self, key, func):
+        """Apply ``func`` to the value of ``key`` wherever it occurs (like util.replace_all)"""
+        self._keys[key] = _compose(self._keys.get(key), func)
+        return self
+
+    def replace(self, key, replacements):
+        """
+        Substring replacements in every value of ``key``.
+
+        ``replacements`` is a dict ``{old: new}``, or a callable returning
+        one for the scene being processed (e.g. a domain chosen by studio).
+        All replacements are made in one pass over the original value, so
+        they do not see each other's output.
+        """
+        if callable(replacements):
+            self._dynamic.setdefault(key, []).append(replacements)
+            return self
+        replace = _compile_replacements(replacements)
+        return self.rewrite(key, replace) if replace else self
+
+    def set_at(self, path, value):
+        """
+        Replace the value at ``path`` if it exists (like util.replace_at).
+        ``value`` is a constant or a function of the current value.
+        """
+        func = value if callable(value) else (lambda _, value=value: value)
+        path = tuple(path)
+        for index, (existing, previous) in enumerate(self._paths):
+            if existing == path:
+                self._paths[index] = (path, _compose(previous, func))
+                return self
+        self._paths.append((path, func))
+        return self
+
+    def map_at(self, path, mapping):
+        """Look the value at ``path`` up in ``mapping``; unmapped values are kept"""
+        mapping = dict(mapping)
+        return self.set_at(path, lambda value: mapping.get(value, value))
+
+    def set_when_tag(self, tag, path, value):
+        """
+        ``set_at`` for scenes tagged ``tag`` only. Tag rules run after the
+        unconditional ones, in the order they were added.
+        """
+        func = value if callable(value) else (lambda _, value=value: value)
+        order = sum(len(rules) for rules in self._tag_rules.values())
+        self._tag_rules.setdefault(tag, []).append((order, tuple(path), func))
+        return self
+
+    # ----------------------------
+    # Applying
+    # ----------------------------
+    def __call__(self, obj, _=None, copy=False):
+        """
+        Postprocess one scene, or a list of them.
+
+        The second argument is the API client AyloAPI passes to every
+        postprocessor; it is not needed here.
+        """
+        if isinstance(obj, list):
+            return [self(item, copy=copy) for item in obj] if copy else [self(item) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+
+        owned = set() if copy else None
+        keys = self._keys_for(obj)
+        if keys:
+            obj = self._walk(obj, keys, owned)
+
+        for path, func in self._paths:
+            obj = self._apply_at(obj, path, func, owned)
+        if self._tag_rules and obj.get('tags'):
+            matched = [rule for tag in _tag_names(obj['tags']) for rule in self._tag_rules.get(tag, ())]
+            for _, path, func in sorted(matched, key=lambda rule: rule[0]):
+                obj = self._apply_at(obj, path, func, owned)
+        return obj
+
+    def _keys_for(self, scene):
+        """Key functions for this scene, with its scene-dependent replacements compiled in"""
+        if not self._dynamic:
+            return self._keys
+        keys = dict(self._keys)
+        for key, factories in self._dynamic.items():
+            for factory in factories:
+                replacements = factory(scene) or {}
+                frozen = frozenset(replacements.items())
+                replace = self._tables.get(frozen)
+                if replace is None and frozen not in self._tables:
+                    if len(self._tables) >= MAX_COMPILED_TABLES:
+                        self._tables.clear()
+                    replace = self._tables[frozen] = _compile_replacements(replacements)
+                if replace is not None:
+                    keys[key] = _compose(keys.get(key), replace)
+        return keys
+
+    @staticmethod
+    def _own(container, owned):
+        """``container`` itself when changing in place, else a copy made at most once per call"""
+        if owned is None or id(container) in owned:
+            return container
+        container = dict(container) if isinstance(container, dict) else list(container)
+        owned.add(id(container))
+        return container
+
+    def _walk(self, node, keys, owned):
+        if isinstance(node, dict):
+            result = node
+            for key, value in node.items():
+                func = keys.get(key)
+                if func is not None:
+                    new = func(value)
+                elif isinstance(value, (dict, list)):
+                    new = self._walk(value, keys, owned)
+                else:
+                    continue
+                if new is not value and (owned is None or new != value):
+                    if result is node:
+                        result = self._own(node, owned)
+                    result[key] = new
+            return result
+        if isinstance(node, list):
+            result = node
+            for index, value in enumerate(node):
+                if not isinstance(value, (dict, list)):
+                    continue
+                new = self._walk(value, keys, owned)
+                if new is not value:
+                    if result is node:
+                        result = self._own(node, owned)
+                    result[index] = new
+            return result
+        return node
+
+    def _apply_at(self, node, path, func, owned):
+        key = path[0]
+        if not isinstance(node, dict) or key not in node:
+            return node
+        value = node[key]
+        new = func(value) if len(path) == 1 else self._apply_at(value, path[1:], func, owned)
+        if new is value:
+            return node
+        node = self._own(node, owned)
+        node[key] = new
+        return node
@@ -0,0 +1,405 @@
+"""
+Per-request timing for the scrapers' HTTP calls
+Records DNS, connect, TLS, time-to-first-byte and body time plus payload size
+for every request, tagged with the scraper, operation and Kodi action.
+
+Requests slower than the configured threshold are appended to a dedicated
+slow-request log (JSON lines), and ``end_action`` logs a summary of all
+requests made while handling one Kodi action.
+
+Example:
+    response = timing.urlopen(request, timeout=30, context=ctx,
+                              scraper='stash', operation='findScenes')
+    data = response.read()
+"""
+
+import json
+import os
+import re
+import socket
+import threading
+import time
+
+import xbmc
+
+from . import metrics
+
+try:
+    # Py2
+    from urlparse import urlsplit
+except ImportError:
+    # Py3
+    from urllib.parse import urlsplit
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'body')
+SLOW_LOG_MAX_BYTES = 1024 * 1024
+
+_ID_SEGMENT = re.compile(r'(?<=/)[0-9a-fA-F-]*\d[0-9a-fA-F-]*(?=/|$)')
+
+_local = threading.local()
+_lock = threading.Lock()
+_config = {'slow_ms': 2000, 'slow_log': None, 'summary_level': xbmc.LOGDEBUG}
+_action = {'name': '', 'started': None, 'spans': []}
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("[Timing] {}".format(msg), level)
+
+
+def configure(slow_ms=None, slow_log=None, summary=None):
+    """
+    Args:
+        slow_ms: Requests at least this slow (total ms) go to the slow log; 0 disables
+        slow_log: Path of the slow-request log file
+        summary: True to log the per-action summary at INFO instead of DEBUG
+    """
+    if slow_ms is not None:
+        _config['slow_ms'] = slow_ms
+    if slow_log is not None:
+        _config['slow_log'] = slow_log
+    if summary is not None:
+        _config['summary_level'] = xbmc.LOGINFO if summary else xbmc.LOGDEBUG
+
+
+def operation_from_url(url):
+    """URL path with ids replaced, e.g. /v2/scenes/123 -> /v2/scenes/:id"""
+    return _ID_SEGMENT.sub(':id', urlsplit(url).path or '/')
+
+
+# ----------------------------
+# Spans
+# ----------------------------
+class Span(object):
+    """Timing of one HTTP request, from urlopen until the body is read"""
+
+    __slots__ = ('scraper', 'operation', 'action', 'method', 'url', 'status', 'error',
+                 'started', 'headers_at', 'finished', 'bytes', 'phases')
+
+    def __init__(self, scraper, operation, method, url):
+        parts = urlsplit(url)
+        self.scraper = scraper
+        self.operation = operation or operation_from_url(url)
+        self.action = _action['name']
+        self.method = method
+        # Query strings may carry API keys
+        self.url = '{}://{}{}'.format(parts.scheme, parts.netloc, parts.path)
+        self.status = None
+        self.error = None
+        self.started = time.time()
+        self.headers_at = None
+        self.finished = None
+        self.bytes = 0
+        self.phases = dict((phase, 0.0) for phase in PHASES)
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def got_headers(self, status):
+        self.headers_at = time.time()
+        self.status = status
+        # Whatever urlopen spent outside DNS/connect/TLS was waiting for the server
+        elapsed = self.headers_at - self.started
+        self.phases['ttfb'] = max(0.0, elapsed - self.phases['dns'] - self.phases['connect'] - self.phases['tls'])
+
+    def finish(self, error=None):
+        if self.finished is not None:
+            return
+        self.finished = time.time()
+        if error:
+            self.error = error
+        _record(self)
+
+    @property
+    def total_ms(self):
+        end = self.finished or self.headers_at or time.time()
+        return (end - self.started) * 1000
+
+    def as_dict(self):
+        result = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'action': self.action,
+            'scraper': self.scraper,
+            'operation': self.operation,
+            'method': self.method,
+            'url': self.url,
+            'status': self.status,
+            'bytes': self.bytes,
+            'total_ms': round(self.total_ms, 1),
+        }
+        for phase in PHASES:
+            result['{}_ms'.format(phase)] = round(self.phases[phase] * 1000, 1)
+        if self.error:
+            result['error'] = self.error
+        return result
+
+    def describe(self):
+        return "{} {} {} {:.0f} ms (dns {:.0f} / connect {:.0f} / tls {:.0f} / ttfb {:.0f} / body {:.0f}) {} B{}".format(
+            self.scraper, self.operation, self.status or '-', self.total_ms,
+            *[self.phases[p] * 1000 for p in PHASES] + [self.bytes, ' ' + self.error if self.error else ''])
+
+
+def _record(span):
+    _log(span.describe())
+    with _lock:
+        _action['spans'].append(span)
+    metrics.REQUESTS.inc(scraper=span.scraper, status=span.status or 'none')
+    metrics.RESPONSE_BYTES.inc(span.bytes, scraper=span.scraper)
+    metrics.REQUEST_SECONDS.observe(span.total_ms / 1000.0, scraper=span.scraper)
+    if span.error:
+        metrics.REQUEST_ERRORS.inc(scraper=span.scraper, error=span.error)
+    slow_ms = _config['slow_ms']
+    if slow_ms and span.total_ms >= slow_ms:
+        _log("slow request: {}".format(span.describe()), xbmc.LOGWARNING)
+        _write_slow(span)
+
+
+def _write_slow(span):
+    path = _config['slow_log']
+    if not path:
+        return
+    try:
+        with _lock:
+            if os.path.exists(path) and os.path.getsize(path) > SLOW_LOG_MAX_BYTES:
+                # Keep one previous file around
+                if os.path.exists(path + '.1'):
+                    os.remove(path + '.1')
+                os.rename(path, path + '.1')
+            with open(path, 'a') as f:
+                f.write(json.dumps(span.as_dict(), sort_keys=True) + '\n')
+    except (IOError, OSError) as e:
+        _log("could not write slow-request log: {}".format(e), xbmc.LOGWARNING)
+
+
+class TimedResponse(object):
+    """Response wrapper that times body reads and finishes the span at EOF or close"""
+
+    def __init__(self, response, span):
+        self._response = response
+        self._span = span
+
+    def read(self, *args):
+        start = time.time()
+        data = self._response.read(*args)
+        self._span.add('body', time.time() - start)
+        self._span.bytes += len(data)
+        if not args or args[0] is None or args[0] < 0 or not data:
+            self._span.finish()
+        return data
+
+    def readline(self, *args):
+        start = time.time()
+        data = self._response.readline(*args)
+        self._span.add('body', time.time() - start)
+        self._span.bytes += len(data)
+        return data
+
+    def close(self):
+        self._span.finish()
+        self._response.close()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------------------------
+# Connection phases
+# ----------------------------
+def _add(phase, start):
+    span = getattr(_local, 'span', None)
+    if span is not None:
+        span.add(phase, time.time() - start)
+
+
+def _timed_connect(conn):
+    """Open ``conn.sock`` recording DNS and TCP connect times on the current span"""
+    start = time.time()
+    infos = socket.getaddrinfo(conn.host, conn.port, 0, socket.SOCK_STREAM)
+    _add('dns', start)
+
+    error = None
+    for family, socktype, proto, _, address in infos:
+        sock = None
+        start = time.time()
+        try:
+            sock = socket.socket(family, socktype, proto)
+            if conn.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(conn.timeout)
+            if getattr(conn, 'source_address', None):
+                sock.bind(conn.source_address)
+            sock.connect(address)
+            _add('connect', start)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.sock = sock
+            return
+        except socket.error as e:
+            _add('connect', start)
+            error = e
+            if sock is not None:
+                sock.close()
+    raise error or socket.error("getaddrinfo returned an empty list")
+
+
+_handlers = None
+
+
+def _timed_handlers():
+    """
+    HTTP and HTTPS handler classes whose connections report their phases.
+    http.client and urllib.request (which pulls in ssl and email) are only
+    imported by the first request, not when the scraper starts.
+    """
+    global _handlers
+    if _handlers is not None:
+        return _handlers
+    try:
+        # Py2
+        import httplib as http_client
+        from urllib2 import HTTPHandler, HTTPSHandler
+    except ImportError:
+        # Py3
+        import http.client as http_client
+        from urllib.request import HTTPHandler, HTTPSHandler
+
+    class TimedHTTPConnection(http_client.HTTPConnection):
+        def connect(self):
+            _timed_connect(self)
+
+    class TimedHTTPSConnection(http_client.HTTPSConnection):
+        def connect(self):
+            _timed_connect(self)
+            server_hostname = self.host
+            if getattr(self, '_tunnel_host', None):
+                # Proxy tunnel: the CONNECT round trip counts as connect time
+                start = time.time()
+                self._tunnel()
+                _add('connect', start)
+                server_hostname = self._tunnel_host
+            start = time.time()
+            try:
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname)
+            finally:
+                _add('tls', start)
+
+    class TimedHTTPHandler(HTTPHandler):
+        def http_open(self, req):
+            return self.do_open(TimedHTTPConnection, req)
+
+    class TimedHTTPSHandler(HTTPSHandler):
+        def https_open(self, req):
+            return self.do_open(TimedHTTPSConnection, req, context=self._context)
+
+    # Racing first requests build equivalent classes; keeping either is fine
+    _handlers = (TimedHTTPHandler, TimedHTTPSHandler)
+    return _handlers
+
+
+_openers = {}
+
+
+def opener(context=None, *handlers):
+    """urllib opener whose HTTP(S) connections report their phases"""
+    try:
+        # Py2
+        from urllib2 import build_opener
+    except ImportError:
+        # Py3
+        from urllib.request import build_opener
+    http_handler, https_handler = _timed_handlers()
+    return build_opener(http_handler(), https_handler(context=context), *handlers)
+
+
+def _default_opener(context):
+    key = id(context)
+    with _lock:
+        entry = _openers.get(key)
+        if entry is None or entry[0] is not context:
+            entry = _openers[key] = (context, opener(context))
+    return entry[1]
+
+
+def urlopen(request, timeout=None, context=None, scraper='', operation='', opener=None):
+    """
+    Open ``request`` like urllib's urlopen and time it. Returns a response
+    wrapper; HTTPError/URLError are raised as usual after being recorded.
+    """
+    url = request.get_full_url() if hasattr(request, 'get_full_url') else request
+    method = request.get_method() if hasattr(request, 'get_method') else 'GET'
+    span = Span(scraper, operation, method, url)
+    _local.span = span
+    try:
+        if opener is None:
+            opener = _default_opener(context)
+        if timeout is None:
+            response = opener.open(request)
+        else:
+            response = opener.open(request, timeout=timeout)
+    except Exception as e:
+        span.got_headers(getattr(e, 'code', None))
+        span.finish(error=type(e).__name__)
+        raise
+    finally:
+        _local.span = None
+    span.got_headers(response.getcode())
+    return TimedResponse(response, span)
+
+
+# ----------------------------
+# Kodi action summary
+# ----------------------------
+def begin_action(name):
+    """Tag the following requests with the Kodi action being handled"""
+    with _lock:
+        _action['name'] = name
+        _action['started'] = time.time()
+        _action['spans'] = []
+
+
+def end_action():
+    """Log a summary of the requests made during the current action"""
+    with _lock:
+        name, started, spans = _action['name'], _action['started'], _action['spans']
+        _action['name'], _action['started'], _action['spans'] = '', None, []
+    if not started:
+        return None
+
+    summary = summarize(spans)
+    summary['action'] = name
+    summary['action_ms'] = round((time.time() - started) * 1000, 1)
+    metrics.ACTIONS.inc(action=name)
+    metrics.ACTION_SECONDS.observe(summary['action_ms'] / 1000.0, action=name)
+    if spans:
+        _log("{}: {} requests, {:.0f} of {:.0f} ms in network (dns {:.0f} / connect {:.0f} / tls {:.0f} / "
+             "ttfb {:.0f} / body {:.0f}), {} B; {}".format(
+                 name, summary['requests'], summary['total_ms'], summary['action_ms'],
+                 *[summary['{}_ms'.format(p)] for p in PHASES] + [summary['bytes'], '; '.join(
+                     "{} x{} {:.0f} ms".format(key, op['requests'], op['total_ms'])
+                     for key, op in sorted(summary['operations'].items(), key=lambda kv: -kv[1]['total_ms']))]),
+             _config['summary_level'])
+    return summary
+
+
+def summarize(spans):
+    """Totals for a list of spans, overall and per scraper/operation"""
+    def totals(items):
+        result = {'requests': len(items), 'bytes': sum(s.bytes for s in items),
+                  'errors': sum(1 for s in items if s.error),
+                  'total_ms': round(sum(s.total_ms for s in items), 1)}
+        for phase in PHASES:
+            result['{}_ms'.format(phase)] = round(sum(s.phases[phase] for s in items) * 1000, 1)
+        return result
+
+    groups = {}
+    for span in spans:
+        groups.setdefault('{}/{}'.format(span.scraper, span.operation), []).append(span)
+    summary = totals(spans)
+    summary['operations'] = dict((key, totals(items)) for key, items in groups.items())
+    return summary
@@ -2,7 +2,7 @@ import json
 
 try:
     from ..py_common import log
-    from ..py_common.util import dig, replace_all, replace_at
+    from ..py_common.postprocess import Postprocess
     from ..AyloAPI.scrape import (
         gallery_from_url,
         gallery_from_fragment,
@@ -21,7 +21,7 @@ except ImportError:
     import sys
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from py_common import log
-    from py_common.util import dig, replace_all, replace_at
+    from py_common.postprocess import Postprocess
     from AyloAPI.scrape import (
         gallery_from_url,
         gallery_from_fragment,
@@ -41,27 +41,20 @@ studio_map = {
 }
 
 
-def brazzers(obj, _):
+postprocess = (
+    Postprocess()
     # All brazzers URLs use /video/ instead of the standard /scene/
     # and /pornstar/ instead of the standard /model
-    fixed = replace_all(
-        obj,
-        "url",
-        lambda x: x.replace("/scene/", "/video/").replace("/model/", "/pornstar/"),
-    )
-
+    .replace("url", {"/scene/": "/video/", "/model/": "/pornstar/"})
     # Rename certain studios according to the map
-    fixed = replace_at(
-        fixed, "studio", "name", replacement=lambda x: studio_map.get(x, x)
-    )
-
+    .map_at(("studio", "name"), studio_map)
     # Brazzers Live special case: if the scene has the tag "Brazzers Live" we need to set the studio name to "Brazzers Live"
-    if any(t["name"] == "Brazzers Live" for t in dig(obj, "tags", default=[])):
-        fixed = replace_at(
-            fixed, "studio", "name", replacement=lambda _: "Brazzers Live"
-        )
+    .set_when_tag("Brazzers Live", ("studio", "name"), "Brazzers Live")
+)
+
 
-    return fixed
+def brazzers(obj, api):
+    return postprocess(obj, api)
 
 
 if __name__ == "__main__":
@@ -3,7 +3,8 @@ import sys
 
 try:
     from ..py_common import log
-    from ..py_common.util import dig, replace_all
+    from ..py_common.postprocess import Postprocess
+    from ..py_common.util import dig
     from ..AyloAPI.scrape import (
         gallery_from_url,
         scraper_args,
@@ -19,7 +20,8 @@ except ImportError:
     import os
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from py_common import log
-    from py_common.util import dig, replace_all
+    from py_common.postprocess import Postprocess
+    from py_common.util import dig
     from AyloAPI.scrape import (
         gallery_from_url,
         scraper_args,
@@ -33,23 +35,22 @@ except ImportError:
     )
 
 
-def czechhunter(obj, _):
-    replacement = None
-    studio_name = dig(obj, "studio", "name")
-    if studio_name == "Czech Hunter":
-        replacement = "czechhunter.com"
-    elif studio_name == "Debt Dandy":
-        replacement = "debtdandy.com"
-    elif studio_name == "Dirty Scout":
-        replacement = "dirtyscout.com"
-    else:
-        # This will never be correct, but I don't see a better way to handle it
-        replacement = "bigstr.com"
+studio_domains = {
+    "Czech Hunter": "czechhunter.com",
+    "Debt Dandy": "debtdandy.com",
+    "Dirty Scout": "dirtyscout.com",
+}
+
+postprocess = Postprocess().replace(
+    "url",
+    # Replace the studio name in all URLs. Other studios keep bigstr.com:
+    # this will never be correct, but I don't see a better way to handle it
+    lambda scene: {"bigstr.com": studio_domains.get(dig(scene, "studio", "name"), "bigstr.com")},
+)
 
-    # Replace the studio name in all URLs
-    fixed = replace_all(obj, "url", lambda x: x.replace("bigstr.com", replacement))
 
-    return fixed
+def czechhunter(obj, api):
+    return postprocess(obj, api)
 
 
 if __name__ == "__main__":
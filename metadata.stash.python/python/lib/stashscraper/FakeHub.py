@@ -3,7 +3,8 @@ import sys
 
 try:
     from ..py_common import log
-    from ..py_common.util import dig, replace_all
+    from ..py_common.postprocess import Postprocess
+    from ..py_common.util import dig
     from ..AyloAPI.scrape import (
         gallery_from_url,
         scraper_args,
@@ -19,7 +20,8 @@ except ImportError:
     import os
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from py_common import log
-    from py_common.util import dig, replace_all
+    from py_common.postprocess import Postprocess
+    from py_common.util import dig
     from AyloAPI.scrape import (
         gallery_from_url,
         scraper_args,
@@ -33,29 +35,25 @@ except ImportError:
     )
 
 
-def fakehub(obj, _):
-    replacement = None
-    studio_name = dig(obj, "studio", "name")
-    if studio_name == "Fake Hostel":
-        replacement = "fakehostel.com"
-    elif studio_name == "Fake Taxi":
-        replacement = "faketaxi.com"
-    elif studio_name == "Public Agent":
-        replacement = "publicagent.com"
-    else:
-        replacement = "fakehub.com"
+studio_domains = {
+    "Fake Hostel": "fakehostel.com",
+    "Fake Taxi": "faketaxi.com",
+    "Public Agent": "publicagent.com",
+}
 
+postprocess = (
+    Postprocess()
     # All FakeHub performer URLs use /modelprofile/ instead of the standard /model/
+    .replace("url", {"/model/": "/modelprofile/"})
     # and some studios have their own domains
-    fixed = replace_all(
-        obj,
-        "url",
-        lambda x: x.replace("/model/", "/modelprofile/").replace(
-            "fakehub.com", replacement
-        ),
-    )
+    .replace("url", lambda scene: {
+        "fakehub.com": studio_domains.get(dig(scene, "studio", "name"), "fakehub.com")
+    })
+)
+
 
-    return fixed
+def fakehub(obj, api):
+    return postprocess(obj, api)
 
 
 if __name__ == "__main__":
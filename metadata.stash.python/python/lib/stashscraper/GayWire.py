@@ -8,7 +8,8 @@ except ImportError:
 
 try:
     from ..py_common import log
-    from ..py_common.util import replace_all, replace_at
+    from ..py_common.postprocess import Postprocess
+    from ..py_common.util import replace_all
     from ..AyloAPI.scrape import (
         gallery_from_url,
         scraper_args,
@@ -24,7 +25,8 @@ except ImportError:
     import os
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from py_common import log
-    from py_common.util import replace_all, replace_at
+    from py_common.postprocess import Postprocess
+    from py_common.util import replace_all
     from AyloAPI.scrape import (
         gallery_from_url,
         scraper_args,
@@ -62,27 +64,20 @@ def redirect(url):
     return url
 
 
-def gaywire(obj, _):
-    if obj is None:
-        return None
-
+postprocess = (
+    Postprocess()
     # API returns Gay Wire substudios as bangbros.com
-    fixed = replace_all(
-        obj,
-        "url",
-        lambda x: x.replace("www.bangbros.com", "gaywire.com"),
-    )
-
+    .replace("url", {"www.bangbros.com": "gaywire.com"})
     # Rename certain studios according to the map
-    fixed = replace_at(
-        fixed, "studio", "name", replacement=lambda x: studio_map.get(x, x)
-    )
+    .map_at(("studio", "name"), studio_map)
+    .set_at(("studio", "parent", "name"), "Gay Wire")
+)
 
-    fixed = replace_at(
-        fixed, "studio", "parent", "name", replacement=lambda x: "Gay Wire"
-    )
 
-    return fixed
+def gaywire(obj, api):
+    if obj is None:
+        return None
+    return postprocess(obj, api)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@ import json
 
 try:
     from ..py_common import log
-    from ..py_common.util import replace_at
+    from ..py_common.postprocess import Postprocess
     from ..AyloAPI.scrape import (
         gallery_from_url,
         gallery_from_fragment,
@@ -21,7 +21,7 @@ except ImportError:
     import sys
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from py_common import log
-    from py_common.util import replace_at
+    from py_common.postprocess import Postprocess
     from AyloAPI.scrape import (
         gallery_from_url,
         gallery_from_fragment,
@@ -36,20 +36,21 @@ except ImportError:
     )
 
 
-def primalfetish(obj, _):
+# Primal Fetish Network uses standard /scene/ URLs
+# No special URL transformations needed
+
+# Set the parent studio to Primal Fetish Network
+postprocess = Postprocess().set_at(
+    ("studio", "parent"), lambda _: {"name": "Primal Fetish Network"}
+)
+
+
+def primalfetish(obj, api):
     """
     Post-process Primal Fetish Network scenes
     Handles URL formatting and studio naming
     """
-    # Primal Fetish Network uses standard /scene/ URLs
-    # No special URL transformations needed
-    
-    # Set the parent studio to Primal Fetish Network
-    fixed = replace_at(
-        obj, "studio", "parent", replacement=lambda _: {"name": "Primal Fetish Network"}
-    )
-    
-    return fixed
+    return postprocess(obj, api)
 
 
 if __name__ == "__main__":
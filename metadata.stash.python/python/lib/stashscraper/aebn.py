@@ -1,18 +1,26 @@
 # -*- coding: utf-8 -*-
 """
 AEBN Scraper (AEBN VOD / Straight site style)
-- Uses cookie-based session (urllib opener + cookiejar)
+- Uses cookie-based session (urllib opener + cookiejar), optionally persisted to disk
+  so a logged-in session is reused across invocations until it expires
 - Login endpoint aligns with devtools: /straight/login-action
 - Search endpoint aligns with devtools: /search/scenes/page/1?...criteria=...
 - Works even when pages are HTML (extracts JSON blobs if present, otherwise scrapes links/meta)
+- Pages are parsed in one streaming tokenizer pass that stops once required fields are found
 Compatible with Python 2.7+ and Python 3.x (Kodi environments)
 """
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import codecs
+import hashlib
 import json
+import os
 import re
 import ssl
+import threading
+import time
+from collections import OrderedDict
 
 try:
     import xbmc  # Kodi
@@ -44,6 +52,27 @@ except ImportError:
     )
     from urllib.error import HTTPError, URLError
 
+try:
+    from HTMLParser import HTMLParser  # Py2
+except ImportError:
+    from html.parser import HTMLParser  # Py3
+
+try:
+    from .records import ArtSet, CastMember, Scene
+except (ImportError, ValueError):
+    from records import ArtSet, CastMember, Scene
+
+try:
+    from ..py_common import metrics, timing
+except (ImportError, ValueError):
+    try:
+        from py_common import metrics, timing
+    except ImportError:
+        metrics = timing = None  # outside Kodi: requests are not timed or counted
+
+# Atomic rename where available (Py3), plain rename otherwise
+_replace = getattr(os, "replace", os.rename)
+
 
 def _log(msg, level="INFO"):
     try:
@@ -65,7 +94,13 @@ class AEBNScraper(object):
     Scraper for AEBN (Straight site style endpoints)
     """
 
-    def __init__(self, aebn_url, username=None, password=None, debug=False, timeout=30):
+    CHUNK_SIZE = 16384
+
+    # How long a persisted login is trusted, and how long to wait after a failed one
+    SESSION_TTL = 12 * 60 * 60
+    LOGIN_RETRY_DELAY = 60 * 60
+
+    def __init__(self, aebn_url, username=None, password=None, debug=False, timeout=30, cookie_file=None):
         self.base = (aebn_url or "").rstrip("/")  # e.g. https://straight.aebn.com or https://www.aebn.com
         self.username = username or ""
         self.password = password or ""
@@ -77,13 +112,24 @@ class AEBNScraper(object):
         self.ssl_context.check_hostname = False
         self.ssl_context.verify_mode = ssl.CERT_NONE
 
-        self.cj = cookiejar.CookieJar()
-        self.opener = build_opener(
-            HTTPCookieProcessor(self.cj),
-            HTTPSHandler(context=self.ssl_context),
-        )
+        # File-backed jar when a cookie_file is given (see _load_session)
+        self.cookie_file = cookie_file
+        if cookie_file:
+            self.cj = cookiejar.LWPCookieJar(cookie_file)
+        else:
+            self.cj = cookiejar.CookieJar()
+        if timing is not None:
+            self.opener = timing.opener(self.ssl_context, HTTPCookieProcessor(self.cj))
+        else:
+            self.opener = build_opener(
+                HTTPCookieProcessor(self.cj),
+                HTTPSHandler(context=self.ssl_context),
+            )
 
         self._is_logged_in = False
+        self._session = {}
+        self._saved_cookies = None
+        self._load_session()
 
         # A sane default UA (some sites behave differently without one)
         self.user_agent = (
@@ -106,9 +152,10 @@ class AEBNScraper(object):
             h.update(extra)
         return h
 
-    def _request(self, method, path_or_url, params=None, data=None, headers=None, allow_redirects=True):
+    def _open(self, method, path_or_url, params=None, data=None, headers=None):
         """
-        Returns: (status_code, final_url, body_bytes, content_type)
+        Returns: (status_code, final_url, response_or_None, content_type, error_body_bytes)
+        The response is left open so callers can read it incrementally.
         """
         url = path_or_url
         if not re.match(r"^https?://", url, re.I):
@@ -142,7 +189,10 @@ class AEBNScraper(object):
                 _log("POST body: %s" % (body[:300] if isinstance(body, (bytes, bytearray)) else str(body)[:300]))
 
         try:
-            resp = self.opener.open(req, timeout=self.timeout)
+            if timing is not None:
+                resp = timing.urlopen(req, timeout=self.timeout, scraper="aebn", opener=self.opener)
+            else:
+                resp = self.opener.open(req, timeout=self.timeout)
             final_url = getattr(resp, "geturl", lambda: url)()
             code = getattr(resp, "getcode", lambda: 200)()
             info = getattr(resp, "info", lambda: {})()
@@ -152,8 +202,7 @@ class AEBNScraper(object):
             except Exception:
                 pass
 
-            raw = resp.read()
-            return code, final_url, raw, ctype
+            return code, final_url, resp, ctype, b""
 
         except HTTPError as e:
             try:
@@ -167,11 +216,68 @@ class AEBNScraper(object):
                 pass
             if self.debug:
                 _log("HTTPError %s for %s" % (getattr(e, "code", "???"), url), "WARNING")
-            return getattr(e, "code", 0), url, raw, ctype
+            return getattr(e, "code", 0), url, None, ctype, raw
         except URLError as e:
             if self.debug:
                 _log("URLError for %s: %s" % (url, e), "ERROR")
-            return 0, url, b"", ""
+            return 0, url, None, "", b""
+
+    def _request(self, method, path_or_url, params=None, data=None, headers=None, allow_redirects=True):
+        """
+        Returns: (status_code, final_url, body_bytes, content_type)
+        """
+        code, final_url, resp, ctype, raw = self._open(method, path_or_url, params=params, data=data, headers=headers)
+        if resp is not None:
+            try:
+                raw = resp.read()
+            finally:
+                resp.close()
+        return code, final_url, raw, ctype
+
+    def _fetch_page(self, path_or_url, params=None, headers=None):
+        """
+        GET a page and run it through a single-pass _PageExtractor as the bytes
+        arrive. The whole page is read: performers and JSON blobs can appear
+        anywhere in it, and every one of them is used.
+
+        Returns: (status_code, final_url, page, bytes_read)
+        """
+        code, final_url, resp, ctype, raw = self._open("GET", path_or_url, params=params, headers=headers)
+        # One scanner per page so the JSON work cap covers all its scripts
+        scanner = _JSONScanner(final_url)
+        page = _PageExtractor(json_extractor=scanner.scan)
+        decoders = [codecs.getincrementaldecoder("utf-8")()]
+        size = 0
+
+        def feed(chunk, final=False):
+            pending = decoders[0].getstate()[0]
+            try:
+                text = decoders[0].decode(chunk, final)
+            except UnicodeDecodeError:
+                # Not UTF-8 - continue with the same fallback _decode uses
+                decoders[0] = codecs.getincrementaldecoder("windows-1252")(errors="replace")
+                text = decoders[0].decode(pending + chunk, final)
+            if text:
+                page.feed(text)
+
+        try:
+            if resp is None:
+                size = len(raw or b"")
+                feed(raw or b"", final=True)
+            else:
+                while True:
+                    chunk = resp.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        feed(b"", final=True)
+                        break
+                    size += len(chunk)
+                    feed(chunk)
+        finally:
+            if resp is not None:
+                resp.close()
+
+        page.close()
+        return code, final_url, page, size
 
     def _decode(self, b):
         if b is None:
@@ -192,81 +298,18 @@ class AEBNScraper(object):
     # ----------------------------
     # JSON / HTML extraction helpers
     # ----------------------------
-    def _extract_json_blobs(self, html_text):
-        """
-        Tries to extract JSON objects/arrays embedded in HTML/JS.
-        Returns list of parsed python objects.
-        """
-        out = []
-
-        # Common patterns: window.__INITIAL_STATE__ = {...};
-        #                  __NEXT_DATA__ = {...}
-        patterns = [
-            r"__NEXT_DATA__\s*=\s*({.*?})\s*;?</script>",
-            r"__NUXT__\s*=\s*({.*?})\s*;?</script>",
-            r"window\.__INITIAL_STATE__\s*=\s*({.*?})\s*;?",
-            r"window\.__STATE__\s*=\s*({.*?})\s*;?",
-        ]
-
-        for pat in patterns:
-            for m in re.finditer(pat, html_text, flags=re.S | re.I):
-                blob = m.group(1)
-                try:
-                    out.append(json.loads(blob))
-                except Exception:
-                    continue
-
-        # Generic: look for {"results":[...]} or {"data":[...]} blobs
-        for pat in [
-            r"(\{\s*\"results\"\s*:\s*\[.*?\]\s*.*?\})",
-            r"(\{\s*\"data\"\s*:\s*\[.*?\]\s*.*?\})",
-        ]:
-            for m in re.finditer(pat, html_text, flags=re.S):
-                blob = m.group(1)
-                try:
-                    out.append(json.loads(blob))
-                except Exception:
-                    continue
-
-        return out
-
-    def _find_meta(self, html_text, prop):
+    def _content_items(self, hrefs):
         """
-        Extracts meta property or name content.
-        """
-        # og:title etc
-        m = re.search(
-            r'<meta[^>]+(?:property|name)\s*=\s*["\']%s["\'][^>]+content\s*=\s*["\']([^"\']+)["\']' % re.escape(prop),
-            html_text,
-            flags=re.I,
-        )
-        return m.group(1).strip() if m else ""
-
-    def _scrape_content_links(self, html_text):
-        """
-        Finds /content/... links in search pages.
-        Returns list of dicts with id,url,title.
+        Turns /content/... links from a search page into dicts with id,url,title.
         """
         items = []
         # /content/12345 or /content/slug/12345 etc
-        for m in re.finditer(r'href=["\'](/content/[^"\']+)["\']', html_text, flags=re.I):
-            href = m.group(1)
+        for href in hrefs:
             # try to find an id at the end
             idm = re.search(r"(\d+)(?:\D*$)", href)
             scene_id = idm.group(1) if idm else href
             items.append({"id": str(scene_id), "url": href, "title": ""})
-
-        # Attempt to pull nearby text title (very heuristic)
-        # (kept simple for stability)
-        dedup = []
-        seen = set()
-        for it in items:
-            key = it["url"]
-            if key in seen:
-                continue
-            seen.add(key)
-            dedup.append(it)
-        return dedup
+        return items
 
     # ----------------------------
     # Auth
@@ -300,18 +343,125 @@ class AEBNScraper(object):
 
             # If we land on something not containing "Login" forms, assume ok.
             if code in (200, 302, 301) and ("login" not in final_url.lower()) and len(list(self.cj)) > 0:
-                self._is_logged_in = True
+                self._set_session(True)
                 return True
 
             # Sometimes it stays 200 but sets cookies; also look for obvious failure strings
             if len(list(self.cj)) > 0 and not re.search(r"(invalid|incorrect|failed|captcha)", txt, re.I):
                 # still might be ok
-                self._is_logged_in = True
+                self._set_session(True)
                 return True
 
-        self._is_logged_in = False
+        self._set_session(False)
         return False
 
+    def _ensure_login(self):
+        """
+        Log in unless a still-valid session (possibly restored from disk) exists.
+        After a failed login we wait LOGIN_RETRY_DELAY before trying again,
+        instead of paying the form POSTs on every invocation.
+        """
+        if self._is_logged_in or not (self.username and self.password):
+            return self._is_logged_in
+        failed_at = self._session.get("failed_at", 0)
+        if self._session.get("user") == self._session_user() and time.time() - failed_at < self.LOGIN_RETRY_DELAY:
+            return False
+        return self.login()
+
+    # ----------------------------
+    # Session persistence
+    # ----------------------------
+    def _session_file(self):
+        return self.cookie_file + ".session" if self.cookie_file else None
+
+    def _session_user(self):
+        """Identifies base URL + account, so changed credentials never reuse a session"""
+        return hashlib.sha1(("%s|%s" % (self.base, self.username)).encode("utf-8")).hexdigest()
+
+    def _cookie_signature(self):
+        return sorted((c.domain, c.name, c.value, c.expires) for c in self.cj)
+
+    def _load_session(self):
+        """Restore cookies and login state persisted by a previous instance"""
+        if not self.cookie_file:
+            return
+        try:
+            if os.path.exists(self.cookie_file):
+                self.cj.load(ignore_discard=True)
+                self.cj.clear_expired_cookies()
+            with open(self._session_file()) as f:
+                self._session = json.load(f)
+        except Exception as e:
+            if self.debug:
+                _log("No persisted session restored: %s" % e)
+            self._session = {}
+        self._saved_cookies = self._cookie_signature()
+
+        valid = (
+            self._session.get("user") == self._session_user()
+            and self._session.get("logged_in")
+            and time.time() < self._session.get("expires", 0)
+            and len(self.cj) > 0
+        )
+        self._is_logged_in = bool(valid)
+        if self._is_logged_in:
+            _log("Reusing persisted AEBN session (expires in %ds)" % (self._session["expires"] - time.time()))
+
+    def _set_session(self, logged_in):
+        self._is_logged_in = logged_in
+        now = time.time()
+        self._session = {"user": self._session_user(), "logged_in": logged_in}
+        if logged_in:
+            self._session["expires"] = now + self.SESSION_TTL
+        else:
+            self._session["failed_at"] = now
+        self._save_session(force=True)
+
+    def _invalidate_session(self):
+        """Forget a login the server no longer honours"""
+        _log("AEBN session expired - logging in again", "WARNING")
+        self.cj.clear()
+        self._is_logged_in = False
+        self._session = {}
+        self._save_session(force=True)
+
+    def _save_session(self, force=False):
+        """Atomically write cookies (and session state) if they changed"""
+        if not self.cookie_file:
+            return
+        signature = self._cookie_signature()
+        if not force and signature == self._saved_cookies:
+            return
+        try:
+            directory = os.path.dirname(self.cookie_file)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp = self.cookie_file + ".tmp"
+            self.cj.save(tmp, ignore_discard=True)
+            os.chmod(tmp, 0o600)
+            _replace(tmp, self.cookie_file)
+            tmp = self._session_file() + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._session, f)
+            os.chmod(tmp, 0o600)
+            _replace(tmp, self._session_file())
+            self._saved_cookies = signature
+        except Exception as e:
+            _log("Could not persist AEBN session: %s" % e, "WARNING")
+
+    def _fetch_logged_in(self, path_or_url, **kwargs):
+        """_fetch_page that logs in first and retries once if the session turned out stale"""
+        had_session = self._ensure_login()
+        result = self._fetch_page(path_or_url, **kwargs)
+        if had_session and "/login" in (result[1] or "").lower():
+            if metrics is not None:
+                metrics.RETRIES.inc(scraper="aebn", reason="session")
+            self._invalidate_session()
+            if self._ensure_login():
+                result = self._fetch_page(path_or_url, **kwargs)
+        self._save_session()
+        return result
+
     # ----------------------------
     # Public API expected by scrapers
     # ----------------------------
@@ -325,10 +475,6 @@ class AEBNScraper(object):
         if not title:
             return []
 
-        # Ensure we tried login once (optional)
-        if not self._is_logged_in and self.username and self.password:
-            self.login()
-
         criteria = {"sort": "Relevance"}
         params = {
             "queryType": "Free Form",
@@ -336,17 +482,20 @@ class AEBNScraper(object):
             "criteria": json.dumps(criteria),
         }
 
-        code, _, raw, ctype = self._request("GET", "/search/scenes/page/1", params=params, headers={"Referer": urljoin(self.base + "/", "/search")})
-        html = self._decode(raw)
+        # Logs in once if needed (optional); a persisted session is reused
+        code, _, page, size = self._fetch_logged_in(
+            "/search/scenes/page/1",
+            params=params,
+            headers={"Referer": urljoin(self.base + "/", "/search")},
+        )
 
         if self.debug:
-            _log("Search response code=%s ctype=%s bytes=%s" % (code, ctype, len(raw or b"")))
+            _log("Search response code=%s bytes=%s" % (code, size))
 
         scenes = []
 
         # 1) Try JSON blobs
-        blobs = self._extract_json_blobs(html)
-        for obj in blobs:
+        for obj in page.json_blobs:
             # Find list-like candidates
             for key in ("results", "data", "items"):
                 arr = obj.get(key) if isinstance(obj, dict) else None
@@ -369,7 +518,7 @@ class AEBNScraper(object):
 
         # 2) Fallback: scrape /content/... links from HTML
         if not scenes:
-            links = self._scrape_content_links(html)
+            links = self._content_items(page.content_links)
             for it in links[: max(5, int(limit))]:
                 scenes.append({
                     "id": it["id"],
@@ -390,8 +539,7 @@ class AEBNScraper(object):
 
     def get_details(self, scene_id_or_path):
         """
-        Fetches a /content/... page and returns:
-          {'info': ..., 'cast': ..., 'uniqueids': ..., 'available_art': ...}
+        Fetches a /content/... page and returns a records.Scene
         """
         if not scene_id_or_path:
             return {"error": "Scene id/path missing"}
@@ -408,36 +556,25 @@ class AEBNScraper(object):
             else:
                 path = "/" + path
 
-        if not self._is_logged_in and self.username and self.password:
-            self.login()
-
-        code, final_url, raw, ctype = self._request("GET", path, headers={"Referer": urljoin(self.base + "/", "/search")})
-        html = self._decode(raw)
+        code, final_url, page, size = self._fetch_logged_in(
+            path,
+            headers={"Referer": urljoin(self.base + "/", "/search")},
+        )
 
         if self.debug:
-            _log("Details code=%s url=%s ctype=%s" % (code, final_url, ctype))
+            _log("Details code=%s url=%s bytes=%s" % (code, final_url, size))
 
         # Pull from meta first (usually present)
-        title = self._find_meta(html, "og:title") or self._find_meta(html, "twitter:title") or ""
-        image = self._find_meta(html, "og:image") or self._find_meta(html, "twitter:image") or ""
-        desc = self._find_meta(html, "og:description") or self._find_meta(html, "description") or ""
-
-        # Try to find release date in obvious places
-        premiered = ""
-        m = re.search(r"(Release Date|Released)\s*[:\-]?\s*</?[^>]*>\s*([A-Za-z]{3,9}\s+\d{1,2},\s+\d{4}|\d{4}-\d{2}-\d{2})", html, re.I)
-        if m:
-            premiered = m.group(2).strip()
-
-        # Try to extract performers (heuristic)
-        performers = []
-        for pm in re.finditer(r'/search/stars/page/\d+\?[^"\']*["\'][^>]*>\s*([^<]{2,80})\s*<', html, re.I):
-            name = pm.group(1).strip()
-            if name and name.lower() not in ("stars", "models"):
-                performers.append(name)
-        performers = list(dict.fromkeys(performers))  # dedupe keep order
-
-        # Try to parse any embedded JSON blobs for richer fields
-        blobs = self._extract_json_blobs(html)
+        title = page.get_meta("og:title", "twitter:title")
+        image = page.get_meta("og:image", "twitter:image")
+        desc = page.get_meta("og:description", "description")
+
+        # Release date and performers (heuristic) come from the same pass
+        premiered = page.release_date
+        performers = list(page.stars)
+
+        # Embedded JSON blobs for richer fields
+        blobs = page.json_blobs
         duration = None
         rating = None
         studio = ""
@@ -483,12 +620,11 @@ class AEBNScraper(object):
                             nm = (nm or "").strip()
                             if nm:
                                 performers.append(nm)
-                                cast.append({"name": nm, "role": "", "order": len(cast), "thumbnail": imgp})
+                                cast.append(CastMember(nm, order=len(cast), thumbnail=imgp))
 
         # Build cast if not already
         if not cast and performers:
-            for i, nm in enumerate(performers):
-                cast.append({"name": nm, "role": "", "order": i, "thumbnail": ""})
+            cast = [CastMember(nm, order=i) for i, nm in enumerate(performers)]
 
         # Normalize duration
         if duration is not None:
@@ -504,34 +640,12 @@ class AEBNScraper(object):
         # Minimal fallback if title still empty
         if not title:
             # try <title> tag
-            mt = re.search(r"<title>\s*([^<]+)\s*</title>", html, re.I)
-            if mt:
-                title = mt.group(1).strip()
-
-        info = {
-            "title": title or "Untitled",
-            "originaltitle": title or "Untitled",
-            "plot": desc or "",
-            "tagline": final_url or "",
-            "studio": [studio] if studio else [],
-            "genre": genres,
-            "tag": list(dict.fromkeys(tags)),
-            "director": [],
-            "premiered": premiered or "",
-        }
-        if duration:
-            info["duration"] = duration
-        if rating is not None:
-            try:
-                info["rating"] = float(rating)
-            except Exception:
-                pass
+            title = page.title
 
-        available_art = {}
-        if image:
-            available_art["poster"] = [{"url": image, "preview": image}]
-            available_art["thumb"] = [{"url": image, "preview": image}]
-            available_art["fanart"] = [{"url": image, "preview": image}]
+        try:
+            rating = float(rating) if rating is not None else None
+        except Exception:
+            rating = None
 
         # Unique id: use numeric if possible
         uid = ""
@@ -541,9 +655,235 @@ class AEBNScraper(object):
             m = re.search(r"/content/(\d+)", final_url or "", re.I)
             uid = m.group(1) if m else str(scene_id_or_path)
 
-        return {
-            "info": info,
-            "cast": cast,
-            "uniqueids": {"aebn": uid},
-            "available_art": available_art,
-        }
+        return Scene(
+            title=title,
+            plot=desc,
+            tagline=final_url,
+            premiered=premiered,
+            duration=duration,
+            rating=rating,
+            studios=[studio],
+            genres=genres,
+            tags=tags,
+            cast=cast,
+            uniqueids={"aebn": uid},
+            art=ArtSet(image, image, image),
+        )
+
+
+class _JSONScanner(object):
+    """
+    Bounded-time scanner for JSON embedded in <script> bodies.
+
+    Candidate offsets are found with plain substring searches (known state
+    assignments such as ``__NEXT_DATA__ = {``) and a linear regex for
+    ``{"results": [`` / ``{"data": [`` openings; each candidate is decoded
+    with json.JSONDecoder.raw_decode, which stops at the end of the value.
+    No backtracking regex ever spans a blob, and the total work per page is
+    capped, so worst-case time is linear in page size.
+
+    Finished scans are cached by page URL and script content hash across
+    instances. Only the offsets of the values are kept, not the parsed
+    objects: a hit decodes them again straight from the script, skipping the
+    candidate search and failed attempts, and every caller gets its own
+    objects. Scans stopped by the caps are not cached.
+    """
+
+    ASSIGN_MARKERS = ("__NEXT_DATA__", "__NUXT__", "window.__INITIAL_STATE__", "window.__STATE__")
+    LIST_OPENING = re.compile(r'\{\s*"(?:results|data)"\s*:\s*\[')
+    ASSIGNMENT = re.compile(r"\s*=\s*")
+
+    # Hard caps per page: decode attempts and characters handed to raw_decode
+    MAX_CANDIDATES = 64
+    MAX_WORK = 4 * 1024 * 1024
+
+    CACHE_SIZE = 64
+    _cache = OrderedDict()  # (page URL, script SHA-1) -> [(start, end), ...] of the decoded values
+    _cache_lock = threading.Lock()  # federated searches scan pages from several threads
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, page_url=""):
+        self.page_url = page_url or ""
+        self.candidates = 0
+        self.work = 0
+
+    def scan(self, text):
+        if not text:
+            return []
+
+        key = (self.page_url, hashlib.sha1(text.encode("utf-8", "replace")).hexdigest())
+        with self._cache_lock:
+            spans = self._cache.pop(key, None)
+            if spans is not None:
+                self._cache[key] = spans  # most recently used
+        if metrics is not None:
+            metrics.CACHE.inc(cache="aebn_embedded_json", result="miss" if spans is None else "hit")
+        if spans is not None:
+            out = []
+            for offset, end in spans:
+                self.work += end - offset
+                out.append(self._decoder.raw_decode(text, offset)[0])
+            return out
+
+        out = []
+        spans = []
+        seen = set()
+        for offset in self._candidates(text):
+            if offset in seen:
+                continue
+            seen.add(offset)
+            if self.candidates >= self.MAX_CANDIDATES or self.work >= self.MAX_WORK:
+                _log("Embedded JSON scan cap reached for %s" % (self.page_url or "page"), "WARNING")
+                return out  # truncated, so not cached
+            self.candidates += 1
+            try:
+                obj, end = self._decoder.raw_decode(text, offset)
+                self.work += end - offset
+                out.append(obj)
+                spans.append((offset, end))
+            except ValueError as e:
+                self.work += max(getattr(e, "pos", offset) - offset, 1)
+            except RuntimeError:
+                # Nesting too deep for the decoder (RecursionError) - give up on this script
+                self.work += len(text) - offset
+                break
+
+        with self._cache_lock:
+            self._cache[key] = spans
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return out
+
+    def _candidates(self, text):
+        """Offsets of "{" characters that may start an embedded JSON object, in page order"""
+        offsets = []
+        lowered = text.lower()
+
+        # Known state assignments: window.__INITIAL_STATE__ = {...};
+        for marker in self.ASSIGN_MARKERS:
+            marker = marker.lower()
+            pos = lowered.find(marker)
+            while pos != -1:
+                m = self.ASSIGNMENT.match(text, pos + len(marker))
+                if m and text.startswith("{", m.end()):
+                    offsets.append(m.end())
+                pos = lowered.find(marker, pos + len(marker))
+
+        # Generic: {"results":[...]} or {"data":[...]} blobs
+        for m in self.LIST_OPENING.finditer(text):
+            offsets.append(m.start())
+
+        # Whole-body JSON (e.g. <script type="application/json">)
+        stripped = len(text) - len(text.lstrip())
+        if text.startswith("{", stripped):
+            offsets.append(stripped)
+
+        return sorted(offsets)
+
+
+class _PageExtractor(HTMLParser):
+    """
+    Single-pass extractor for AEBN HTML pages, fed incrementally as bytes arrive.
+
+    Collects in one tokenizer pass:
+      - meta tags (property/name -> content, first occurrence wins)
+      - /content/... links (deduped, in page order)
+      - performer names from /search/stars/... links
+      - JSON embedded in <script> bodies (via ``json_extractor``)
+      - <title> text and a "Release Date" value
+
+    No regex ever runs over the whole document.
+    """
+
+    STAR_HREF = re.compile(r"/search/stars/page/\d+\?", re.I)
+    RELEASE_LABEL = re.compile(r"(?:Release Date|Released)\s*[:\-]?\s*$", re.I)
+    RELEASE_DATE = re.compile(r"\s*([A-Za-z]{3,9}\s+\d{1,2},\s+\d{4}|\d{4}-\d{2}-\d{2})")
+
+    def __init__(self, json_extractor=None):
+        HTMLParser.__init__(self)
+        self.json_extractor = json_extractor
+
+        self.meta = {}
+        self.content_links = []
+        self.stars = []
+        self.json_blobs = []
+        self.title = ""
+        self.release_date = ""
+
+        self._seen_links = set()
+        self._script = None
+        self._title = None
+        self._star_pending = False
+        self._release_pending = False
+
+    def get_meta(self, *props):
+        """First non-empty meta content among ``props``"""
+        for prop in props:
+            value = self.meta.get(prop.lower())
+            if value:
+                return value
+        return ""
+
+    def handle_starttag(self, tag, attrs):
+        a = dict((k.lower(), v or "") for k, v in attrs)
+        # Star names must be the anchor's direct text
+        self._star_pending = False
+
+        if tag == "meta":
+            key = (a.get("property") or a.get("name") or "").lower()
+            content = a.get("content", "").strip()
+            if key and content and key not in self.meta:
+                self.meta[key] = content
+        elif tag == "a":
+            href = a.get("href", "")
+            if href.lower().startswith("/content/") and href not in self._seen_links:
+                self._seen_links.add(href)
+                self.content_links.append(href)
+            if self.STAR_HREF.search(href):
+                self._star_pending = True
+        elif tag == "script":
+            self._script = []
+        elif tag == "title" and not self.title:
+            self._title = []
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._script is not None:
+            body = "".join(self._script)
+            self._script = None
+            self._handle_script(body)
+        elif tag == "title" and self._title is not None:
+            self.title = "".join(self._title).strip()
+            self._title = None
+        elif tag == "a":
+            self._star_pending = False
+
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script.append(data)
+            return
+        if self._title is not None:
+            self._title.append(data)
+
+        if self._star_pending:
+            self._star_pending = False
+            name = data.strip()
+            if 2 <= len(name) <= 80 and name.lower() not in ("stars", "models") and name not in self.stars:
+                self.stars.append(name)
+
+        if not data.strip():
+            return
+        if self._release_pending and not self.release_date:
+            self._release_pending = False
+            m = self.RELEASE_DATE.match(data)
+            if m:
+                self.release_date = m.group(1).strip()
+        if self.RELEASE_LABEL.search(data):
+            self._release_pending = True
+
+    def _handle_script(self, body):
+        if not body.strip():
+            return
+        blobs = self.json_extractor(body) if self.json_extractor else []
+        if blobs:
+            self.json_blobs.extend(blobs)
@@ -0,0 +1,242 @@
+"""
+Artwork Deduplication
+Drops images from Kodi's art chooser that show the same picture as another
+
+Web image results and the Aylo/PrimalFetish sites often list one picture
+several times, at other URLs, sizes or encodings. Before the
+ListItem is built, every image offered for a scene is reduced to a 64-bit
+difference hash (dHash): the image scaled to 9x8 grey pixels, one bit per
+pair of neighbouring pixels. Pictures whose hashes differ in at most
+``MAX_DISTANCE`` bits are treated as one, and only the first of them is kept
+in each art type's list (the primary image, if it is one of them).
+
+Hashes are kept per URL in SQLite, so each image is downloaded (its small
+preview, where the site has one) only the first time it is seen. Decoding
+needs Pillow; without it images are compared by the SHA-1 of their bytes,
+which still collapses the same file served under several URLs.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import xbmc
+from contextlib import closing
+
+try:
+    from ..py_common import metrics
+    from ..py_common.download import Downloader
+except (ImportError, ValueError):
+    from py_common import metrics
+    from py_common.download import Downloader
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; exact duplicates are still found
+    Image = None
+
+from .records import ART_TYPES
+
+HASH_SIZE = 8
+MAX_DISTANCE = 6
+MAX_AGE = 180 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+
+# Hash kinds stored in the cache: 'd' for dHash, 's' for SHA-1 of the file
+KIND = 'd' if Image is not None else 's'
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS hashes (
+        url TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        created REAL NOT NULL
+    )""",
+)
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("Art dedupe: {}".format(msg), level)
+
+
+def dhash(path, size=HASH_SIZE):
+    """Difference hash of the image at ``path`` as a hex string (Pillow required)"""
+    resample = getattr(Image, 'LANCZOS', None) or Image.ANTIALIAS
+    image = Image.open(path).convert('L').resize((size + 1, size), resample)
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return '{:0{}x}'.format(bits, size * size // 4)
+
+
+def file_hash(path):
+    """SHA-1 of the file at ``path``"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def distance(first, second):
+    """Bits that differ between two hashes of the same kind (SHA-1s are equal or not)"""
+    if KIND != 'd':
+        return 0 if first == second else HASH_SIZE * HASH_SIZE
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+class ArtDeduplicator(object):
+    """Near-duplicate detection for the images offered per art type"""
+
+    def __init__(self, path, incoming, max_distance=MAX_DISTANCE, headers=None):
+        """
+        Args:
+            path: SQLite database of hashes by URL, created if missing
+            incoming: Directory for the images downloaded for hashing; they
+                      are deleted once hashed
+            max_distance: Differing hash bits up to which two images are the same picture
+            headers: Optional {URL prefix: {header: value}}, e.g. the Stash API key
+                     for images served by Stash
+        """
+        self.path = path
+        self.incoming = incoming
+        self.max_distance = max_distance
+        self.headers = dict(headers or {})
+        self.downloader = Downloader(scraper='art_dedupe')
+        self._lock = threading.Lock()
+        self._hashes = {}  # url -> hash, of the current kind
+        if not os.path.isdir(incoming):
+            os.makedirs(incoming)
+        with closing(sqlite3.connect(path, timeout=30)) as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.execute("DELETE FROM hashes WHERE created < ?", (time.time() - MAX_AGE,))
+            conn.commit()
+            for url, value in conn.execute("SELECT url, hash FROM hashes WHERE kind = ?", (KIND,)):
+                self._hashes[url] = value
+
+    # ----------------------------
+    # Scenes
+    # ----------------------------
+    def dedupe(self, art):
+        """
+        Remove near-duplicates from each choice list of an ArtSet.
+
+        Returns:
+            int: Images removed across all lists
+        """
+        urls = []
+        for art_type in ART_TYPES:
+            urls.extend(u for u in art.choices(art_type) if u not in urls)
+        if len(urls) < 2:
+            return 0
+        hashes = self.hashes(urls, art.preview)
+
+        removed = 0
+        for art_type in ART_TYPES:
+            choices = art.choices(art_type)
+            kept = self.unique(choices, hashes, primary=getattr(art, art_type, None))
+            if len(kept) != len(choices):
+                removed += len(choices) - len(kept)
+                art.set_choices(art_type, kept)
+        return removed
+
+    def unique(self, urls, hashes, primary=None):
+        """
+        ``urls`` without near-duplicates, in order. Of a group of duplicates
+        the first is kept, or ``primary`` if it is in the group. URLs without
+        a hash are always kept.
+        """
+        kept = []
+        for url in urls:
+            value = hashes.get(url)
+            if value is None:
+                kept.append(url)
+                continue
+            for index, other in enumerate(kept):
+                other_value = hashes.get(other)
+                if other_value is not None and distance(value, other_value) <= self.max_distance:
+                    if url == primary:
+                        kept[index] = url
+                    break
+            else:
+                kept.append(url)
+        return kept
+
+    # ----------------------------
+    # Hashes
+    # ----------------------------
+    def _headers_for(self, url):
+        headers = {}
+        for prefix, values in self.headers.items():
+            if url.startswith(prefix):
+                headers.update(values)
+        return headers
+
+    def hashes(self, urls, preview=None):
+        """
+        Hashes of ``urls``, from the cache or by downloading them (their
+        previews where ``preview(url)`` gives one) concurrently.
+
+        Returns:
+            dict: url -> hash, for the images that could be hashed
+        """
+        result = {}
+        missing = []
+        with self._lock:
+            for url in urls:
+                if url in self._hashes:
+                    result[url] = self._hashes[url]
+                else:
+                    missing.append(url)
+        if result:
+            metrics.CACHE.inc(len(result), cache='art_hashes', result='hit')
+        if not missing:
+            return result
+        metrics.CACHE.inc(len(missing), cache='art_hashes', result='miss')
+
+        local = {}
+        remote = {}  # source URL -> url
+        for url in missing:
+            if not url.lower().startswith(('http://', 'https://')):
+                if os.path.isfile(url):
+                    local[url] = url  # web images and extracted frames already on disk
+                continue
+            source = (preview(url) if preview else '') or url
+            remote.setdefault(source, url)
+        downloads = self.downloader.fetch_all(
+            [(source, os.path.join(self.incoming, hashlib.sha1(source.encode('utf-8')).hexdigest()))
+             for source in remote],
+            headers=self._headers_for)
+        for source, download in downloads.items():
+            local[remote[source]] = download.path
+
+        rows = []
+        now = time.time()
+        for url, path in local.items():
+            try:
+                value = dhash(path) if KIND == 'd' else file_hash(path)
+            except Exception as e:
+                _log("cannot hash {}: {}".format(url, e), xbmc.LOGWARNING)
+                continue
+            finally:
+                if path.startswith(self.incoming):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            result[url] = value
+            rows.append((url, KIND, value, now))
+        if rows:
+            with self._lock:
+                self._hashes.update((row[0], row[2]) for row in rows)
+            with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                conn.executemany("INSERT OR REPLACE INTO hashes (url, kind, hash, created) VALUES (?, ?, ?, ?)",
+                                 rows)
+                conn.commit()
+        return result
@@ -0,0 +1,288 @@
+"""
+Local Artwork Mirror
+Keeps copies of the selected artwork in the addon profile, sized for Kodi
+
+With the mirror enabled, get_details downloads a scene's poster, fanart and
+thumb and its cast thumbnails in parallel before the ListItem and the NFO are
+built, and points them at the local copies. Kodi then caches its textures
+from disk instead of fetching every image from the source again.
+
+Files are named after the SHA-1 of their content, so an image shared by
+several scenes (a performer photo, a studio placeholder) is stored once. An
+index of source URL -> file makes later scrapes of the same artwork free.
+
+When Pillow is installed, images larger than the configured size for their
+role are scaled down before they are stored; without it they are kept as
+downloaded.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import xbmc
+
+try:
+    from ..py_common import metrics
+    from ..py_common.download import Downloader, replace_file
+except (ImportError, ValueError):
+    from py_common import metrics
+    from py_common.download import Downloader, replace_file
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; images are stored as downloaded
+    Image = None
+
+DEFAULT_MAX_SIZE = 1920
+DEFAULT_THUMB_SIZE = 640
+DEFAULT_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+INDEX_FILE = 'index.json'
+INCOMING_DIR = 'incoming'
+
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/png': 'png', 'image/webp': 'webp',
+              'image/gif': 'gif', 'image/bmp': 'bmp'}
+
+# Pillow formats written back as they are; anything else is stored as JPEG
+RESIZE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("Art mirror: {}".format(msg), level)
+
+
+def _extension(url, content_type):
+    ext = EXTENSIONS.get((content_type or '').split(';')[0].strip().lower())
+    if ext:
+        return ext
+    ext = url.split('?', 1)[0].rsplit('.', 1)[-1].lower()
+    return 'jpg' if ext == 'jpeg' else ext if ext in EXTENSIONS.values() else 'jpg'
+
+
+def _digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ArtMirror(object):
+    """Content-addressed local copies of scene artwork"""
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, thumb_size=DEFAULT_THUMB_SIZE,
+                 workers=DEFAULT_WORKERS, headers=None):
+        """
+        Args:
+            directory: Where images and the URL index are stored, created if missing
+            max_size: Longest edge in pixels for posters and fanart, 0 keeps the original
+            thumb_size: Longest edge in pixels for thumbs and cast thumbnails, 0 keeps the original
+            workers: Concurrent downloads per scene
+            headers: Optional {URL prefix: {header: value}}, e.g. the Stash API key
+                     for images served by Stash
+        """
+        self.directory = directory
+        self.max_size = max(0, int(max_size or 0))
+        self.thumb_size = max(0, int(thumb_size or 0))
+        self.headers = dict(headers or {})
+        self.downloader = Downloader(workers=workers, scraper='art_mirror')
+        self._lock = threading.Lock()
+        self._index = {}  # "size|url" -> file path relative to ``directory``
+        self._dirty = False
+        self._incoming = os.path.join(directory, INCOMING_DIR)
+        if not os.path.isdir(self._incoming):
+            os.makedirs(self._incoming)
+        try:
+            with open(os.path.join(directory, INDEX_FILE)) as f:
+                self._index = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+        if Image is None and (self.max_size or self.thumb_size):
+            _log("Pillow is not installed, images are stored without resizing", xbmc.LOGINFO)
+            self.max_size = self.thumb_size = 0  # one copy per image, whatever the role
+
+    # ----------------------------
+    # Scenes
+    # ----------------------------
+    def mirror(self, scene):
+        """
+        Download the primary artwork and cast thumbnails of ``scene`` and
+        point them at the local copies. Images that fail to download keep
+        their remote URL.
+
+        Returns:
+            int: Images now served from the mirror
+        """
+        slots = []  # (object, attribute, size)
+        for art_type in ('poster', 'fanart'):
+            slots.append((scene.art, art_type, self.max_size))
+        slots.append((scene.art, 'thumb', self.thumb_size))
+        for member in scene.cast:
+            slots.append((member, 'thumbnail', self.thumb_size))
+        slots = [slot for slot in slots if self._remote(getattr(slot[0], slot[1]))]
+
+        jobs = sorted(set((getattr(obj, attribute), size) for obj, attribute, size in slots))
+        local = self.fetch_all(jobs)
+        for obj, attribute, size in slots:
+            path = local.get((getattr(obj, attribute), size))
+            if path:
+                setattr(obj, attribute, path)
+        self._save_index()
+        return sum(1 for obj, attribute, _ in slots if not self._remote(getattr(obj, attribute)))
+
+    @staticmethod
+    def _remote(url):
+        return bool(url) and url.lower().startswith(('http://', 'https://'))
+
+    def fetch_all(self, jobs):
+        """
+        Local paths for ``[(url, size), ...]``. Missing images are downloaded
+        concurrently, once per URL whatever the number of sizes wanted.
+
+        Returns:
+            dict: (url, size) -> local path, for the images that could be fetched
+        """
+        local = {}
+        missing = {}  # url -> [size, ...]
+        for url, size in jobs:
+            path = self._lookup(url, size)
+            if path:
+                local[(url, size)] = path
+            else:
+                missing.setdefault(url, []).append(size)
+        if local:
+            metrics.CACHE.inc(len(local), cache='art_mirror', result='hit')
+        if not missing:
+            return local
+        metrics.CACHE.inc(sum(len(sizes) for sizes in missing.values()), cache='art_mirror', result='miss')
+
+        # Downloads land in incoming/ under a name derived from the URL, so an
+        # interrupted one is resumed by the next scrape wanting the same image
+        downloads = self.downloader.fetch_all(
+            [(url, os.path.join(self._incoming, hashlib.sha1(url.encode('utf-8')).hexdigest()))
+             for url in sorted(missing)],
+            headers=self._headers_for)
+        for url, download in downloads.items():
+            try:
+                stored = self._store_sizes(url, missing[url], download)
+            except Exception as e:
+                _log("failed to store {}: {}".format(url, e), xbmc.LOGWARNING)
+                metrics.ERRORS.inc(stage='art_mirror', error=type(e).__name__)
+                _remove(download.path)
+                continue
+            with self._lock:
+                for size, relative in stored.items():
+                    self._index['{}|{}'.format(size, url)] = relative
+                self._dirty = True
+            for size, relative in stored.items():
+                local[(url, size)] = os.path.join(self.directory, relative)
+        return local
+
+    def fetch(self, url, size=0):
+        """Local path of ``url`` scaled to ``size``, downloading it if needed; None on failure"""
+        path = self.fetch_all([(url, size)]).get((url, size))
+        self._save_index()
+        return path
+
+    def _headers_for(self, url):
+        headers = {}
+        for prefix, values in self.headers.items():
+            if url.startswith(prefix):
+                headers.update(values)
+        return headers
+
+    # ----------------------------
+    # Storage
+    # ----------------------------
+    def _lookup(self, url, size):
+        with self._lock:
+            relative = self._index.get('{}|{}'.format(size, url))
+        if relative:
+            path = os.path.join(self.directory, relative)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _store_sizes(self, url, sizes, download):
+        """
+        Store a downloaded image once per size wanted, scaled where needed.
+
+        Returns:
+            dict: size -> path relative to ``directory``
+        """
+        stored = {}
+        unscaled = []
+        for size in sizes:
+            resized = self._resize(download.path, size) if size and Image is not None else None
+            if resized:
+                stored[size] = self._store(*resized)
+            else:
+                unscaled.append(size)
+        if unscaled:
+            relative = self._store(download.path, _digest(download.path), _extension(url, download.content_type))
+            for size in unscaled:
+                stored[size] = relative
+        else:
+            _remove(download.path)
+        return stored
+
+    def _resize(self, path, size):
+        """
+        Scale the image at ``path`` down to ``size`` pixels on its longest edge.
+
+        Returns:
+            (temp path, SHA-1, extension) of the scaled copy, or None if the
+            image is small enough already
+        """
+        image = Image.open(path)
+        if max(image.size) <= size:
+            return None
+        ext = RESIZE_FORMATS.get(image.format, 'jpg')
+        resample = getattr(Image, 'LANCZOS', None) or Image.ANTIALIAS
+        image.thumbnail((size, size), resample)
+        if ext == 'jpg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        fd, temp = tempfile.mkstemp(suffix='.part', dir=self._incoming)
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format='JPEG' if ext == 'jpg' else image.format or ext.upper(), quality=90)
+        return temp, _digest(temp), ext
+
+    def _store(self, temp, digest, ext):
+        """Move a finished temp file to its content address; returns the relative path"""
+        relative = os.path.join(digest[:2], '{}.{}'.format(digest, ext))
+        target = os.path.join(self.directory, relative)
+        if os.path.exists(target):
+            _remove(temp)  # same picture from another URL
+            return relative
+        folder = os.path.dirname(target)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                pass  # created by another worker
+        replace_file(temp, target)
+        return relative
+
+    def _save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._index)
+            self._dirty = False
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            fd, temp = tempfile.mkstemp(suffix='.part', dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            replace_file(temp, path)
+        except (IOError, OSError) as e:
+            _log("cannot write the index: {}".format(e), xbmc.LOGWARNING)
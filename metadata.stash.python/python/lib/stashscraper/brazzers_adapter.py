@@ -5,6 +5,7 @@ Bridges between Brazzers.py and the Kodi addon structure
 
 import xbmc
 from .Brazzers import brazzers
+from .records import ArtSet, CastMember, Scene
 
 try:
     from ..AyloAPI.scrape import scene_search, scene_from_url
@@ -58,71 +59,27 @@ class BrazzersScraper:
             if isinstance(result, dict) and 'error' in result:
                 return result
             
-            # Convert to Kodi format
-            info = {
-                'title': result.get('title', 'Untitled'),
-                'originaltitle': result.get('title', 'Untitled'),
-                'plot': result.get('description', ''),
-                'tagline': result.get('url', ''),
-                'studio': [],
-                'genre': [],
-                'tag': [],
-                'director': [],
-                'premiered': result.get('date', '')
-            }
-            
-            # Add duration
-            if result.get('duration'):
-                info['duration'] = int(result['duration'])
-            
-            # Add studio
-            studio = result.get('studio', {})
-            if isinstance(studio, dict):
-                studio_name = studio.get('name', 'Brazzers')
-                info['studio'].append(studio_name)
-            else:
-                info['studio'].append('Brazzers')
-            
-            # Add tags
-            for tag in result.get('tags', []):
-                info['tag'].append(tag)
-            
-            # Build cast
-            cast = []
-            performers = result.get('performers', [])
-            for idx, performer in enumerate(performers):
-                if isinstance(performer, dict):
-                    cast.append({
-                        'name': performer.get('name', 'Unknown'),
-                        'role': '',
-                        'order': idx,
-                        'thumbnail': performer.get('image', '')
-                    })
-            
-            # Build artwork
-            available_art = {}
-            images = result.get('images', [])
-            if images:
-                primary = images[0] if images else None
-                if primary:
-                    available_art['poster'] = [{'url': primary, 'preview': primary}]
-                    available_art['thumb'] = [{'url': primary, 'preview': primary}]
-                    available_art['fanart'] = [{'url': primary, 'preview': primary}]
-                
-                # Add additional images
-                for img in images[:15]:
-                    for art_type in ['poster', 'fanart']:
-                        if art_type not in available_art:
-                            available_art[art_type] = []
-                        available_art[art_type].append({'url': img, 'preview': img})
-            
-            return {
-                'info': info,
-                'cast': cast,
-                'uniqueids': {'brazzers': scene_id},
-                'available_art': available_art
-            }
+            return self._to_scene(result, scene_id)
             
         except Exception as e:
             xbmc.log("Brazzers details error: {}".format(str(e)), xbmc.LOGERROR)
             return {'error': str(e)}
+    
+    def _to_scene(self, result, scene_id):
+        """Scene record for a postprocessed AyloAPI scene"""
+        studio = result.get('studio', {})
+        studio_name = studio.get('name', 'Brazzers') if isinstance(studio, dict) else 'Brazzers'
+        return Scene(
+            title=result.get('title'),
+            plot=result.get('description'),
+            tagline=result.get('url'),
+            premiered=result.get('date'),
+            duration=result.get('duration'),
+            studios=[studio_name],
+            tags=result.get('tags', []),
+            cast=[CastMember(performer.get('name', 'Unknown'), order=idx, thumbnail=performer.get('image', ''))
+                  for idx, performer in enumerate(result.get('performers', []))
+                  if isinstance(performer, dict)],
+            uniqueids={'brazzers': scene_id},
+            art=ArtSet.from_images(result.get('images', []), previews=result.get('previews')),
+        )
@@ -5,6 +5,7 @@ Bridges between CzechHunter.py and the Kodi addon structure
 
 import xbmc
 from .CzechHunter import czechhunter
+from .records import ArtSet, CastMember, Scene
 
 try:
     from ..AyloAPI.scrape import scene_search, scene_from_url
@@ -55,61 +56,27 @@ class CzechHunterScraper:
             if isinstance(result, dict) and 'error' in result:
                 return result
             
-            info = {
-                'title': result.get('title', 'Untitled'),
-                'originaltitle': result.get('title', 'Untitled'),
-                'plot': result.get('description', ''),
-                'tagline': result.get('url', ''),
-                'studio': [],
-                'genre': [],
-                'tag': [],
-                'director': [],
-                'premiered': result.get('date', '')
-            }
-            
-            if result.get('duration'):
-                info['duration'] = int(result['duration'])
-            
-            studio = result.get('studio', {})
-            if isinstance(studio, dict):
-                info['studio'].append(studio.get('name', 'Czech Hunter'))
-            else:
-                info['studio'].append('Czech Hunter')
-            
-            for tag in result.get('tags', []):
-                info['tag'].append(tag)
-            
-            cast = []
-            for idx, performer in enumerate(result.get('performers', [])):
-                if isinstance(performer, dict):
-                    cast.append({
-                        'name': performer.get('name', 'Unknown'),
-                        'role': '',
-                        'order': idx,
-                        'thumbnail': performer.get('image', '')
-                    })
-            
-            available_art = {}
-            images = result.get('images', [])
-            if images:
-                primary = images[0]
-                available_art['poster'] = [{'url': primary, 'preview': primary}]
-                available_art['thumb'] = [{'url': primary, 'preview': primary}]
-                available_art['fanart'] = [{'url': primary, 'preview': primary}]
-                
-                for img in images[:15]:
-                    for art_type in ['poster', 'fanart']:
-                        if art_type not in available_art:
-                            available_art[art_type] = []
-                        available_art[art_type].append({'url': img, 'preview': img})
-            
-            return {
-                'info': info,
-                'cast': cast,
-                'uniqueids': {'czechhunter': scene_id},
-                'available_art': available_art
-            }
+            return self._to_scene(result, scene_id)
             
         except Exception as e:
             xbmc.log("Czech Hunter details error: {}".format(str(e)), xbmc.LOGERROR)
             return {'error': str(e)}
+    
+    def _to_scene(self, result, scene_id):
+        """Scene record for a postprocessed AyloAPI scene"""
+        studio = result.get('studio', {})
+        studio_name = studio.get('name', 'Czech Hunter') if isinstance(studio, dict) else 'Czech Hunter'
+        return Scene(
+            title=result.get('title'),
+            plot=result.get('description'),
+            tagline=result.get('url'),
+            premiered=result.get('date'),
+            duration=result.get('duration'),
+            studios=[studio_name],
+            tags=result.get('tags', []),
+            cast=[CastMember(performer.get('name', 'Unknown'), order=idx, thumbnail=performer.get('image', ''))
+                  for idx, performer in enumerate(result.get('performers', []))
+                  if isinstance(performer, dict)],
+            uniqueids={'czechhunter': scene_id},
+            art=ArtSet.from_images(result.get('images', []), previews=result.get('previews')),
+        )
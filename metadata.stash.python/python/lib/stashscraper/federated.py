@@ -0,0 +1,209 @@
+"""
+Federated Search
+Searches every configured backend at once and merges the answers
+
+The ``federated`` scraper type runs ``search`` on Stash, AEBN and the Aylo
+network adapters concurrently, one thread per backend. Answers are consumed
+as they arrive; a backend that has not answered by its deadline is skipped,
+so a search takes as long as the slowest backend that is still within its
+deadline, not the sum of all of them.
+
+Results for the same scene from several backends (same title and year) are
+merged into one entry whose ``uniqueids`` name every source, e.g.
+``{'stash': '12', 'brazzers': '4000001'}``. get_details then uses the
+registry priority to pick the backend to fetch details from.
+"""
+
+import difflib
+import re
+import threading
+import time
+import xbmc
+
+try:
+    from Queue import Queue, Empty  # Py2
+except ImportError:
+    from queue import Queue, Empty
+
+try:
+    from ..py_common import metrics
+except (ImportError, ValueError):
+    from py_common import metrics
+
+DEFAULT_DEADLINE = 10.0
+MAX_RESULTS = 50
+
+YEAR = re.compile(r'\b(19|20)\d{2}\b')
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_title(title):
+    """Lower-case words only, for comparing titles across backends"""
+    return ' '.join(WORD.findall((title or '').lower()))
+
+
+def result_year(scene):
+    match = YEAR.search(scene.get('date') or '')
+    return match.group(0) if match else ''
+
+
+class FederatedScraper:
+    """Search all backends concurrently and merge the results"""
+
+    def __init__(self, backends, create, deadline=DEFAULT_DEADLINE, deadlines=None, max_results=MAX_RESULTS):
+        """
+        Args:
+            backends: Scraper keys to search, in priority order
+            create: Callable(key) returning the scraper instance for a key
+            deadline: Seconds to wait for a backend
+            deadlines: Optional {key: seconds} overriding ``deadline`` per backend
+            max_results: Length of the merged result list
+        """
+        self.backends = list(backends)
+        self.create = create
+        self.deadline = float(deadline or DEFAULT_DEADLINE)
+        self.deadlines = dict(deadlines or {})
+        self.max_results = max_results
+
+    @staticmethod
+    def parse_deadlines(text):
+        """'stash=3, aebn=8' -> {'stash': 3.0, 'aebn': 8.0}; malformed entries are skipped"""
+        deadlines = {}
+        for item in (text or '').split(','):
+            key, _, value = item.partition('=')
+            try:
+                deadlines[key.strip()] = float(value)
+            except ValueError:
+                continue
+        return deadlines
+
+    def deadline_for(self, key):
+        return self.deadlines.get(key, self.deadline)
+
+    def _search_backend(self, key, title, year, answers):
+        started = time.time()
+        try:
+            results = self.create(key).search(title, year)
+        except Exception as e:
+            results = {'error': str(e)}
+        answers.put((key, results, time.time() - started))
+
+    def search_iter(self, title, year=None):
+        """
+        Start every backend and yield ``(key, results)`` as they answer.
+
+        ``results`` is a list of scenes or an ``{'error': ...}`` dict. The
+        generator returns once every backend has answered or is past its
+        deadline; backends still running are abandoned (their threads are
+        daemons and their answers are dropped).
+        """
+        answers = Queue()
+        started = time.time()
+        deadlines = {}
+        for key in self.backends:
+            deadlines[key] = started + self.deadline_for(key)
+            worker = threading.Thread(target=self._search_backend, args=(key, title, year, answers),
+                                      name='federated-' + key)
+            worker.daemon = True
+            worker.start()
+
+        pending = set(self.backends)
+        while pending:
+            # A backend past its deadline is only waited for while others are still due
+            wait = max(deadlines[key] for key in pending) - time.time()
+            if wait <= 0:
+                break
+            try:
+                key, results, elapsed = answers.get(timeout=wait)
+            except Empty:
+                break
+            pending.discard(key)
+            metrics.FEDERATED_SECONDS.observe(elapsed, scraper=key)
+            if isinstance(results, dict) and 'error' in results:
+                outcome = 'error'
+            else:
+                outcome = 'ok' if results else 'empty'
+            metrics.FEDERATED_RESULTS.inc(scraper=key, outcome=outcome)
+            xbmc.log("[Federated] {} answered in {:.0f} ms: {}".format(
+                key, elapsed * 1000, results['error'] if outcome == 'error' else len(results or [])),
+                xbmc.LOGDEBUG)
+            yield key, results
+
+        for key in sorted(pending):
+            metrics.FEDERATED_RESULTS.inc(scraper=key, outcome='timeout')
+            xbmc.log("[Federated] {} missed its {:.1f} s deadline".format(key, self.deadline_for(key)),
+                     xbmc.LOGWARNING)
+
+    def search(self, title, year=None):
+        """Merged, ranked results from all backends that answered in time"""
+        merged = ResultMerger(title, year, self.backends)
+        errors = []
+        for key, results in self.search_iter(title, year):
+            if isinstance(results, dict) and 'error' in results:
+                errors.append('{}: {}'.format(key, results['error']))
+            else:
+                merged.add(key, results)
+        if not merged and errors and len(errors) == len(self.backends):
+            return {'error': 'All backends failed ({})'.format('; '.join(errors))}
+        return merged.ranked()[:self.max_results]
+
+
+class ResultMerger(object):
+    """Collects search results per backend and ranks them against the query"""
+
+    def __init__(self, title, year, backends):
+        self.query = normalize_title(title)
+        self.year = str(year) if year else ''
+        self.priority = dict((key, index) for index, key in enumerate(backends))
+        self.entries = {}  # (normalized title, year) -> merged scene
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, results):
+        for rank, scene in enumerate(results or []):
+            if not scene.get('id'):
+                continue
+            title = normalize_title(scene.get('title'))
+            # Untitled results cannot be matched across backends
+            identity = (title, result_year(scene)) if title else (key, str(scene['id']))
+            entry = self.entries.get(identity)
+            if entry is None:
+                entry = dict(scene)
+                entry['uniqueids'] = {}
+                entry['sources'] = []
+                entry['rank'] = rank
+                entry['priority'] = self.priority.get(key, len(self.priority))
+                self.entries[identity] = entry
+            elif self.priority.get(key, len(self.priority)) < entry['priority']:
+                # The higher priority backend supplies id, title and art
+                entry.update(scene)
+                entry['priority'] = self.priority[key]
+            if key not in entry['uniqueids']:
+                entry['uniqueids'][key] = str(scene['id'])
+                entry['sources'].append(key)
+                entry['rank'] = min(entry['rank'], rank)
+            if not entry.get('image') and scene.get('image'):
+                entry['image'] = scene['image']
+
+    def score(self, entry):
+        similarity = difflib.SequenceMatcher(None, self.query, normalize_title(entry.get('title'))).ratio()
+        score = similarity
+        if self.year and result_year(entry) == self.year:
+            score += 0.1
+        # Found by several backends, or high up in a backend's own ranking
+        score += 0.05 * min(len(entry['sources']) - 1, 3)
+        score -= 0.005 * min(entry['rank'], 20)
+        return score
+
+    def ranked(self):
+        scored = [(-self.score(e), e['priority'], e.get('title') or '', e) for e in self.entries.values()]
+        scored.sort(key=lambda item: item[:3])
+        results = []
+        for _, _, _, entry in scored:
+            entry = dict(entry)
+            entry.pop('rank', None)
+            entry.pop('priority', None)
+            entry['sources'] = sorted(entry['sources'], key=lambda k: self.priority.get(k, len(self.priority)))
+            results.append(entry)
+        return results
@@ -8,6 +8,7 @@ import json
 import xbmc
 import xbmcaddon
 from .PrimalFetish import primalfetish
+from .records import ArtSet, CastMember, Scene
 
 try:
     from ..AyloAPI import AyloAPI
@@ -96,103 +97,56 @@ class PrimalFetishScraper:
             if isinstance(result, dict) and 'error' in result:
                 return result
             
-            # Convert to Kodi format
-            info = {
-                'title': result.get('title', 'Untitled'),
-                'originaltitle': result.get('title', 'Untitled'),
-                'plot': result.get('description', ''),
-                'tagline': result.get('url', ''),
-                'studio': [],
-                'genre': [],
-                'tag': [],
-                'director': [],
-                'premiered': result.get('date', '')
-            }
-            
-            # Add duration
-            if result.get('duration'):
-                info['duration'] = int(result['duration'])
-            
-            # Add studio
-            studio = result.get('studio', {})
-            if isinstance(studio, dict):
-                studio_name = studio.get('name', 'Primal Fetish Network')
-                info['studio'].append(studio_name)
-                
-                # Add parent studio if present
-                parent = studio.get('parent', {})
-                if isinstance(parent, dict) and parent.get('name'):
-                    parent_name = parent['name']
-                    if parent_name and parent_name != studio_name:
-                        info['studio'].append(parent_name)
-            else:
-                info['studio'].append('Primal Fetish Network')
-            
-            # Add tags
-            for tag in result.get('tags', []):
-                if isinstance(tag, str):
-                    info['tag'].append(tag)
-                elif isinstance(tag, dict):
-                    info['tag'].append(tag.get('name', ''))
-            
-            # Build cast
-            cast = []
-            performers = result.get('performers', [])
-            for idx, performer in enumerate(performers):
-                if isinstance(performer, dict):
-                    cast.append({
-                        'name': performer.get('name', 'Unknown'),
-                        'role': '',
-                        'order': idx,
-                        'thumbnail': performer.get('image', '')
-                    })
-            
-            # Build available art - use higher quality if authenticated
-            available_art = {}
-            images = result.get('images', [])
-            
-            if images:
-                # Primary images
-                primary = images[0] if images else None
-                if primary:
-                    available_art['poster'] = primary
-                    available_art['thumb'] = primary
-                    available_art['fanart'] = primary
-                
-                # All images for selection
-                available_art['poster_list'] = images[:10]
-                available_art['fanart_list'] = images[:10]
-                available_art['thumb_list'] = images[:10]
-            
-            # If authenticated, try to get higher quality images
-            if self.is_authenticated:
-                try:
-                    premium_images = self._get_premium_images(scene_id)
-                    if premium_images:
-                        xbmc.log("PrimalFetish: Retrieved {} premium images".format(len(premium_images)), xbmc.LOGINFO)
-                        # Override with premium images
-                        if premium_images:
-                            available_art['poster'] = premium_images[0]
-                            available_art['thumb'] = premium_images[0]
-                            if len(premium_images) > 1:
-                                available_art['fanart'] = premium_images[1]
-                            available_art['poster_list'] = premium_images
-                            available_art['fanart_list'] = premium_images
-                            available_art['thumb_list'] = premium_images
-                except Exception as e:
-                    xbmc.log("PrimalFetish: Error getting premium images - {}".format(str(e)), xbmc.LOGWARNING)
-            
-            return {
-                'info': info,
-                'cast': cast,
-                'uniqueids': {'primalfetish': scene_id},
-                'available_art': available_art
-            }
+            return self._to_scene(result, scene_id)
             
         except Exception as e:
             xbmc.log("Primal Fetish get_details error: {}".format(str(e)), xbmc.LOGERROR)
             return {'error': str(e)}
     
+    def _to_scene(self, result, scene_id):
+        """Scene record for a postprocessed AyloAPI scene"""
+        # Add studio, and the parent studio if present
+        studios = ['Primal Fetish Network']
+        studio = result.get('studio', {})
+        if isinstance(studio, dict):
+            studios = [studio.get('name', 'Primal Fetish Network')]
+            parent = studio.get('parent', {})
+            if isinstance(parent, dict) and parent.get('name'):
+                studios.append(parent['name'])
+        
+        # Build available art - use higher quality if authenticated
+        art = ArtSet.from_images(result.get('images', []), limit=10,
+                                 art_types=('poster', 'fanart', 'thumb'), previews=result.get('previews'))
+        
+        # If authenticated, try to get higher quality images
+        if self.is_authenticated:
+            try:
+                premium_images = self._get_premium_images(scene_id)
+                if premium_images:
+                    xbmc.log("PrimalFetish: Retrieved {} premium images".format(len(premium_images)), xbmc.LOGINFO)
+                    # Override with premium images
+                    art = ArtSet(premium_images[0], premium_images[0],
+                                 premium_images[1] if len(premium_images) > 1 else art.fanart,
+                                 poster_list=premium_images, fanart_list=premium_images,
+                                 thumb_list=premium_images)
+            except Exception as e:
+                xbmc.log("PrimalFetish: Error getting premium images - {}".format(str(e)), xbmc.LOGWARNING)
+        
+        return Scene(
+            title=result.get('title'),
+            plot=result.get('description'),
+            tagline=result.get('url'),
+            premiered=result.get('date'),
+            duration=result.get('duration'),
+            studios=studios,
+            tags=result.get('tags', []),
+            cast=[CastMember(performer.get('name', 'Unknown'), order=idx, thumbnail=performer.get('image', ''))
+                  for idx, performer in enumerate(result.get('performers', []))
+                  if isinstance(performer, dict)],
+            uniqueids={'primalfetish': scene_id},
+            art=art,
+        )
+    
     def _get_premium_images(self, scene_id):
         """Get high-quality images using authenticated API"""
         if not self.is_authenticated or not self.api:
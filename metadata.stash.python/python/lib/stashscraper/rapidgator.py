@@ -542,7 +542,7 @@ def prompt_rapidgator_search(details, settings):
     Prompt user to search Rapidgator for higher quality version.
     
     Args:
-        details: Scene details from scraper
+        details: Scene record from the scraper
         settings: Addon settings
     
     Returns:
@@ -596,12 +596,11 @@ def prompt_rapidgator_search(details, settings):
         
         try:
             # Build search parameters from details
-            title = details.get('info', {}).get('title', '')
-            studio = details.get('info', {}).get('studio', [])
-            studio_name = studio[0] if studio else None
+            title = details.title
+            studio_name = details.studios[0] if details.studios else None
             
-            performers = [c.get('name') for c in details.get('cast', []) if c.get('name')]
-            date = details.get('info', {}).get('premiered', '')
+            performers = [c.name for c in details.cast if c.name]
+            date = details.premiered
             
             # Search
             searcher = RapidgatorSearcher(api)
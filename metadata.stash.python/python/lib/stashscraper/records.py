@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+Scene records shared by every scraper.
+
+Scrapers return a ``Scene`` from ``get_details`` instead of hand-building the
+``info``/``cast``/``uniqueids``/``available_art`` dicts. The records use
+``__slots__``, keep list fields as tuples and intern the strings that repeat
+across scenes (studios, tags, performer names, roles), so scenes held in
+caches or processed in bulk cost a fraction of the nested dicts. Conversion
+to Kodi (``Scene.apply``) and to NFO (``Scene.to_nfo``) lives here, once.
+
+Scrapers that still return the dict shape keep working: ``as_scene`` turns
+such a dict into a ``Scene``, and ``Scene.as_details`` gives the dict back.
+
+Example:
+    return Scene(
+        title=data['title'], plot=data.get('description', ''),
+        studios=[data['studio']], tags=data.get('tags', []),
+        cast=[CastMember(name, order=i) for i, name in enumerate(performers)],
+        art=ArtSet.from_images(data.get('images', [])),
+        uniqueids={'mysite': scene_id},
+    )
+"""
+
+import sys
+from xml.etree import ElementTree as ET
+
+ART_TYPES = ('poster', 'fanart', 'thumb', 'landscape')
+PRIMARY_ART = ('poster', 'thumb', 'fanart')
+
+# Strings longer than this are unlikely to repeat (plots, URLs)
+INTERN_MAX_LENGTH = 100
+
+try:
+    _intern = sys.intern  # Py3
+except AttributeError:
+    _intern = intern  # noqa: F821 - Py2 builtin
+
+
+def intern_string(value):
+    """The shared copy of a short string; other values are returned unchanged"""
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return _intern(value)
+    return value
+
+
+def _strings(values):
+    """Tuple of interned, non-empty strings without duplicates, in order"""
+    if not values:
+        return ()
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    seen = set()
+    result = []
+    for value in values:
+        if isinstance(value, dict):  # {'name': ...} as some APIs return tags
+            value = value.get('name')
+        if not value or value in seen:
+            continue
+        seen.add(value)
+        result.append(intern_string(value))
+    return tuple(result)
+
+
+def _url(value):
+    """URL from a plain string or an Aylo-style {'url': ..., 'preview': ...} entry"""
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('preview')
+    return value or None
+
+
+def _urls(values):
+    if not values:
+        return ()
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    result = []
+    for value in values:
+        url = _url(value)
+        if url and url not in result:
+            result.append(url)
+    return tuple(result)
+
+
+class CastMember(object):
+    """One performer"""
+
+    __slots__ = ('name', 'role', 'order', 'thumbnail')
+
+    def __init__(self, name, role='', order=0, thumbnail=''):
+        self.name = intern_string(name)
+        self.role = intern_string(role or '')
+        self.order = int(order or 0)
+        self.thumbnail = thumbnail or ''
+
+    @classmethod
+    def from_dict(cls, data, order=0):
+        return cls(data.get('name'), data.get('role', ''), data.get('order', order), data.get('thumbnail', ''))
+
+    def as_dict(self):
+        return {'name': self.name, 'role': self.role, 'order': self.order, 'thumbnail': self.thumbnail}
+
+    def to_actor(self):
+        import xbmc
+        return xbmc.Actor(self.name, self.role, self.order, self.thumbnail)
+
+    def __eq__(self, other):
+        return isinstance(other, CastMember) and self.as_dict() == other.as_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'CastMember({!r})'.format(self.name)
+
+
+class ArtSet(object):
+    """
+    Primary artwork (poster/thumb/fanart URLs) plus the images offered per
+    art type in Kodi's "Choose art" dialog. Identical choice lists share one
+    tuple. ``previews`` maps full-size URLs to smaller versions the chooser
+    shows instead, where the source has them.
+    """
+
+    __slots__ = ('poster', 'thumb', 'fanart', 'poster_list', 'fanart_list', 'thumb_list', 'landscape_list',
+                 'previews')
+
+    def __init__(self, poster=None, thumb=None, fanart=None, poster_list=(), fanart_list=(),
+                 thumb_list=(), landscape_list=(), previews=None):
+        self.poster = _url(poster)
+        self.thumb = _url(thumb)
+        self.fanart = _url(fanart)
+        self.previews = dict(previews) if previews else None
+        self.poster_list = self.fanart_list = self.thumb_list = self.landscape_list = ()
+        for art_type, urls in (('poster', poster_list), ('fanart', fanart_list),
+                               ('thumb', thumb_list), ('landscape', landscape_list)):
+            self._set_choices(art_type, _urls(urls))
+
+    @classmethod
+    def from_images(cls, images, limit=15, art_types=('poster', 'fanart'), previews=None):
+        """
+        First image as poster and fanart, and as thumb in its preview size if
+        ``previews`` has one; up to ``limit`` as choices for ``art_types``.
+        """
+        urls = _urls(images)
+        if not urls:
+            return cls()
+        primary = urls[0]
+        previews = dict((url, previews[url]) for url in urls[:limit] if url in previews) if previews else None
+        thumb = previews.get(primary, primary) if previews else primary
+        choices = dict((art_type + '_list', urls[:limit]) for art_type in art_types)
+        return cls(primary, thumb, primary, previews=previews, **choices)
+
+    @classmethod
+    def from_dict(cls, art):
+        """From any ``available_art`` dict the scrapers have produced"""
+        art = art or {}
+        choices = {}
+        for art_type in ART_TYPES:
+            urls = list(_urls(art.get(art_type + '_list')))
+            # Lists given for a primary type are choices too
+            if isinstance(art.get(art_type), (list, tuple)):
+                urls = list(_urls(art[art_type])) + [u for u in urls if u not in _urls(art[art_type])]
+            choices[art_type + '_list'] = urls
+        return cls(art.get('poster'), art.get('thumb'), art.get('fanart'), previews=art.get('previews'), **choices)
+
+    def _set_choices(self, art_type, urls):
+        urls = tuple(urls)
+        # Share the tuple with an identical list of another type
+        for other in ART_TYPES:
+            existing = getattr(self, other + '_list')
+            if existing and existing == urls:
+                urls = existing
+                break
+        setattr(self, art_type + '_list', urls)
+
+    def choices(self, art_type):
+        return getattr(self, art_type + '_list')
+
+    def set_choices(self, art_type, urls):
+        """Replace the images offered for ``art_type``, e.g. with duplicates removed"""
+        self._set_choices(art_type, _urls(urls))
+
+    def add_choices(self, urls, art_types=('poster', 'fanart', 'thumb')):
+        """Offer more images, e.g. web search results or extracted frames"""
+        urls = _urls(urls)
+        for art_type in art_types:
+            current = self.choices(art_type)
+            self._set_choices(art_type, current + tuple(u for u in urls if u not in current))
+
+    def set_defaults(self, poster=None, thumb=None, fanart=None):
+        """Fill in primary artwork that is still missing"""
+        self.poster = self.poster or _url(poster)
+        self.thumb = self.thumb or _url(thumb)
+        self.fanart = self.fanart or _url(fanart)
+
+    def preview(self, url):
+        """Smaller version of ``url`` for the art chooser, or ''"""
+        return self.previews.get(url, '') if self.previews else ''
+
+    def primary(self):
+        """Dict for ListItem.setArt"""
+        return dict((art_type, getattr(self, art_type)) for art_type in PRIMARY_ART if getattr(self, art_type))
+
+    def as_dict(self):
+        art = self.primary()
+        for art_type in ART_TYPES:
+            if self.choices(art_type):
+                art[art_type + '_list'] = list(self.choices(art_type))
+        if self.previews:
+            art['previews'] = dict(self.previews)
+        return art
+
+    def __bool__(self):
+        return bool(self.poster or self.thumb or self.fanart or any(self.choices(t) for t in ART_TYPES))
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return 'ArtSet({!r})'.format(self.primary())
+
+
+class Scene(object):
+    """Details of one scene as returned by a scraper's get_details"""
+
+    __slots__ = ('title', 'originaltitle', 'plot', 'tagline', 'premiered', 'duration', 'rating',
+                 'studios', 'genres', 'tags', 'directors', 'cast', 'uniqueids', 'art', 'extras')
+
+    def __init__(self, title='', originaltitle=None, plot='', tagline='', premiered='', duration=None,
+                 rating=None, studios=(), genres=(), tags=(), directors=(), cast=(), uniqueids=None,
+                 art=None, extras=None):
+        self.title = title or 'Untitled'
+        self.originaltitle = originaltitle or self.title
+        self.plot = plot or ''
+        self.tagline = tagline or ''
+        self.premiered = premiered or ''
+        self.duration = int(duration) if duration else None
+        self.rating = float(rating) if rating is not None else None
+        self.studios = _strings(studios)
+        self.genres = _strings(genres)
+        self.tags = _strings(tags)
+        self.directors = _strings(directors)
+        self.cast = tuple(c if isinstance(c, CastMember) else CastMember.from_dict(c, i)
+                          for i, c in enumerate(cast or ()) if c)
+        self.uniqueids = dict(uniqueids or {})
+        self.art = art if isinstance(art, ArtSet) else ArtSet.from_dict(art)
+        # Values for later steps that Kodi does not display, e.g. a downloaded file
+        self.extras = extras
+
+    @classmethod
+    def from_details(cls, details):
+        """From the ``info``/``cast``/``uniqueids``/``available_art`` dict shape"""
+        info = details.get('info', {})
+        return cls(
+            title=info.get('title'), originaltitle=info.get('originaltitle'), plot=info.get('plot'),
+            tagline=info.get('tagline'), premiered=info.get('premiered'), duration=info.get('duration'),
+            rating=info.get('rating'), studios=info.get('studio'), genres=info.get('genre'),
+            tags=info.get('tag'), directors=info.get('director'),
+            cast=[c for c in details.get('cast', []) if c.get('name')],
+            uniqueids=details.get('uniqueids'), art=ArtSet.from_dict(details.get('available_art')),
+        )
+
+    def as_details(self):
+        """The dict shape, for code that has not moved to records yet"""
+        info = {
+            'title': self.title,
+            'originaltitle': self.originaltitle,
+            'plot': self.plot,
+            'tagline': self.tagline,
+            'studio': list(self.studios),
+            'genre': list(self.genres),
+            'tag': list(self.tags),
+            'director': list(self.directors),
+            'premiered': self.premiered,
+        }
+        if self.duration:
+            info['duration'] = self.duration
+        if self.rating is not None:
+            info['rating'] = self.rating
+        return {
+            'info': info,
+            'cast': [c.as_dict() for c in self.cast],
+            'uniqueids': dict(self.uniqueids),
+            'available_art': self.art.as_dict(),
+        }
+
+    # ----------------------------
+    # Kodi
+    # ----------------------------
+    def apply(self, listitem, default_uniqueid):
+        """Fill a ListItem's video info tag, cast, unique IDs and artwork"""
+        infotag = listitem.getVideoInfoTag()
+        infotag.setTitle(self.title)
+        infotag.setOriginalTitle(self.originaltitle)
+        infotag.setPlot(self.plot)
+        infotag.setTagLine(self.tagline)
+        infotag.setStudios(list(self.studios))
+        infotag.setGenres(list(self.genres))
+        infotag.setTags(list(self.tags))
+        infotag.setDirectors(list(self.directors))
+        infotag.setPremiered(self.premiered)
+        if self.duration:
+            infotag.setDuration(self.duration)
+        if self.rating is not None:
+            infotag.setRating(self.rating)
+        infotag.setCast([c.to_actor() for c in self.cast])
+        infotag.setUniqueIDs(self.uniqueids, default_uniqueid)
+
+        art = self.art.primary()
+        if art:
+            listitem.setArt(art)
+        for art_type in ART_TYPES:
+            for url in self.art.choices(art_type):
+                preview = self.art.preview(url)
+                try:
+                    if preview:
+                        try:
+                            listitem.addAvailableArtwork(url, art_type, preview=preview)
+                            continue
+                        except TypeError:
+                            pass  # Kodi 18 takes no preview
+                    listitem.addAvailableArtwork(url, art_type)
+                except Exception:
+                    pass
+
+    def to_nfo(self, default_uniqueid='stash'):
+        """<movie> element for an NFO file"""
+        root = ET.Element('movie')
+
+        def add(tag, text, parent=root):
+            element = ET.SubElement(parent, tag)
+            element.text = text
+            return element
+
+        add('title', self.title)
+        if self.originaltitle != self.title:
+            add('originaltitle', self.originaltitle)
+        if self.plot:
+            add('plot', self.plot)
+        if self.tagline:
+            add('tagline', self.tagline)
+        year = self.premiered.split('-')[0]
+        if year:
+            add('year', year)
+            add('premiered', self.premiered)
+        if self.duration:
+            add('runtime', str(self.duration))
+        if self.rating is not None:
+            add('rating', str(self.rating))
+        for tag, values in (('studio', self.studios), ('genre', self.genres),
+                            ('tag', self.tags), ('director', self.directors)):
+            for value in values:
+                add(tag, value)
+        for member in self.cast:
+            actor = ET.SubElement(root, 'actor')
+            add('name', member.name, actor)
+            if member.role:
+                add('role', member.role, actor)
+            if member.thumbnail:
+                add('thumb', member.thumbnail, actor)
+
+        uniqueid = add('uniqueid', self.uniqueids.get(default_uniqueid, ''))
+        uniqueid.set('type', default_uniqueid)
+        uniqueid.set('default', 'true')
+        for id_type, value in sorted(self.uniqueids.items()):
+            if id_type != default_uniqueid:
+                add('uniqueid', value).set('type', id_type)
+
+        if self.art.thumb:
+            add('thumb', self.art.thumb)
+        if self.art.fanart:
+            fanart = add('thumb', self.art.fanart, ET.SubElement(root, 'fanart'))
+            if self.art.preview(self.art.fanart):
+                fanart.set('preview', self.art.preview(self.art.fanart))
+        if self.art.poster:
+            add('poster', self.art.poster)
+        return root
+
+    def __repr__(self):
+        return 'Scene({!r}, {!r})'.format(self.title, self.uniqueids)
+
+
+def as_scene(details):
+    """Scene for a get_details result; error dicts and None are returned unchanged"""
+    if isinstance(details, Scene) or not isinstance(details, dict) or 'error' in details:
+        return details
+    return Scene.from_details(details)
+
+
+def is_error(details):
+    return isinstance(details, dict) and 'error' in details
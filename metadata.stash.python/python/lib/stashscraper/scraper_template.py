@@ -7,7 +7,7 @@ Follow this pattern to create scrapers for other sites/APIs.
 Key Requirements:
 1. Implement search(title, year) method
 2. Implement get_details(scene_id) method
-3. Return data in the specified format
+3. Return a records.Scene from get_details (see records.py)
 4. Handle errors gracefully
 5. Support SSL/HTTPS connections
 6. Implement authentication if required
@@ -17,6 +17,8 @@ import json
 import ssl
 import xbmc
 
+from .records import ArtSet, CastMember, Scene
+
 try:
     from urllib import urlencode
     from urllib2 import Request, urlopen, HTTPError, URLError
@@ -205,7 +207,7 @@ class TemplateScraperName:
             scene_id: ID of the scene
         
         Returns:
-            dict: Scene details with info, cast, uniqueids, and available_art
+            Scene: the scene record, or {'error': ...}
         """
         # Make API request (adjust endpoint to match your API)
         result = self._make_request('scenes/{}'.format(scene_id))
@@ -218,89 +220,57 @@ class TemplateScraperName:
         if not scene:
             return {'error': 'Scene not found'}
         
-        # Build info dict - this is the format Kodi expects
-        info = {
-            'title': scene.get('title', 'Untitled'),
-            'originaltitle': scene.get('original_title', scene.get('title', 'Untitled')),
-            'plot': scene.get('description', '') or scene.get('synopsis', ''),
-            'tagline': scene.get('tagline', ''),
-            'studio': [],
-            'genre': [],
-            'tag': [],
-            'director': [],
-            'premiered': scene.get('release_date', '') or scene.get('date', '')
-        }
-        
         # Add duration (convert to seconds if needed)
-        if scene.get('duration'):
-            duration = scene['duration']
-            # If duration is in minutes, convert to seconds
-            if duration < 500:  # Assume anything under 500 is minutes
-                duration = duration * 60
-            info['duration'] = int(duration)
+        duration = scene.get('duration')
+        if duration and duration < 500:  # Assume anything under 500 is minutes
+            duration = duration * 60
         
         # Add rating (0-10 scale)
+        rating = None
         if scene.get('rating'):
             rating = float(scene['rating'])
             # Convert to 0-10 scale if needed
             if rating > 10:
                 rating = rating / 10.0
-            info['rating'] = rating
-        
-        # Add studio
-        studio_name = self._extract_studio_name(scene)
-        if studio_name:
-            info['studio'].append(studio_name)
         
         # Add directors
         directors = scene.get('directors', []) or scene.get('director', [])
-        if directors:
-            if isinstance(directors, list):
-                for director in directors:
-                    director_name = director.get('name', director) if isinstance(director, dict) else str(director)
-                    info['director'].append(director_name)
-            else:
-                info['director'].append(str(directors))
+        if not isinstance(directors, list):
+            directors = [str(directors)]
+        directors = [d.get('name', '') if isinstance(d, dict) else str(d) for d in directors]
         
-        # Add tags and genres
-        tags = scene.get('tags', []) or scene.get('categories', [])
-        for tag in tags:
-            tag_name = tag.get('name', tag) if isinstance(tag, dict) else str(tag)
-            info['tag'].append(tag_name)
-            
-            # Classify some tags as genres
-            if any(keyword in tag_name.lower() for keyword in ['anal', 'oral', 'group']):
-                info['genre'].append(tag_name)
+        # Add tags and genres; classify some tags as genres
+        tags = [tag.get('name', '') if isinstance(tag, dict) else str(tag)
+                for tag in scene.get('tags', []) or scene.get('categories', [])]
+        genres = [tag for tag in tags if any(keyword in tag.lower() for keyword in ['anal', 'oral', 'group'])]
         
         # Build cast list
         cast = []
         performers = scene.get('performers', []) or scene.get('models', []) or scene.get('stars', [])
         for idx, performer in enumerate(performers):
             if isinstance(performer, dict):
-                cast.append({
-                    'name': performer.get('name', 'Unknown'),
-                    'role': performer.get('role', ''),
-                    'order': idx,
-                    'thumbnail': performer.get('image', '') or performer.get('thumbnail', '')
-                })
+                cast.append(CastMember(performer.get('name', 'Unknown'), performer.get('role', ''), idx,
+                                       performer.get('image', '') or performer.get('thumbnail', '')))
             else:
-                cast.append({
-                    'name': str(performer),
-                    'role': '',
-                    'order': idx,
-                    'thumbnail': ''
-                })
+                cast.append(CastMember(str(performer), order=idx))
         
-        # Build artwork dict
-        available_art = self._build_artwork(scene)
-        
-        # Return in the format expected by scraper.py
-        return {
-            'info': info,
-            'cast': cast,
-            'uniqueids': {'yoursite': scene_id},  # Change 'yoursite' to your scraper name
-            'available_art': available_art
-        }
+        # Return the scene record scraper.py expects
+        return Scene(
+            title=scene.get('title'),
+            originaltitle=scene.get('original_title'),
+            plot=scene.get('description', '') or scene.get('synopsis', ''),
+            tagline=scene.get('tagline', ''),
+            premiered=scene.get('release_date', '') or scene.get('date', ''),
+            duration=duration,
+            rating=rating,
+            studios=[self._extract_studio_name(scene)],
+            genres=genres,
+            tags=tags,
+            directors=directors,
+            cast=cast,
+            uniqueids={'yoursite': scene_id},  # Change 'yoursite' to your scraper name
+            art=self._build_artwork(scene),
+        )
     
     def _extract_studio_name(self, scene):
         """Helper to extract studio name from scene data"""
@@ -323,30 +293,16 @@ class TemplateScraperName:
         return names
     
     def _build_artwork(self, scene):
-        """Helper to build artwork dict from scene data"""
-        available_art = {}
+        """Helper to build the artwork from scene data"""
+        # Additional images/gallery, limited to 15
+        images = scene.get('images', []) or scene.get('gallery', []) or scene.get('screenshots', [])
+        art = ArtSet.from_images(images, limit=15)
         
         # Primary image
         primary_image = scene.get('image') or scene.get('thumbnail') or scene.get('poster')
         if primary_image:
-            available_art['poster'] = [{'url': primary_image, 'preview': primary_image}]
-            available_art['thumb'] = [{'url': primary_image, 'preview': primary_image}]
-            available_art['fanart'] = [{'url': primary_image, 'preview': primary_image}]
-        
-        # Additional images/gallery
-        images = scene.get('images', []) or scene.get('gallery', []) or scene.get('screenshots', [])
-        for img in images[:15]:  # Limit to 15 images
-            img_url = img.get('url', img) if isinstance(img, dict) else str(img)
-            if img_url:
-                for art_type in ['poster', 'fanart']:
-                    if art_type not in available_art:
-                        available_art[art_type] = []
-                    available_art[art_type].append({
-                        'url': img_url,
-                        'preview': img_url
-                    })
-        
-        return available_art
+            art.poster = art.thumb = art.fanart = primary_image
+        return art
 
 
 # Example usage and testing
@@ -366,4 +322,6 @@ if __name__ == '__main__':
     if results and isinstance(results, list) and len(results) > 0:
         scene_id = results[0]['id']
         details = scraper.get_details(scene_id)
+        if isinstance(details, Scene):
+            details = details.as_details()
         print("Scene details:", json.dumps(details, indent=2))
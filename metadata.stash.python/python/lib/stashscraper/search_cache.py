@@ -0,0 +1,165 @@
+"""
+Image Search Cache
+Remembers Google/Bing image search answers and counts the daily API calls
+
+Every answered query is stored per engine under a normalized key (lower-case
+words only, so "Studio - Title!" and "studio title" are one query) and
+reused until it is older than the TTL. Rescanning a library therefore costs
+no API calls for scenes searched before.
+
+Each engine's calls are counted per UTC day against its configured quota.
+WebImageSearch asks ``remaining`` before every call: an engine at its quota
+is served from the cache only, and one running low is skipped in 'both' mode
+while the other engine still has calls left.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+DEFAULT_TTL = 30 * 24 * 3600
+# Share of the daily quota below which an engine counts as running low
+LOW_QUOTA_SHARE = 0.1
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS queries (
+        engine TEXT NOT NULL,
+        query TEXT NOT NULL,
+        requested INTEGER NOT NULL,
+        created REAL NOT NULL,
+        results TEXT NOT NULL,
+        PRIMARY KEY (engine, query)
+    )""",
+    """CREATE TABLE IF NOT EXISTS quota (
+        engine TEXT NOT NULL,
+        day TEXT NOT NULL,
+        used INTEGER NOT NULL,
+        PRIMARY KEY (engine, day)
+    )""",
+)
+
+# Upserts (INSERT ... ON CONFLICT DO UPDATE) need SQLite 3.24
+UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+# One cache per database file and process, shared by every WebImageSearch
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def normalize_query(query):
+    """Lower-case words only, the form queries are cached under"""
+    return ' '.join(WORD.findall((query or '').lower()))
+
+
+def _today():
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+
+class SearchCache(object):
+    """Persistent image search answers with a TTL, plus per-engine daily quotas"""
+
+    @classmethod
+    def open(cls, path, ttl=DEFAULT_TTL, quotas=None):
+        """The process-wide cache stored at ``path``, with its TTL and quotas updated"""
+        key = os.path.abspath(path)
+        with _CACHES_LOCK:
+            cache = _CACHES.get(key)
+            if cache is None:
+                cache = _CACHES[key] = cls(path, ttl, quotas)
+            else:
+                cache.ttl = ttl
+                cache.quotas = dict(quotas or {})
+        return cache
+
+    def __init__(self, path, ttl=DEFAULT_TTL, quotas=None):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            ttl: Seconds an answer is reused
+            quotas: Optional {engine: calls per day}; engines not listed or
+                    with 0 are not limited
+        """
+        self.path = path
+        self.ttl = ttl
+        self.quotas = dict(quotas or {})
+        with closing(self._connect()) as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.execute("DELETE FROM queries WHERE created < ?", (time.time() - self.ttl,))
+            conn.execute("DELETE FROM quota WHERE day < ?", (_today(),))
+            conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # ----------------------------
+    # Answers
+    # ----------------------------
+    def get(self, engine, query, count):
+        """
+        Cached image URLs of ``engine`` for ``query``, or None if the query
+        was not answered within the TTL for at least ``count`` results.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT requested, created, results FROM queries WHERE engine = ? AND query = ?",
+                               (engine, normalize_query(query))).fetchone()
+        if row is None or row[0] < count or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[2])[:count]
+
+    def put(self, engine, query, count, urls):
+        """Store the answer of ``engine`` to ``query``, asked for ``count`` results"""
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO queries (engine, query, requested, created, results) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (engine, normalize_query(query), count, time.time(), json.dumps(list(urls))))
+            conn.commit()
+
+    def clear(self):
+        """Forget every cached answer; the API call counts are kept"""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM queries")
+            conn.commit()
+
+    # ----------------------------
+    # Quotas
+    # ----------------------------
+    # Counts live in the database only, as other Kodi processes (a library
+    # scan next to a manual refresh) spend from the same quota
+    def used(self, engine):
+        """API calls ``engine`` made today"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT used FROM quota WHERE engine = ? AND day = ?", (engine, _today())).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self, engine):
+        """API calls ``engine`` has left today, or None if it is not limited"""
+        quota = self.quotas.get(engine)
+        if not quota:
+            return None
+        return max(0, quota - self.used(engine))
+
+    def is_low(self, engine):
+        """True if ``engine`` has used all but ``LOW_QUOTA_SHARE`` of its quota today"""
+        remaining = self.remaining(engine)
+        return remaining is not None and remaining <= self.quotas[engine] * LOW_QUOTA_SHARE
+
+    def spend(self, engine):
+        """Count one API call of ``engine``; returns its calls today"""
+        key = (engine, _today())
+        with closing(self._connect()) as conn:
+            if UPSERT:
+                conn.execute("INSERT INTO quota (engine, day, used) VALUES (?, ?, 1) "
+                             "ON CONFLICT (engine, day) DO UPDATE SET used = used + 1", key)
+            else:
+                conn.execute("INSERT OR IGNORE INTO quota (engine, day, used) VALUES (?, ?, 0)", key)
+                conn.execute("UPDATE quota SET used = used + 1 WHERE engine = ? AND day = ?", key)
+            used = conn.execute("SELECT used FROM quota WHERE engine = ? AND day = ?", key).fetchone()[0]
+            conn.commit()
+        return used
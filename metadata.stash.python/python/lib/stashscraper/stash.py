@@ -1,20 +1,29 @@
 import json
+import re
 import ssl
 import time
 import xbmc
 
 try:
-    from urllib2 import Request, urlopen, HTTPError, URLError
+    from ..py_common.jsonstream import JSONArrayStream
+    from ..py_common import metrics, timing
+    from .records import ArtSet, CastMember, Scene
+except ImportError:
+    import os
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from py_common.jsonstream import JSONArrayStream
+    from py_common import metrics, timing
+    from stashscraper.records import ArtSet, CastMember, Scene
+
+try:
+    from urllib2 import Request, HTTPError, URLError
 except ImportError:  # py2 / py3
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
     from urllib.error import HTTPError, URLError
 
-try:
-    from .web_image_search import WebImageSearch
-    WEB_IMAGE_SEARCH_AVAILABLE = True
-except ImportError:
-    WEB_IMAGE_SEARCH_AVAILABLE = False
-    xbmc.log("Web image search module not available", xbmc.LOGWARNING)
+# Name of the first GraphQL field, used to tag request timings
+GRAPHQL_OPERATION = re.compile(r'\{\s*(\w+)')
 
 
 class StashScraper:
@@ -46,8 +55,13 @@ class StashScraper:
         
         # Initialize web image search if enabled
         self.web_search = None
-        if settings and WEB_IMAGE_SEARCH_AVAILABLE:
-            if settings.getSettingBool('enable_web_image_search'):
+        if settings and settings.getSettingBool('enable_web_image_search'):
+            # Only imported when web image search is enabled
+            try:
+                from .web_image_search import WebImageSearch
+            except ImportError:
+                xbmc.log("Web image search module not available", xbmc.LOGWARNING)
+            else:
                 google_key = settings.getSettingString('google_api_key')
                 google_cx = settings.getSettingString('google_cx')
                 bing_key = settings.getSettingString('bing_api_key')
@@ -55,12 +69,16 @@ class StashScraper:
                 self.web_search = WebImageSearch(
                     google_api_key=google_key,
                     google_cx=google_cx,
-                    bing_api_key=bing_key
+                    bing_api_key=bing_key,
+                    cache_size=settings.getSettingInt('web_image_cache_size') * 1024 * 1024,
+                    search_ttl=settings.getSettingInt('web_search_cache_days') * 24 * 3600,
+                    quotas={'google': settings.getSettingInt('google_daily_quota'),
+                            'bing': settings.getSettingInt('bing_daily_quota')}
                 )
                 xbmc.log("Web image search initialized", xbmc.LOGINFO)
     
-    def _make_request(self, query, variables=None, retry_count=0):
-        """Make a GraphQL request to Stash with retry logic"""
+    def _open_request(self, query, variables=None, retry_count=0):
+        """Send a GraphQL request to Stash with retry logic and return the open response"""
         try:
             headers = {
                 'Content-Type': 'application/json',
@@ -83,16 +101,9 @@ class StashScraper:
             )
             
             # Use SSL context for HTTPS connections
-            response = urlopen(request, timeout=self.timeout, context=self.ssl_context)
-            result = json.loads(response.read().decode('utf-8'))
-            
-            if 'errors' in result:
-                error_detail = result['errors'][0].get('message', 'Unknown error')
-                xbmc.log("[Stash Scraper] GraphQL error: {}".format(error_detail), xbmc.LOGERROR)
-                return {'error': 'GraphQL error: {}'.format(error_detail)}
-            
-            xbmc.log("[Stash Scraper] Request successful", xbmc.LOGDEBUG)
-            return result.get('data', {})
+            operation = GRAPHQL_OPERATION.search(query)
+            return timing.urlopen(request, timeout=self.timeout, context=self.ssl_context,
+                                  scraper='stash', operation=operation.group(1) if operation else 'graphql')
         
         except HTTPError as e:
             error_msg = "HTTP Error {}: {}".format(e.code, e.reason)
@@ -101,8 +112,9 @@ class StashScraper:
             # Retry on server errors (5xx) but not client errors (4xx)
             if e.code >= 500 and retry_count < self.max_retries:
                 xbmc.log("[Stash Scraper] Retrying after server error...", xbmc.LOGWARNING)
+                metrics.RETRIES.inc(scraper='stash', reason='http_{}'.format(e.code))
                 time.sleep(self.retry_delay)
-                return self._make_request(query, variables, retry_count + 1)
+                return self._open_request(query, variables, retry_count + 1)
             
             return {'error': error_msg}
         
@@ -113,8 +125,9 @@ class StashScraper:
             # Retry on connection errors
             if retry_count < self.max_retries:
                 xbmc.log("[Stash Scraper] Retrying after connection error...", xbmc.LOGWARNING)
+                metrics.RETRIES.inc(scraper='stash', reason='connection')
                 time.sleep(self.retry_delay)
-                return self._make_request(query, variables, retry_count + 1)
+                return self._open_request(query, variables, retry_count + 1)
             
             return {'error': error_msg}
         
@@ -123,6 +136,59 @@ class StashScraper:
             xbmc.log("[Stash Scraper] Unexpected error: {}".format(error_msg), xbmc.LOGERROR)
             return {'error': error_msg}
     
+    def _graphql_error(self, result):
+        """Return an error dict if a GraphQL response reports errors"""
+        if result.get('errors'):
+            error_detail = result['errors'][0].get('message', 'Unknown error')
+            xbmc.log("[Stash Scraper] GraphQL error: {}".format(error_detail), xbmc.LOGERROR)
+            return {'error': 'GraphQL error: {}'.format(error_detail)}
+        return None
+    
+    def _make_request(self, query, variables=None):
+        """Make a GraphQL request to Stash and return the parsed ``data``"""
+        response = self._open_request(query, variables)
+        if isinstance(response, dict):
+            return response
+        
+        try:
+            # json.loads accepts bytes directly - no decoded str copy of the body
+            result = json.loads(response.read())
+        except Exception as e:
+            error_msg = "Unexpected error: {}".format(str(e))
+            xbmc.log("[Stash Scraper] Unexpected error: {}".format(error_msg), xbmc.LOGERROR)
+            return {'error': error_msg}
+        finally:
+            response.close()
+        
+        error = self._graphql_error(result)
+        if error:
+            return error
+        
+        xbmc.log("[Stash Scraper] Request successful", xbmc.LOGDEBUG)
+        return result.get('data') or {}
+    
+    def _stream_request(self, query, variables, path):
+        """
+        Make a GraphQL request and stream the array at ``data.<path>``.
+        
+        Returns an open JSONArrayStream, or an error dict if the request failed.
+        Array items are decoded one at a time as the response arrives; once the
+        stream is exhausted, check ``_stream_error(stream)`` for GraphQL errors.
+        """
+        response = self._open_request(query, variables)
+        if isinstance(response, dict):
+            return response
+        return JSONArrayStream(response, ('data',) + tuple(path))
+    
+    def _stream_error(self, stream):
+        """Return an error dict for GraphQL errors reported around a streamed array"""
+        try:
+            return self._graphql_error(stream.envelope())
+        except ValueError as e:
+            return {'error': 'Unexpected error: {}'.format(str(e))}
+        finally:
+            stream.close()
+    
     def search(self, title, year=None):
         """Search for scenes by title"""
         query = """
@@ -156,32 +222,42 @@ query findScenes($scene_filter: SceneFilterType, $filter: FindFilterType!) {
             'scene_filter': {}
         }
         
-        result = self._make_request(query, variables)
-        
-        if 'error' in result:
-            return result
+        # Stream the scene list so each scene is converted as it arrives
+        # instead of holding the whole page in memory
+        stream = self._stream_request(query, variables, ('findScenes', 'scenes'))
         
-        if not result.get('findScenes') or not result['findScenes'].get('scenes'):
-            return []
+        if isinstance(stream, dict):
+            return stream
         
         scenes = []
-        for scene in result['findScenes']['scenes']:
-            # Filter by year if provided
-            if year and scene.get('date'):
-                try:
-                    scene_year = scene['date'].split('-')[0]
-                    if scene_year != str(year):
-                        continue
-                except (ValueError, IndexError):
-                    pass
-            
-            scenes.append({
-                'id': scene['id'],
-                'title': scene.get('title', 'Untitled'),
-                'date': scene.get('date', ''),
-                'image': scene['paths'].get('screenshot', '') if scene.get('paths') else ''
-            })
+        try:
+            for scene in stream:
+                # Filter by year if provided
+                if year and scene.get('date'):
+                    try:
+                        scene_year = scene['date'].split('-')[0]
+                        if scene_year != str(year):
+                            continue
+                    except (ValueError, IndexError):
+                        pass
+                
+                scenes.append({
+                    'id': scene['id'],
+                    'title': scene.get('title', 'Untitled'),
+                    'date': scene.get('date', ''),
+                    'image': scene['paths'].get('screenshot', '') if scene.get('paths') else ''
+                })
+        except Exception as e:
+            stream.close()
+            error_msg = "Unexpected error: {}".format(str(e))
+            xbmc.log("[Stash Scraper] Unexpected error: {}".format(error_msg), xbmc.LOGERROR)
+            return {'error': error_msg}
+        
+        error = self._stream_error(stream)
+        if error:
+            return error
         
+        xbmc.log("[Stash Scraper] Request successful ({} bytes streamed)".format(stream.bytes_read), xbmc.LOGDEBUG)
         return scenes
     
     def get_details(self, scene_id):
@@ -230,62 +306,31 @@ query findScene($id: ID!) {
         if not scene:
             return {'error': 'Scene not found'}
         
-        # Build info dict
-        info = {
-            'title': scene.get('title', 'Untitled'),
-            'originaltitle': scene.get('title', 'Untitled'),
-            'plot': scene.get('details', ''),
-            'tagline': scene.get('url', ''),
-            'studio': [],
-            'genre': [],
-            'tag': [],
-            'director': [],
-            'premiered': scene.get('date', '')
-        }
-        
         # Add duration (files is an array)
+        duration = None
         if scene.get('files') and len(scene['files']) > 0 and scene['files'][0].get('duration'):
-            info['duration'] = int(float(scene['files'][0]['duration']))
+            duration = int(float(scene['files'][0]['duration']))
         
         # Add rating (convert from 0-100 to 0-10)
+        rating = None
         if scene.get('rating100'):
-            info['rating'] = float(scene['rating100']) / 10.0
-        
-        # Add studio
-        if scene.get('studio'):
-            info['studio'].append(scene['studio']['name'])
+            rating = float(scene['rating100']) / 10.0
         
-        # Add tags as genres and tags
-        if scene.get('tags'):
-            for tag in scene['tags']:
-                tag_name = tag['name']
-                info['tag'].append(tag_name)
-                # Some tags might be genres
-                if self._is_genre_tag(tag_name):
-                    info['genre'].append(tag_name)
+        # Add tags as genres and tags; some tags might be genres
+        tags = [tag['name'] for tag in scene.get('tags') or []]
+        genres = [tag for tag in tags if self._is_genre_tag(tag)]
         
         # Build cast list from performers
-        cast = []
-        if scene.get('performers'):
-            for idx, performer in enumerate(scene['performers']):
-                cast.append({
-                    'name': performer['name'],
-                    'role': performer.get('disambiguation', ''),
-                    'order': idx,
-                    'thumbnail': performer.get('image_path', '')
-                })
+        cast = [CastMember(performer['name'], performer.get('disambiguation', ''), idx,
+                           performer.get('image_path', ''))
+                for idx, performer in enumerate(scene.get('performers') or [])]
         
-        # Build artwork dict
-        available_art = {}
+        # Build artwork
+        art = ArtSet()
         if scene.get('paths'):
             paths = scene['paths']
-            if paths.get('screenshot'):
-                available_art['thumb'] = paths['screenshot']
-                available_art['poster'] = paths['screenshot']
-            if paths.get('webp'):
-                available_art['fanart'] = paths['webp']
-            elif paths.get('screenshot'):
-                available_art['fanart'] = paths['screenshot']
+            art.set_defaults(poster=paths.get('screenshot'), thumb=paths.get('screenshot'),
+                             fanart=paths.get('webp') or paths.get('screenshot'))
         
         # Use web search as fallback if no images found or if not in fallback-only mode
         if self.web_search and self.settings:
@@ -295,7 +340,7 @@ query findScene($id: ID!) {
             should_search = False
             if fallback_only:
                 # Only search if no images from Stash
-                should_search = not available_art or len(available_art) == 0
+                should_search = not art
             else:
                 # Always search to supplement existing images
                 should_search = True
@@ -324,28 +369,30 @@ query findScene($id: ID!) {
                         if downloaded_images:
                             xbmc.log("Found {} web images for scene".format(len(downloaded_images)), xbmc.LOGINFO)
                             
-                            # If no poster/thumb, use first web image
-                            if not available_art.get('poster') and len(downloaded_images) > 0:
-                                available_art['poster'] = downloaded_images[0]
-                            if not available_art.get('thumb') and len(downloaded_images) > 0:
-                                available_art['thumb'] = downloaded_images[0]
+                            # If no poster/thumb, use first web image; no fanart, the second (or first if only one)
+                            art.set_defaults(poster=downloaded_images[0], thumb=downloaded_images[0],
+                                             fanart=downloaded_images[1 if len(downloaded_images) > 1 else 0])
                             
-                            # If no fanart, use second web image (or first if only one)
-                            if not available_art.get('fanart') and len(downloaded_images) > 0:
-                                available_art['fanart'] = downloaded_images[1 if len(downloaded_images) > 1 else 0]
-                            
-                            # Store all web images for potential use
-                            available_art['web_images'] = downloaded_images
+                            # Offer all web images in the "Choose art" dialog
+                            art.add_choices(downloaded_images)
                         
                 except Exception as e:
                     xbmc.log("Web image search failed: {}".format(str(e)), xbmc.LOGERROR)
         
-        return {
-            'info': info,
-            'cast': cast,
-            'uniqueids': {'stash': scene_id},
-            'available_art': available_art
-        }
+        return Scene(
+            title=scene.get('title'),
+            plot=scene.get('details'),
+            tagline=scene.get('url'),
+            premiered=scene.get('date'),
+            duration=duration,
+            rating=rating,
+            studios=[scene['studio']['name']] if scene.get('studio') else [],
+            genres=genres,
+            tags=tags,
+            cast=cast,
+            uniqueids={'stash': scene_id},
+            art=art,
+        )
     
     def scrape_scene(self, scene_id, scraper_source='stashdb'):
         """Trigger Stash to scrape a scene from external sources (StashDB or TPDB)
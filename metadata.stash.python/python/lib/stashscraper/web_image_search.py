@@ -6,12 +6,24 @@ Searches Google and Bing for images and downloads them for Kodi metadata
 import json
 import os
 import hashlib
+import threading
 import xbmc
 
 try:
-    from urllib2 import Request, urlopen, HTTPError, quote
+    from ..py_common import metrics, timing
+    from ..py_common.cache_index import CacheIndex, DEFAULT_MAX_BYTES
+    from ..py_common.download import Downloader
+except (ImportError, ValueError):
+    from py_common import metrics, timing
+    from py_common.cache_index import CacheIndex, DEFAULT_MAX_BYTES
+    from py_common.download import Downloader
+
+from .search_cache import SearchCache, DEFAULT_TTL
+
+try:
+    from urllib2 import Request, HTTPError, quote
 except ImportError:  # py3
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
     from urllib.error import HTTPError
     from urllib.parse import quote
 
@@ -19,7 +31,12 @@ except ImportError:  # py3
 class WebImageSearch:
     """Search for images on Google and Bing"""
     
-    def __init__(self, cache_dir=None, google_api_key=None, google_cx=None, bing_api_key=None):
+    # API endpoints
+    GOOGLE_API_URL = "https://www.googleapis.com/customsearch/v1"
+    BING_API_URL = "https://api.bing.microsoft.com/v7.0/images/search"
+    
+    def __init__(self, cache_dir=None, google_api_key=None, google_cx=None, bing_api_key=None,
+                 cache_size=DEFAULT_MAX_BYTES, search_ttl=DEFAULT_TTL, quotas=None, search_db=None):
         """
         Initialize web image searcher
         
@@ -28,11 +45,17 @@ class WebImageSearch:
             google_api_key: Google Custom Search API key
             google_cx: Google Custom Search Engine ID
             bing_api_key: Bing Search API key
+            cache_size: Byte budget of the image cache, 0 for no limit
+            search_ttl: Seconds a search answer is reused
+            quotas: Optional {'google': calls per day, 'bing': calls per day}, 0 for no limit
+            search_db: SQLite file for the search answers and API call counts
+                       (default: image_searches.db in the addon profile)
         """
         self.cache_dir = cache_dir or self._get_default_cache_dir()
         self.google_api_key = google_api_key
         self.google_cx = google_cx
         self.bing_api_key = bing_api_key
+        self.downloader = Downloader(scraper='web_image_search')
         
         # Create cache directory if it doesn't exist
         if not os.path.exists(self.cache_dir):
@@ -41,21 +64,43 @@ class WebImageSearch:
                 xbmc.log("Created image cache directory: {}".format(self.cache_dir), xbmc.LOGINFO)
             except Exception as e:
                 xbmc.log("Failed to create cache directory: {}".format(str(e)), xbmc.LOGERROR)
+        
+        # Index of the cached files, least recently used evicted over cache_size
+        self.cache = CacheIndex.open(self.cache_dir, cache_size)
+        
+        # Search answers and API calls per day, shared with every other searcher
+        # using the same file; not in the image cache, so eviction leaves it alone
+        self.searches = SearchCache.open(search_db or self._get_default_search_db(), search_ttl, quotas)
     
-    def _get_default_cache_dir(self):
-        """Get default cache directory in Kodi's addon data"""
+    def _get_profile_dir(self):
+        """Get Kodi's addon data directory"""
         try:
             import xbmcaddon
             addon = xbmcaddon.Addon()
-            addon_data = xbmc.translatePath(addon.getAddonInfo('profile'))
-            return os.path.join(addon_data, 'image_cache')
+            return xbmc.translatePath(addon.getAddonInfo('profile'))
         except:
-            return os.path.join(os.path.expanduser('~'), '.kodi', 'userdata', 'addon_data', 'metadata.stash.python', 'image_cache')
+            return os.path.join(os.path.expanduser('~'), '.kodi', 'userdata', 'addon_data', 'metadata.stash.python')
+    
+    def _get_default_cache_dir(self):
+        """Get default cache directory in Kodi's addon data"""
+        return os.path.join(self._get_profile_dir(), 'image_cache')
+    
+    def _get_default_search_db(self):
+        """Get default search cache database in Kodi's addon data"""
+        profile = self._get_profile_dir()
+        if not os.path.exists(profile):
+            os.makedirs(profile)
+        return os.path.join(profile, 'image_searches.db')
     
     def search_images(self, query, max_results=5, search_engine='both'):
         """
         Search for images using Google and/or Bing
         
+        Answers are cached per engine and query. Engines out of daily quota
+        are served from the cache only; in 'both' mode an engine running low
+        is skipped while the other has calls left, and the engines still
+        needed are queried concurrently.
+        
         Args:
             query: Search query (e.g., "Movie Title 2023")
             max_results: Maximum number of results to return
@@ -64,32 +109,81 @@ class WebImageSearch:
         Returns:
             List of image URLs
         """
-        images = []
-        
+        engines = []
         if search_engine in ['google', 'both'] and self.google_api_key and self.google_cx:
-            try:
-                google_images = self._search_google(query, max_results)
-                images.extend(google_images)
-                xbmc.log("Found {} images from Google for: {}".format(len(google_images), query), xbmc.LOGINFO)
-            except Exception as e:
-                xbmc.log("Google image search failed: {}".format(str(e)), xbmc.LOGERROR)
-        
+            engines.append('google')
         if search_engine in ['bing', 'both'] and self.bing_api_key:
-            try:
-                bing_images = self._search_bing(query, max_results)
-                images.extend(bing_images)
-                xbmc.log("Found {} images from Bing for: {}".format(len(bing_images), query), xbmc.LOGINFO)
-            except Exception as e:
-                xbmc.log("Bing image search failed: {}".format(str(e)), xbmc.LOGERROR)
+            engines.append('bing')
+        
+        results = {}
+        for engine in engines:
+            cached = self.searches.get(engine, query, max_results)
+            if cached is not None:
+                results[engine] = cached
+                metrics.CACHE.inc(cache='image_searches', result='hit')
+                xbmc.log("Using cached {} images for: {}".format(engine, query), xbmc.LOGDEBUG)
+        
+        # Engines listed first fill the result list first; later ones are
+        # only asked for what is still missing
+        to_query = []
+        found = len(self._merge(results, engines, max_results))
+        for engine in engines:
+            if engine in results:
+                continue
+            if found >= max_results:
+                break
+            metrics.CACHE.inc(cache='image_searches', result='miss')
+            remaining = self.searches.remaining(engine)
+            if remaining == 0:
+                xbmc.log("{} image search quota used up for today, using cached answers only".format(engine),
+                         xbmc.LOGINFO)
+                continue
+            to_query.append(engine)
+        if len(to_query) > 1:
+            plenty = [engine for engine in to_query if not self.searches.is_low(engine)]
+            if plenty and len(plenty) < len(to_query):
+                xbmc.log("Image search quota running low, only searching {}".format(', '.join(plenty)),
+                         xbmc.LOGINFO)
+                to_query = plenty
+        
+        answers = {}
+        
+        def search(engine):
+            self.searches.spend(engine)
+            answers[engine] = self._search_google(query, max_results) if engine == 'google' else \
+                self._search_bing(query, max_results)
+        
+        if len(to_query) == 1:
+            search(to_query[0])
+        elif to_query:
+            threads = [threading.Thread(target=search, args=(engine,), name='image-search-' + engine)
+                       for engine in to_query]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        for engine, images in answers.items():
+            # None is a failed search: not cached, so it is retried next time
+            if images is None:
+                continue
+            self.searches.put(engine, query, max_results, images)
+            results[engine] = images
+            xbmc.log("Found {} images from {} for: {}".format(len(images), engine.title(), query), xbmc.LOGINFO)
         
-        # Remove duplicates while preserving order
+        return self._merge(results, engines, max_results)
+    
+    @staticmethod
+    def _merge(results, engines, max_results):
+        """Results of the engines in order, without duplicates"""
         seen = set()
         unique_images = []
-        for img in images:
-            if img not in seen:
-                seen.add(img)
-                unique_images.append(img)
-        
+        for engine in engines:
+            for img in results.get(engine, ()):
+                if img not in seen:
+                    seen.add(img)
+                    unique_images.append(img)
         return unique_images[:max_results]
     
     def _search_google(self, query, max_results=5):
@@ -101,14 +195,14 @@ class WebImageSearch:
             max_results: Maximum number of results
             
         Returns:
-            List of image URLs
+            List of image URLs, or None if the search failed
         """
         if not self.google_api_key or not self.google_cx:
             xbmc.log("Google API key or CX not configured", xbmc.LOGDEBUG)
             return []
         
         # Google Custom Search API endpoint
-        base_url = "https://www.googleapis.com/customsearch/v1"
+        base_url = self.GOOGLE_API_URL
         params = {
             'key': self.google_api_key,
             'cx': self.google_cx,
@@ -125,7 +219,7 @@ class WebImageSearch:
         
         try:
             request = Request(url)
-            response = urlopen(request, timeout=10)
+            response = timing.urlopen(request, timeout=10, scraper='web_image_search', operation='google')
             data = json.loads(response.read().decode('utf-8'))
             
             images = []
@@ -138,10 +232,10 @@ class WebImageSearch:
         
         except HTTPError as e:
             xbmc.log("Google API HTTP Error: {} - {}".format(e.code, e.reason), xbmc.LOGERROR)
-            return []
+            return None
         except Exception as e:
             xbmc.log("Google search error: {}".format(str(e)), xbmc.LOGERROR)
-            return []
+            return None
     
     def _search_bing(self, query, max_results=5):
         """
@@ -152,14 +246,14 @@ class WebImageSearch:
             max_results: Maximum number of results
             
         Returns:
-            List of image URLs
+            List of image URLs, or None if the search failed
         """
         if not self.bing_api_key:
             xbmc.log("Bing API key not configured", xbmc.LOGDEBUG)
             return []
         
         # Bing Image Search API endpoint
-        url = "https://api.bing.microsoft.com/v7.0/images/search"
+        url = self.BING_API_URL
         
         headers = {
             'Ocp-Apim-Subscription-Key': self.bing_api_key
@@ -179,7 +273,7 @@ class WebImageSearch:
         
         try:
             request = Request(full_url, headers=headers)
-            response = urlopen(request, timeout=10)
+            response = timing.urlopen(request, timeout=10, scraper='web_image_search', operation='bing')
             data = json.loads(response.read().decode('utf-8'))
             
             images = []
@@ -192,10 +286,10 @@ class WebImageSearch:
         
         except HTTPError as e:
             xbmc.log("Bing API HTTP Error: {} - {}".format(e.code, e.reason), xbmc.LOGERROR)
-            return []
+            return None
         except Exception as e:
             xbmc.log("Bing search error: {}".format(str(e)), xbmc.LOGERROR)
-            return []
+            return None
     
     def download_image(self, image_url, filename=None):
         """
@@ -211,42 +305,31 @@ class WebImageSearch:
         if not image_url:
             return None
         
-        # Generate filename from URL hash if not provided
-        if not filename:
-            url_hash = hashlib.md5(image_url.encode('utf-8')).hexdigest()
-            # Try to get file extension from URL
-            ext = self._get_extension_from_url(image_url)
-            filename = "{}.{}".format(url_hash, ext)
-        
-        cache_path = os.path.join(self.cache_dir, filename)
+        filename = filename or self._cache_name(image_url)
         
-        # Return cached file if it already exists
-        if os.path.exists(cache_path):
-            xbmc.log("Using cached image: {}".format(cache_path), xbmc.LOGDEBUG)
-            return cache_path
+        # Return cached file if it is in the cache index
+        cached = self.cache.lookup(filename)
+        if cached:
+            xbmc.log("Using cached image: {}".format(cached), xbmc.LOGDEBUG)
+            metrics.CACHE.inc(cache='web_images', result='hit')
+            return cached
+        metrics.CACHE.inc(cache='web_images', result='miss')
         
-        # Download the image
-        try:
-            xbmc.log("Downloading image from: {}".format(image_url), xbmc.LOGINFO)
-            request = Request(image_url)
-            request.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-            
-            response = urlopen(request, timeout=15)
-            image_data = response.read()
-            
-            # Save to cache
-            with open(cache_path, 'wb') as f:
-                f.write(image_data)
-            
-            xbmc.log("Image cached successfully: {}".format(cache_path), xbmc.LOGINFO)
-            return cache_path
-        
-        except HTTPError as e:
-            xbmc.log("Failed to download image (HTTP {}): {}".format(e.code, image_url), xbmc.LOGERROR)
-            return None
-        except Exception as e:
-            xbmc.log("Image download error: {}".format(str(e)), xbmc.LOGERROR)
+        # Streamed to a .part file, renamed into the cache once complete and checked
+        xbmc.log("Downloading image from: {}".format(image_url), xbmc.LOGINFO)
+        result = self.downloader.fetch(image_url, os.path.join(self.cache_dir, filename))
+        if not result:
             return None
+        self.cache.add(filename, result.size, image_url)
+        xbmc.log("Image cached successfully: {}".format(result.path), xbmc.LOGINFO)
+        return result.path
+    
+    def _cache_name(self, image_url):
+        """Cache file name for an image: URL hash plus extension"""
+        url_hash = hashlib.md5(image_url.encode('utf-8')).hexdigest()
+        # Try to get file extension from URL
+        ext = self._get_extension_from_url(image_url)
+        return "{}.{}".format(url_hash, ext)
     
     def _get_extension_from_url(self, url):
         """Extract file extension from URL, default to jpg"""
@@ -275,42 +358,38 @@ class WebImageSearch:
         Returns:
             List of local file paths of downloaded images
         """
-        image_urls = self.search_images(query, max_results, search_engine)
+        image_urls = [url for url in self.search_images(query, max_results, search_engine) if url]
         
-        downloaded_paths = []
+        # Cached images are used as they are; the rest are downloaded concurrently
+        names = dict((url, self._cache_name(url)) for url in image_urls)
+        paths = {}
         for url in image_urls:
-            path = self.download_image(url)
-            if path:
-                downloaded_paths.append(path)
-            
-            if len(downloaded_paths) >= max_results:
-                break
+            cached = self.cache.lookup(names[url])
+            if cached:
+                paths[url] = cached
+        missing = [url for url in image_urls if url not in paths]
+        if paths:
+            metrics.CACHE.inc(len(paths), cache='web_images', result='hit')
+        if missing:
+            metrics.CACHE.inc(len(missing), cache='web_images', result='miss')
+        downloads = self.downloader.fetch_all([(url, os.path.join(self.cache_dir, names[url])) for url in missing])
+        for url, result in downloads.items():
+            self.cache.add(names[url], result.size, url)
+            paths[url] = result.path
         
-        return downloaded_paths
+        return [paths[url] for url in image_urls if url in paths][:max_results]
     
     def clear_cache(self, max_age_days=30):
         """
         Clear old cached images
         
         Args:
-            max_age_days: Remove files older than this many days
+            max_age_days: Remove files not used for this many days
         """
         try:
-            import time
-            now = time.time()
-            max_age_seconds = max_age_days * 24 * 60 * 60
-            
-            removed_count = 0
-            for filename in os.listdir(self.cache_dir):
-                filepath = os.path.join(self.cache_dir, filename)
-                if os.path.isfile(filepath):
-                    file_age = now - os.path.getmtime(filepath)
-                    if file_age > max_age_seconds:
-                        try:
-                            os.remove(filepath)
-                            removed_count += 1
-                        except:
-                            pass
+            # Answered from the cache index; the directory is not scanned
+            removed_count = self.cache.expire(max_age_days * 24 * 60 * 60)
+            removed_count += self.cache.evict()
             
             if removed_count > 0:
                 xbmc.log("Cleared {} old cached images".format(removed_count), xbmc.LOGINFO)
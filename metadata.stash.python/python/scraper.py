@@ -17,16 +17,15 @@ try:
 except ImportError:
     xbmcvfs = None
 
+from scraper_pool import SCRAPER_POOL
+from scraper_profiler import start_capture
+from scraper_settings import get_settings
+from lib.py_common import metrics, timing
+from lib.stashscraper.records import as_scene, is_error
+
+from scraper_registry import ScraperRegistry
+
 try:
-    from lib.stashscraper.stash import StashScraper
-    from lib.stashscraper.aebn import AEBNScraper
-    from lib.stashscraper.brazzers_adapter import BrazzersScraper
-    from lib.stashscraper.fakehub_adapter import FakeHubScraper
-    from lib.stashscraper.czechhunter_adapter import CzechHunterScraper
-    from lib.stashscraper.gaywire_adapter import GayWireScraper
-    from lib.stashscraper.primalfetish_adapter import PrimalFetishScraper
-    from lib.stashscraper.web_image_search import WebImageSearch
-    from lib.stashscraper.rapidgator import prompt_rapidgator_search
     from scraper_datahelper import get_params
     from scraper_config import configure_scraped_details
     IMPORT_SUCCESS = True
@@ -34,17 +33,9 @@ try:
 except Exception as e:
     IMPORT_SUCCESS = False
     IMPORT_ERROR = str(e)
-    # Define dummy classes to prevent further errors
-    class StashScraper: pass
-    class AEBNScraper: pass
-    class BrazzersScraper: pass
-    class FakeHubScraper: pass
-    class CzechHunterScraper: pass
-    class GayWireScraper: pass
-    class PrimalFetishScraper: pass
+    # Define dummy functions to prevent further errors
     def get_params(args): return {}
     def configure_scraped_details(details, settings): return details
-    def prompt_rapidgator_search(details, settings): return None
 
 ADDON_SETTINGS = xbmcaddon.Addon()
 ID = ADDON_SETTINGS.getAddonInfo('id')
@@ -58,16 +49,78 @@ if not IMPORT_SUCCESS:
 else:
     log("All imports successful", xbmc.LOGINFO)
 
-def get_stash_scraper(settings):
+def get_profile_path(filename=None):
+    """Path inside the addon profile directory, which is created if missing"""
+    if xbmcvfs and hasattr(xbmcvfs, 'translatePath'):
+        profile = xbmcvfs.translatePath(ADDON_SETTINGS.getAddonInfo('profile'))
+    else:
+        profile = xbmc.translatePath(ADDON_SETTINGS.getAddonInfo('profile'))
+    if not os.path.exists(profile):
+        os.makedirs(profile)
+    return os.path.join(profile, filename) if filename else profile
+
+def _build_stash(scraper_class, settings):
     stash_url = settings.getSettingString('stash_url')
     api_key = settings.getSettingString('api_key')
-    return StashScraper(stash_url, api_key, settings)
+    # StashScraper keeps reading its settings object (web search options in
+    # get_details), so it is rebuilt whenever the snapshot changes
+    return SCRAPER_POOL.get('stash', (settings,), lambda: scraper_class(stash_url, api_key, settings))
 
-def get_aebn_scraper(settings):
+def _build_aebn(scraper_class, settings):
     aebn_url = settings.getSettingString('aebn_url')
     username = settings.getSettingString('aebn_username')
     password = settings.getSettingString('aebn_password')
-    return AEBNScraper(aebn_url, username, password)
+    # Persist the login session so it is reused across invocations
+    cookie_file = get_profile_path('aebn_cookies.lwp') if username and password else None
+    return SCRAPER_POOL.get('aebn', (aebn_url, username, password),
+                            lambda: scraper_class(aebn_url, username, password, cookie_file=cookie_file))
+
+def _configure_aylo_catalog(settings):
+    """Attach the local Aylo scene mirror to AyloAPI, or detach it when disabled"""
+    from lib.AyloAPI import AyloAPI
+    if not settings.getSettingBool('aylo_catalog'):
+        AyloAPI.attach_catalog(None)
+        return
+    from lib.AyloAPI.catalog import SceneCatalog
+    path = get_profile_path('aylo_catalog.db')
+    max_age = settings.getSettingInt('aylo_catalog_max_age') * 3600
+    max_pages = settings.getSettingInt('aylo_catalog_max_pages')
+    AyloAPI.attach_catalog(SCRAPER_POOL.get('aylo_catalog', (path, max_age, max_pages),
+                                            lambda: SceneCatalog(path, max_age, max_pages)))
+
+def _build_primalfetish(scraper_class, settings):
+    _configure_aylo_catalog(settings)
+    config = (settings.getSettingString('primalfetish_username'),
+              settings.getSettingString('primalfetish_password'))
+    return SCRAPER_POOL.get('primalfetish', config, lambda: scraper_class(settings))
+
+def _aylo_builder(scraper_type):
+    """Aylo network adapters take no settings, so one instance serves every call"""
+    def build(scraper_class, settings):
+        _configure_aylo_catalog(settings)
+        return SCRAPER_POOL.get(scraper_type, (), scraper_class)
+    return build
+
+def _build_federated(scraper_class, settings):
+    selected = [key.strip() for key in settings.getSettingString('federated_backends').split(',') if key.strip()]
+    backends = [key for key in SCRAPERS.keys() if key != 'federated' and (not selected or key in selected)]
+    # Backends are created in the search threads, so a slow login counts against the deadline
+    return scraper_class(backends, lambda key: SCRAPERS.create(key, settings),
+                         deadline=settings.getSettingInt('federated_timeout'),
+                         deadlines=scraper_class.parse_deadlines(settings.getSettingString('federated_deadlines')))
+
+# Backends are imported on first use only. Registration order is the
+# priority used when a library item carries several uniqueids.
+SCRAPERS = ScraperRegistry()
+SCRAPERS.register('stash', 'lib.stashscraper.stash', 'StashScraper', _build_stash)
+SCRAPERS.register('aebn', 'lib.stashscraper.aebn', 'AEBNScraper', _build_aebn)
+SCRAPERS.register('brazzers', 'lib.stashscraper.brazzers_adapter', 'BrazzersScraper', _aylo_builder('brazzers'))
+SCRAPERS.register('fakehub', 'lib.stashscraper.fakehub_adapter', 'FakeHubScraper', _aylo_builder('fakehub'))
+SCRAPERS.register('czechhunter', 'lib.stashscraper.czechhunter_adapter', 'CzechHunterScraper', _aylo_builder('czechhunter'))
+SCRAPERS.register('gaywire', 'lib.stashscraper.gaywire_adapter', 'GayWireScraper', _aylo_builder('gaywire'))
+SCRAPERS.register('primalfetish', 'lib.stashscraper.primalfetish_adapter', 'PrimalFetishScraper', _build_primalfetish)
+# Searches all of the above; its results carry the uniqueids of the backends that found them
+SCRAPERS.register('federated', 'lib.stashscraper.federated', 'FederatedScraper', _build_federated)
 
 def get_active_scraper(settings):
     """Get the active scraper based on settings"""
@@ -76,23 +129,12 @@ def get_active_scraper(settings):
         raise ImportError("Scraper imports failed: {}".format(IMPORT_ERROR))
     
     scraper_type = settings.getSettingString('scraper_type')
+    if scraper_type not in SCRAPERS:
+        scraper_type = 'stash'
     log("Creating scraper of type: {}".format(scraper_type), xbmc.LOGINFO)
     
     try:
-        if scraper_type == 'aebn':
-            return get_aebn_scraper(settings), 'aebn'
-        elif scraper_type == 'brazzers':
-            return BrazzersScraper(), 'brazzers'
-        elif scraper_type == 'fakehub':
-            return FakeHubScraper(), 'fakehub'
-        elif scraper_type == 'czechhunter':
-            return CzechHunterScraper(), 'czechhunter'
-        elif scraper_type == 'gaywire':
-            return GayWireScraper(), 'gaywire'
-        elif scraper_type == 'primalfetish':
-            return PrimalFetishScraper(settings), 'primalfetish'
-        else:
-            return get_stash_scraper(settings), 'stash'
+        return SCRAPERS.create(scraper_type, settings), scraper_type
     except Exception as e:
         log("Error creating scraper '{}': {}".format(scraper_type, str(e)), xbmc.LOGERROR)
         raise
@@ -128,7 +170,7 @@ def search_for_movie(title, year, handle, settings):
 
     for scene in search_results:
         listitem = _searchresult_to_listitem(scene)
-        uniqueids = {scraper_type: str(scene['id'])}
+        uniqueids = scene.get('uniqueids') or {scraper_type: str(scene['id'])}
         xbmcplugin.addDirectoryItem(handle=handle, url=build_lookup_string(uniqueids),
             listitem=listitem, isFolder=True)
 
@@ -138,6 +180,8 @@ def _searchresult_to_listitem(scene):
     scene_date = scene.get('date', '')
     if scene_date:
         scene_label += ' ({})'.format(scene_date)
+    if scene.get('sources'):
+        scene_label += ' [{}]'.format(', '.join(scene['sources']))
 
     listitem = xbmcgui.ListItem(scene_label, offscreen=True)
 
@@ -160,39 +204,23 @@ def get_details(input_uniqueids, handle, settings, fail_silently=False):
         return False
     
     # Determine which scraper to use based on uniqueid
-    scraper_type = None
-    scene_id = None
+    scraper_type = SCRAPERS.match(input_uniqueids)
+    if not scraper_type:
+        return False
+    scene_id = input_uniqueids[scraper_type]
+    stage = metrics.StageTimer(metrics.DETAILS_STAGE_SECONDS, scraper=scraper_type)
     
-    if 'stash' in input_uniqueids:
-        scraper_type = 'stash'
-        scene_id = input_uniqueids['stash']
-        scraper = get_stash_scraper(settings)
-    elif 'aebn' in input_uniqueids:
-        scraper_type = 'aebn'
-        scene_id = input_uniqueids['aebn']
-        scraper = get_aebn_scraper(settings)
-    elif 'brazzers' in input_uniqueids:
-        scraper_type = 'brazzers'
-        scene_id = input_uniqueids['brazzers']
-        scraper = BrazzersScraper()
-    elif 'fakehub' in input_uniqueids:
-        scraper_type = 'fakehub'
-        scene_id = input_uniqueids['fakehub']
-        scraper = FakeHubScraper()
-    elif 'czechhunter' in input_uniqueids:
-        scraper_type = 'czechhunter'
-        scene_id = input_uniqueids['czechhunter']
-        scraper = CzechHunterScraper()
-    elif 'gaywire' in input_uniqueids:
-        scraper_type = 'gaywire'
-        scene_id = input_uniqueids['gaywire']
-        scraper = GayWireScraper()
-    elif 'primalfetish' in input_uniqueids:
-        scraper_type = 'primalfetish'
-        scene_id = input_uniqueids['primalfetish']
-        scraper = PrimalFetishScraper()
-    else:
+    try:
+        scraper = SCRAPERS.create(scraper_type, settings)
+    except Exception as e:
+        log("Error creating scraper '{}': {}".format(scraper_type, str(e)), xbmc.LOGERROR)
+        metrics.ERRORS.inc(stage='create', error=type(e).__name__)
+        if not fail_silently:
+            xbmcgui.Dialog().notification("Stash Scraper Error", 
+                                        "Failed to initialize scraper: {}".format(str(e)), 
+                                        xbmcgui.NOTIFICATION_ERROR)
         return False
+    stage('create')
     
     # Check if auto-scraping from external sources is enabled (only for Stash)
     if scraper_type == 'stash' and settings.getSettingBool('auto_scrape_external'):
@@ -248,13 +276,17 @@ def get_details(input_uniqueids, handle, settings, fail_silently=False):
         else:
             error_msg = scraped_data.get('error', 'No results') if scraped_data else 'No results'
             log("No external scrape results: {}".format(error_msg), xbmc.LOGINFO)
+        stage('external_scrape')
     
     # Now get the details (possibly updated) from Stash
-    details = scraper.get_details(scene_id)
+    details = as_scene(scraper.get_details(scene_id))
+    stage('lookup')
     if not details:
+        metrics.ERRORS.inc(stage='lookup', error='NotFound')
         return False
     
-    if 'error' in details:
+    if is_error(details):
+        metrics.ERRORS.inc(stage='lookup', error='ScraperError')
         if fail_silently:
             return False
         header = "Stash Scraper error with Stash instance"
@@ -263,156 +295,57 @@ def get_details(input_uniqueids, handle, settings, fail_silently=False):
         return False
 
     details = configure_scraped_details(details, settings)
+    stage('configure')
 
     # Add web image search if enabled
     if settings.getSettingBool('enable_web_image_search'):
         details = add_web_images(details, settings)
+        stage('web_images')
 
     # Offer frame extraction if enabled
     if settings.getSettingBool('enable_frame_extraction') and settings.getSettingBool('frame_prompt_on_scrape'):
         details = prompt_frame_extraction(details, settings, handle)
+        stage('frame_extraction')
 
     # Offer Rapidgator search for higher quality version
     if settings.getSettingBool('enable_rapidgator'):
+        from lib.stashscraper.rapidgator import prompt_rapidgator_search
         downloaded_path = prompt_rapidgator_search(details, settings)
         if downloaded_path:
             log("Rapidgator download completed: {}".format(downloaded_path), xbmc.LOGINFO)
             # Store the downloaded file path in details for potential use
-            details['rapidgator_download'] = downloaded_path
+            details.extras = {'rapidgator_download': downloaded_path}
+        stage('rapidgator')
 
-    listitem = xbmcgui.ListItem(details['info']['title'], offscreen=True)
-    infotag = listitem.getVideoInfoTag()
-    set_info(infotag, details['info'])
-    infotag.setCast(build_cast(details.get('cast', [])))
-    infotag.setUniqueIDs(details['uniqueids'], scraper_type)
-    
-    if details.get('available_art'):
-        set_artwork(listitem, details['available_art'])
+    # Drop images that show the same picture as another if enabled
+    if settings.getSettingBool('dedupe_artwork'):
+        dedupe_artwork(details, settings)
+        stage('art_dedupe')
+
+    # Serve the selected artwork from local copies if enabled
+    if settings.getSettingBool('art_mirror'):
+        mirror_artwork(details, settings)
+        stage('art_mirror')
+
+    listitem = xbmcgui.ListItem(details.title, offscreen=True)
+    details.apply(listitem, scraper_type)
+    stage('listitem')
 
     # Create NFO file if enabled
     if settings.getSettingBool('create_nfo'):
-        create_nfo_file(details, settings)
+        create_nfo_file(details, settings, scraper_type)
+        stage('nfo')
 
     xbmcplugin.setResolvedUrl(handle=handle, succeeded=True, listitem=listitem)
     return True
     
-def normalize_details(details, scraper_type):
-    """
-    Enforce a canonical schema across all scrapers.
-    """
-    if not isinstance(details, dict):
-        return {"error": "Invalid scraper response"}
-
-    details.setdefault("info", {})
-    details.setdefault("cast", [])
-    details.setdefault("uniqueids", {})
-    details.setdefault("available_art", {})
-
-    # Ensure unique ID exists
-    if scraper_type not in details["uniqueids"]:
-        details["uniqueids"][scraper_type] = details["uniqueids"].get("stash", "")
-
-    # Normalize artwork → URL only
-    def norm_art(v):
-        if isinstance(v, list) and v:
-            v = v[0]
-        if isinstance(v, dict):
-            return v.get("url") or v.get("preview")
-        return v
-
-    for k in ("poster", "thumb", "fanart"):
-        if k in details["available_art"]:
-            details["available_art"][k] = norm_art(details["available_art"][k])
-
-    # Normalize cast
-    clean_cast = []
-    for c in details.get("cast", []):
-        if not c.get("name"):
-            continue
-        clean_cast.append({
-            "name": c.get("name"),
-            "role": c.get("role", ""),
-            "order": int(c.get("order", 0)),
-            "thumbnail": c.get("thumbnail", ""),
-        })
-    details["cast"] = clean_cast
-
-    return details
-    
-def set_info(infotag, info_dict):
-    infotag.setTitle(info_dict['title'])
-    if 'originaltitle' in info_dict:
-        infotag.setOriginalTitle(info_dict['originaltitle'])
-    if 'plot' in info_dict:
-        infotag.setPlot(info_dict['plot'])
-    if 'tagline' in info_dict:
-        infotag.setTagLine(info_dict['tagline'])
-    if 'studio' in info_dict:
-        infotag.setStudios(info_dict['studio'])
-    if 'genre' in info_dict:
-        infotag.setGenres(info_dict['genre'])
-    if 'tag' in info_dict:
-        infotag.setTags(info_dict['tag'])
-    if 'director' in info_dict:
-        infotag.setDirectors(info_dict['director'])
-    if 'premiered' in info_dict:
-        infotag.setPremiered(info_dict['premiered'])
-    if 'duration' in info_dict:
-        infotag.setDuration(info_dict['duration'])
-    if 'rating' in info_dict:
-        infotag.setRating(info_dict['rating'])
-
-def build_cast(cast_list):
-    return [xbmc.Actor(cast['name'], cast.get('role', ''), cast.get('order', 0), cast.get('thumbnail', '')) 
-            for cast in cast_list]
-
-def set_artwork(listitem, available_art):
-    # Set primary artwork
-    art_dict = {}
-    if 'poster' in available_art:
-        if isinstance(available_art['poster'], list):
-            art_dict['poster'] = available_art['poster'][0]
-        else:
-            art_dict['poster'] = available_art['poster']
-    if 'thumb' in available_art:
-        if isinstance(available_art['thumb'], list):
-            art_dict['thumb'] = available_art['thumb'][0]
-        else:
-            art_dict['thumb'] = available_art['thumb']
-    if 'fanart' in available_art:
-        if isinstance(available_art['fanart'], list):
-            art_dict['fanart'] = available_art['fanart'][0]
-        else:
-            art_dict['fanart'] = available_art['fanart']
-    if art_dict:
-        listitem.setArt(art_dict)
-    
-    # Add all available artwork options for "Choose art" dialog
-    art_types = {
-        'poster': available_art.get('poster_list', []),
-        'fanart': available_art.get('fanart_list', []),
-        'thumb': available_art.get('thumb_list', []),
-        'landscape': available_art.get('landscape_list', [])
-    }
-    
-    for art_type, url_list in art_types.items():
-        if url_list and isinstance(url_list, list):
-            for url in url_list:
-                if url:
-                    try:
-                        listitem.addAvailableArtwork(url, art_type)
-                    except:
-                        pass
-
 def add_web_images(details, settings):
     """Add web-searched images to details if enabled and needed"""
     try:
         # Check if we should use web search as fallback only
         fallback_only = settings.getSettingBool('web_search_fallback_only')
-        existing_art = details.get('available_art', {})
-        
         # If fallback only, skip if we already have images
-        if fallback_only and (existing_art.get('poster') or existing_art.get('thumb')):
+        if fallback_only and (details.art.poster or details.art.thumb):
             log("Web image search skipped - existing images found (fallback mode)", xbmc.LOGDEBUG)
             return details
         
@@ -424,11 +357,14 @@ def add_web_images(details, settings):
         google_api_key = settings.getSettingString('google_api_key')
         google_cx = settings.getSettingString('google_cx')
         bing_api_key = settings.getSettingString('bing_api_key')
+        cache_size = settings.getSettingInt('web_image_cache_size') * 1024 * 1024
+        search_ttl = settings.getSettingInt('web_search_cache_days') * 24 * 3600
+        quotas = (('google', settings.getSettingInt('google_daily_quota')),
+                  ('bing', settings.getSettingInt('bing_daily_quota')))
         
         # Create search query from title and studio
-        title = details['info'].get('title', '')
-        studio = details['info'].get('studio', [])
-        studio_name = studio[0] if studio else ''
+        title = details.title
+        studio_name = details.studios[0] if details.studios else ''
         
         query = title
         if studio_name:
@@ -436,11 +372,19 @@ def add_web_images(details, settings):
         
         log("Searching web for images: {}".format(query), xbmc.LOGINFO)
         
-        # Initialize web image searcher
-        searcher = WebImageSearch(
-            google_api_key=google_api_key,
-            google_cx=google_cx,
-            bing_api_key=bing_api_key
+        # Web image searcher (pooled per API configuration)
+        from lib.stashscraper.web_image_search import WebImageSearch
+        searcher = SCRAPER_POOL.get(
+            'web_image_search',
+            (google_api_key, google_cx, bing_api_key, cache_size, search_ttl, quotas),
+            lambda: WebImageSearch(
+                google_api_key=google_api_key,
+                google_cx=google_cx,
+                bing_api_key=bing_api_key,
+                cache_size=cache_size,
+                search_ttl=search_ttl,
+                quotas=dict(quotas)
+            )
         )
         
         # Search for images
@@ -449,36 +393,13 @@ def add_web_images(details, settings):
         if image_urls:
             log("Found {} web images".format(len(image_urls)), xbmc.LOGINFO)
             
-            # Initialize available_art if not exists
-            if 'available_art' not in details:
-                details['available_art'] = {}
-            
-            # Initialize artwork lists
-            if 'poster_list' not in details['available_art']:
-                details['available_art']['poster_list'] = []
-            if 'fanart_list' not in details['available_art']:
-                details['available_art']['fanart_list'] = []
-            if 'thumb_list' not in details['available_art']:
-                details['available_art']['thumb_list'] = []
-            if 'landscape_list' not in details['available_art']:
-                details['available_art']['landscape_list'] = []
-            
             # Add all web images to all art type lists so user can choose
-            for img_url in image_urls:
-                details['available_art']['poster_list'].append(img_url)
-                details['available_art']['fanart_list'].append(img_url)
-                details['available_art']['thumb_list'].append(img_url)
-                details['available_art']['landscape_list'].append(img_url)
-            
+            details.art.add_choices(image_urls, ('poster', 'fanart', 'thumb', 'landscape'))
             log("Added {} web images to artwork lists".format(len(image_urls)), xbmc.LOGINFO)
             
             # Set first image as default if none exists
-            if not details['available_art'].get('poster') and len(image_urls) > 0:
-                details['available_art']['poster'] = image_urls[0]
-            if not details['available_art'].get('thumb') and len(image_urls) > 0:
-                details['available_art']['thumb'] = image_urls[0]
-            if not details['available_art'].get('fanart') and len(image_urls) > 1:
-                details['available_art']['fanart'] = image_urls[1]
+            details.art.set_defaults(poster=image_urls[0], thumb=image_urls[0],
+                                     fanart=image_urls[1] if len(image_urls) > 1 else None)
         else:
             log("No web images found", xbmc.LOGINFO)
     
@@ -489,7 +410,53 @@ def add_web_images(details, settings):
     
     return details
 
-def create_nfo_file(details, settings):
+def _image_headers(settings):
+    """Request headers per URL prefix for downloading artwork, as a hashable tuple"""
+    # Images served by Stash need the API key like its GraphQL endpoint
+    stash_url = settings.getSettingString('stash_url').rstrip('/')
+    api_key = settings.getSettingString('api_key')
+    return ((stash_url, (('ApiKey', api_key),)),) if stash_url and api_key else ()
+
+def dedupe_artwork(details, settings):
+    """Collapse near-duplicate images in the art chooser lists"""
+    try:
+        from lib.stashscraper.art_dedupe import ArtDeduplicator
+        path = get_profile_path('image_hashes.db')
+        incoming = get_profile_path('hash_incoming')
+        headers = _image_headers(settings)
+        deduplicator = SCRAPER_POOL.get(
+            'art_dedupe',
+            (path, headers),
+            lambda: ArtDeduplicator(path, incoming, headers=dict((prefix, dict(values)) for prefix, values in headers))
+        )
+        removed = deduplicator.dedupe(details.art)
+        if removed:
+            log("Removed {} duplicate artwork choices".format(removed), xbmc.LOGINFO)
+    except Exception as e:
+        log("Error removing duplicate artwork: {}".format(str(e)), xbmc.LOGERROR)
+    return details
+
+def mirror_artwork(details, settings):
+    """Point the primary artwork and cast thumbnails at copies in the profile"""
+    try:
+        from lib.stashscraper.art_mirror import ArtMirror
+        directory = get_profile_path('artwork')
+        max_size = settings.getSettingInt('art_mirror_max_size')
+        thumb_size = settings.getSettingInt('art_mirror_thumb_size')
+        headers = _image_headers(settings)
+        mirror = SCRAPER_POOL.get(
+            'art_mirror',
+            (directory, max_size, thumb_size, headers),
+            lambda: ArtMirror(directory, max_size, thumb_size,
+                              headers=dict((prefix, dict(values)) for prefix, values in headers))
+        )
+        count = mirror.mirror(details)
+        log("Artwork mirrored locally: {} images".format(count), xbmc.LOGDEBUG)
+    except Exception as e:
+        log("Error mirroring artwork: {}".format(str(e)), xbmc.LOGERROR)
+    return details
+
+def create_nfo_file(details, settings, scraper_type='stash'):
     """Create NFO file with scraped metadata"""
     try:
         nfo_path = settings.getSettingString('nfo_path')
@@ -498,8 +465,7 @@ def create_nfo_file(details, settings):
             return
 
         # Check if scene has meaningful metadata before creating NFO
-        info = details.get('info', {})
-        title = info.get('title', '').strip()
+        title = details.title.strip()
         
         # Skip if no title or title is placeholder/empty
         if not title or title.lower() in ['untitled', 'unknown', 'scene']:
@@ -507,11 +473,11 @@ def create_nfo_file(details, settings):
             return
         
         # Check if there's any substantial metadata
-        has_plot = bool(info.get('plot', '').strip())
-        has_studio = bool(info.get('studio', []))
-        has_performers = bool(details.get('cast', []))
-        has_tags = bool(info.get('tag', []))
-        has_date = bool(info.get('premiered', '').strip())
+        has_plot = bool(details.plot.strip())
+        has_studio = bool(details.studios)
+        has_performers = bool(details.cast)
+        has_tags = bool(details.tags)
+        has_date = bool(details.premiered.strip())
         
         # Require at least title + one other piece of metadata
         if not any([has_plot, has_studio, has_performers, has_tags, has_date]):
@@ -532,7 +498,7 @@ def create_nfo_file(details, settings):
             return
 
         # Build filename from title and stash ID
-        stash_id = details['uniqueids'].get('stash', 'unknown')
+        stash_id = details.uniqueids.get(scraper_type, 'unknown')
         
         # Log the original title for debugging
         log("Creating NFO for title: '{}'".format(title), xbmc.LOGDEBUG)
@@ -556,113 +522,7 @@ def create_nfo_file(details, settings):
         full_path = os.path.join(nfo_path, nfo_filename)
 
         # Build NFO XML
-        root = ET.Element('movie')
-        
-        info = details['info']
-        
-        # Add title
-        title_elem = ET.SubElement(root, 'title')
-        title_elem.text = info.get('title', '')
-        
-        # Add original title if different
-        if 'originaltitle' in info and info['originaltitle'] != info.get('title'):
-            orig_title = ET.SubElement(root, 'originaltitle')
-            orig_title.text = info['originaltitle']
-        
-        # Add plot
-        if 'plot' in info and info['plot']:
-            plot_elem = ET.SubElement(root, 'plot')
-            plot_elem.text = info['plot']
-        
-        # Add outline/tagline
-        if 'tagline' in info and info['tagline']:
-            tagline_elem = ET.SubElement(root, 'tagline')
-            tagline_elem.text = info['tagline']
-        
-        # Add year
-        if 'premiered' in info and info['premiered']:
-            premiered = info['premiered']
-            try:
-                year = premiered.split('-')[0]
-                if year:
-                    year_elem = ET.SubElement(root, 'year')
-                    year_elem.text = year
-                    premiered_elem = ET.SubElement(root, 'premiered')
-                    premiered_elem.text = premiered
-            except:
-                pass
-        
-        # Add runtime
-        if 'duration' in info:
-            runtime = ET.SubElement(root, 'runtime')
-            runtime.text = str(info['duration'])
-        
-        # Add rating
-        if 'rating' in info:
-            rating_elem = ET.SubElement(root, 'rating')
-            rating_elem.text = str(info['rating'])
-        
-        # Add studios
-        if 'studio' in info and info['studio']:
-            for studio in info['studio']:
-                if studio:
-                    studio_elem = ET.SubElement(root, 'studio')
-                    studio_elem.text = studio
-        
-        # Add genres
-        if 'genre' in info and info['genre']:
-            for genre in info['genre']:
-                if genre:
-                    genre_elem = ET.SubElement(root, 'genre')
-                    genre_elem.text = genre
-        
-        # Add tags
-        if 'tag' in info and info['tag']:
-            for tag in info['tag']:
-                if tag:
-                    tag_elem = ET.SubElement(root, 'tag')
-                    tag_elem.text = tag
-        
-        # Add director
-        if 'director' in info and info['director']:
-            for director in info['director']:
-                if director:
-                    director_elem = ET.SubElement(root, 'director')
-                    director_elem.text = director
-        
-        # Add actors/cast
-        if details.get('cast'):
-            for actor in details['cast']:
-                if actor.get('name'):
-                    actor_elem = ET.SubElement(root, 'actor')
-                    name_elem = ET.SubElement(actor_elem, 'name')
-                    name_elem.text = actor['name']
-                    if actor.get('role'):
-                        role_elem = ET.SubElement(actor_elem, 'role')
-                        role_elem.text = actor['role']
-                    if actor.get('thumbnail'):
-                        thumb_elem = ET.SubElement(actor_elem, 'thumb')
-                        thumb_elem.text = actor['thumbnail']
-        
-        # Add unique IDs
-        uniqueid_elem = ET.SubElement(root, 'uniqueid')
-        uniqueid_elem.set('type', 'stash')
-        uniqueid_elem.set('default', 'true')
-        uniqueid_elem.text = details['uniqueids'].get('stash', '')
-        
-        # Add artwork
-        if details.get('available_art'):
-            art = details['available_art']
-            if 'thumb' in art and art['thumb']:
-                thumb = ET.SubElement(root, 'thumb')
-                thumb.text = art['thumb']
-            if 'fanart' in art and art['fanart']:
-                fanart = ET.SubElement(root, 'fanart')
-                fanart_thumb = ET.SubElement(fanart, 'thumb')
-                fanart_thumb.text = art['fanart']
-            if 'poster' in art and art['poster']:
-                poster = ET.SubElement(root, 'poster')
-                poster.text = art['poster']
+        root = details.to_nfo(scraper_type)
         
         # Write to file - manual indentation for Python 2/3 compatibility
         tree = ET.ElementTree(root)
@@ -778,9 +638,9 @@ def get_video_file_path(details, settings):
     """
     try:
         # Check if we have a stash uniqueid
-        if 'stash' in details.get('uniqueids', {}):
-            scene_id = details['uniqueids']['stash']
-            scraper = get_stash_scraper(settings)
+        if 'stash' in details.uniqueids:
+            scene_id = details.uniqueids['stash']
+            scraper = SCRAPERS.create('stash', settings)
             
             # Query Stash for scene files
             # This assumes the StashScraper has a method to get file paths
@@ -800,12 +660,12 @@ def prompt_frame_extraction(details, settings, handle):
     Prompt user to extract frames from video and add to artwork options.
     
     Args:
-        details: Scene details dict
+        details: Scene record
         settings: Addon settings
         handle: Kodi handle
     
     Returns:
-        Updated details dict with extracted frames added to available_art
+        The scene with extracted frames added to its artwork choices
     """
     try:
         dialog = xbmcgui.Dialog()
@@ -880,13 +740,7 @@ def prompt_frame_extraction(details, settings, handle):
         
         # Add extracted frames to available artwork
         if frames:
-            if 'available_art' not in details:
-                details['available_art'] = {}
-            
-            for art_type in ['poster_list', 'fanart_list', 'thumb_list']:
-                if art_type not in details['available_art']:
-                    details['available_art'][art_type] = []
-                details['available_art'][art_type].extend(frames)
+            details.art.add_choices(frames, ('poster', 'fanart', 'thumb'))
             
             dialog.notification(
                 "Stash Scraper",
@@ -957,17 +811,34 @@ def run():
             return
         
         if 'action' in params:
-            settings = ADDON_SETTINGS
+            settings = get_settings(ADDON_SETTINGS)
             action = params["action"]
             log("Running action: {}".format(action), xbmc.LOGINFO)
             
-            if action == 'find' and 'title' in params:
-                search_for_movie(params["title"], params.get("year"), params['handle'], settings)
-            elif action == 'getdetails' and ('url' in params or 'uniqueIDs' in params):
-                unique_ids = parse_lookup_string(params.get('uniqueIDs') or params.get('url'))
-                enddir = not get_details(unique_ids, params['handle'], settings, fail_silently='uniqueIDs' in params)
-            else:
-                log("unhandled action: {}".format(action), xbmc.LOGWARNING)
+            timing.configure(slow_ms=settings.getSettingInt('slow_request_threshold'),
+                             slow_log=get_profile_path('slow_requests.log'),
+                             summary=settings.getSettingBool('timing_summary'))
+            timing.begin_action(action)
+            capture = start_capture(ADDON_SETTINGS, settings, action, params, get_profile_path('profiles'))
+            try:
+                if action == 'find' and 'title' in params:
+                    search_for_movie(params["title"], params.get("year"), params['handle'], settings)
+                elif action == 'getdetails' and ('url' in params or 'uniqueIDs' in params):
+                    unique_ids = parse_lookup_string(params.get('uniqueIDs') or params.get('url'))
+                    enddir = not get_details(unique_ids, params['handle'], settings, fail_silently='uniqueIDs' in params)
+                else:
+                    log("unhandled action: {}".format(action), xbmc.LOGWARNING)
+            finally:
+                if capture is not None:
+                    capture.stop()
+                timing.end_action()
+                # Access times of the image caches used by this action, in one
+                # write; no index is open unless the module was imported
+                cache_index = sys.modules.get('lib.py_common.cache_index')
+                if cache_index is not None:
+                    cache_index.flush_all()
+                if settings.getSettingBool('enable_metrics'):
+                    metrics.REGISTRY.maybe_flush(get_profile_path(), settings.getSettingInt('metrics_flush_interval'))
         else:
             log("No action in 'params' to act on", xbmc.LOGWARNING)
         
@@ -976,6 +847,7 @@ def run():
             
     except Exception as e:
         log("CRITICAL ERROR in run(): {}".format(str(e)), xbmc.LOGERROR)
+        metrics.ERRORS.inc(stage='run', error=type(e).__name__)
         import traceback
         log("Traceback: {}".format(traceback.format_exc()), xbmc.LOGERROR)
         try:
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide pool of scraper instances.
+
+addon.xml enables reuselanguageinvoker, so this module outlives a single
+Kodi call. Scrapers (SSL contexts, web image search, logins) are built once
+per effective configuration and shared by every action instead of being
+rebuilt for each item.
+"""
+
+import threading
+
+from lib.py_common import metrics
+
+
+class ScraperPool(object):
+    """
+    Caches one scraper instance per name, keyed by its configuration.
+
+    ``get`` returns the cached instance while the configuration tuple it was
+    built with is unchanged; a different configuration (i.e. the settings
+    changed) replaces it. Safe to use from several threads: lookups share one
+    lock, and concurrent builds of the same scraper are serialized so the
+    factory only runs once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}      # name -> (config, instance)
+        self._build_locks = {}  # name -> Lock
+
+    def _lookup(self, name, config):
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == config:
+            return entry[1]
+        return None
+
+    def get(self, name, config, factory):
+        """
+        Get the pooled scraper for ``name``.
+
+        Args:
+            name: Scraper key, e.g. 'stash' or 'aebn'
+            config: Hashable tuple of every setting the scraper is built from
+            factory: Callable building a new instance for this configuration
+
+        Returns:
+            The scraper instance
+        """
+        with self._lock:
+            instance = self._lookup(name, config)
+            if instance is not None:
+                metrics.CACHE.inc(cache='scraper_pool', result='hit')
+                return instance
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+
+        with build_lock:
+            # Another thread may have built it while we waited
+            with self._lock:
+                instance = self._lookup(name, config)
+                if instance is not None:
+                    metrics.CACHE.inc(cache='scraper_pool', result='hit')
+                    return instance
+
+            metrics.CACHE.inc(cache='scraper_pool', result='miss')
+            instance = factory()
+
+            with self._lock:
+                self._entries[name] = (config, instance)
+                metrics.POOLED_SCRAPERS.set(len(self._entries))
+            return instance
+
+    def invalidate(self, name=None):
+        """Drop one pooled scraper, or all of them if ``name`` is None"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+            metrics.POOLED_SCRAPERS.set(len(self._entries))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# Shared by every invocation of the language invoker
+SCRAPER_POOL = ScraperPool()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+On-demand cProfile/tracemalloc capture of scraper actions.
+
+Profiling is armed for the next N actions either with the hidden
+``profile_next_runs`` setting or with the ``STASH_SCRAPER_PROFILE=N``
+environment variable of the Kodi process. The setting is consumed once: it
+is reset to 0 and its count moves to ``profiles/pending``, which is counted
+down as actions are profiled, so captures do not write settings. Each
+profiled action writes into ``profiles/`` in the addon profile directory:
+
+    <time>_<action>_<scene>.pstats       cProfile statistics (pstats.Stats)
+    <time>_<action>_<scene>.alloc.txt    top allocations and peak memory
+    <time>_<action>_<scene>.tracemalloc  raw tracemalloc snapshot
+
+``tools/summarize_profiles.py`` aggregates them.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+import xbmc
+
+import scraper_settings
+
+# Imported by start_capture once a capture is requested, so that ordinary
+# invocations don't pay for them
+cProfile = None
+tracemalloc = None
+
+ENV_VAR = 'STASH_SCRAPER_PROFILE'
+SETTING = 'profile_next_runs'
+PENDING_FILE = 'pending'
+TOP_ALLOCATIONS = 40
+TRACEBACK_FRAMES = 10
+
+_lock = threading.Lock()
+_env_remaining = None  # parsed once per interpreter
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log("[Profiler] {}".format(msg), level)
+
+
+def _read_pending(path):
+    try:
+        with open(path) as f:
+            return max(0, int(f.read().strip() or 0))
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def _write_pending(path, remaining):
+    try:
+        if remaining:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(str(remaining))
+        elif os.path.exists(path):
+            os.remove(path)
+    except (IOError, OSError) as e:
+        _log("could not update {}: {}".format(path, e), xbmc.LOGWARNING)
+
+
+def _take_request(addon, settings, directory):
+    """Consume one pending capture request; True if this action is profiled"""
+    global _env_remaining
+    with _lock:
+        if _env_remaining is None:
+            try:
+                _env_remaining = max(0, int(os.environ.get(ENV_VAR) or 0))
+            except ValueError:
+                _env_remaining = 0
+        if _env_remaining:
+            _env_remaining -= 1
+            return True
+
+    path = os.path.join(directory, PENDING_FILE)
+    with _lock:
+        remaining = _read_pending(path)
+        requested = settings.getSettingInt(SETTING)
+        if requested > 0:
+            # One settings write per request, not per capture
+            remaining = requested
+            addon.setSetting(SETTING, '0')
+            scraper_settings.invalidate()
+        if not remaining:
+            return False
+        _write_pending(path, remaining - 1)
+        return True
+
+
+def capture_label(action, params):
+    """Scene ID for getdetails, the title for find; safe for file names"""
+    label = params.get('title', '')
+    lookup = params.get('uniqueIDs') or params.get('url')
+    if lookup:
+        try:
+            ids = json.loads(lookup)
+            label = '-'.join(str(v) for _, v in sorted(ids.items())) if isinstance(ids, dict) else lookup
+        except ValueError:
+            label = lookup
+    label = re.sub(r'[^\w.-]+', '_', label, flags=re.UNICODE).strip('_')[:40]
+    return '_'.join(part for part in (action, label) if part)
+
+
+class Capture(object):
+    """cProfile and tracemalloc running for one action"""
+
+    def __init__(self, directory, label):
+        self.directory = directory
+        now = time.time()
+        stamp = '{}-{:03d}'.format(time.strftime('%Y%m%d-%H%M%S', time.localtime(now)), int(now * 1000) % 1000)
+        self.base = os.path.join(directory, '{}_{}'.format(stamp, label))
+        self.label = label
+        self.profile = None
+        self.started_tracing = False
+        self.start_time = None
+
+    def start(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+            self.started_tracing = True
+        if cProfile is not None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start_time = time.time()
+        _log("capturing {}".format(self.label), xbmc.LOGINFO)
+        return self
+
+    def stop(self):
+        """Stop collecting and write the report files; returns the files written"""
+        elapsed = time.time() - self.start_time
+        written = []
+        try:
+            if self.profile is not None:
+                self.profile.disable()
+            # Snapshot before writing the profile, which allocates a lot itself
+            if tracemalloc is not None and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+                ))
+                current, peak = tracemalloc.get_traced_memory()
+                if self.started_tracing:
+                    tracemalloc.stop()
+                snapshot.dump(self.base + '.tracemalloc')
+                self._write_allocations(snapshot, current, peak, elapsed)
+                written += [self.base + '.tracemalloc', self.base + '.alloc.txt']
+            if self.profile is not None:
+                self.profile.dump_stats(self.base + '.pstats')
+                written.append(self.base + '.pstats')
+        except (IOError, OSError) as e:
+            _log("could not write profile for {}: {}".format(self.label, e), xbmc.LOGWARNING)
+        _log("{} captured in {:.0f} ms: {}".format(self.label, elapsed * 1000, ', '.join(written)), xbmc.LOGINFO)
+        return written
+
+    def _write_allocations(self, snapshot, current, peak, elapsed):
+        stats = snapshot.statistics('lineno')
+        with open(self.base + '.alloc.txt', 'w') as f:
+            f.write("action: {}\n".format(self.label))
+            f.write("duration: {:.1f} ms\n".format(elapsed * 1000))
+            f.write("traced memory: {:.1f} KiB current, {:.1f} KiB peak\n".format(current / 1024.0, peak / 1024.0))
+            f.write("live allocations: {:.1f} KiB in {} blocks\n\n".format(
+                sum(s.size for s in stats) / 1024.0, sum(s.count for s in stats)))
+            f.write("Top {} allocations by line:\n".format(TOP_ALLOCATIONS))
+            for stat in stats[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                f.write("{:>10.1f} KiB {:>8} blocks  {}:{}\n".format(
+                    stat.size / 1024.0, stat.count, frame.filename, frame.lineno))
+
+
+def _import_profilers():
+    global cProfile, tracemalloc
+    if cProfile is None:
+        try:
+            import cProfile
+        except ImportError:  # not every Kodi build ships it
+            pass
+    if tracemalloc is None:
+        try:
+            import tracemalloc  # Py3 only
+        except ImportError:
+            pass
+
+
+def start_capture(addon, settings, action, params, directory):
+    """
+    Start profiling this action if a capture was requested.
+
+    Returns:
+        A running Capture (call ``stop()`` when the action is done) or None
+    """
+    if not _take_request(addon, settings, directory):
+        return None
+    _import_profilers()
+    if cProfile is None and tracemalloc is None:
+        _log("neither cProfile nor tracemalloc is available", xbmc.LOGWARNING)
+        return None
+    try:
+        return Capture(directory, capture_label(action, params)).start()
+    except (IOError, OSError) as e:
+        _log("could not start profiling: {}".format(e), xbmc.LOGWARNING)
+        return None
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of scraper backends.
+
+Maps a scraper key (the ``scraper_type`` setting and the uniqueid name a
+backend stores in the library) to the module and class implementing it.
+Modules are imported on first use only, so an invocation that needs Stash
+never imports AEBN or the Aylo network API.
+"""
+
+import importlib
+import threading
+from collections import OrderedDict
+
+
+class ScraperRegistry(object):
+    """
+    Lazily imported scraper factories, keyed by scraper type.
+
+    Example:
+        registry.register('stash', 'lib.stashscraper.stash', 'StashScraper',
+                          lambda cls, settings: cls(url, key, settings))
+        scraper = registry.create('stash', settings)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (module, attr, build)
+        self._classes = {}             # key -> loaded class
+
+    def register(self, key, module, attr, build=None):
+        """
+        Register a backend.
+
+        Args:
+            key: Scraper type / uniqueid name, e.g. 'stash'
+            module: Dotted module path, imported on first use
+            attr: Name of the scraper class in that module
+            build: Optional callable(cls, settings) returning an instance;
+                   by default the class is called without arguments
+        """
+        with self._lock:
+            self._entries[key] = (module, attr, build)
+            self._classes.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """Registered keys, in registration (= uniqueid priority) order"""
+        return list(self._entries)
+
+    def load(self, key):
+        """Import and return the scraper class for ``key``"""
+        cls = self._classes.get(key)
+        if cls is None:
+            module, attr, _ = self._entries[key]
+            cls = getattr(importlib.import_module(module), attr)
+            with self._lock:
+                self._classes[key] = cls
+        return cls
+
+    def create(self, key, settings):
+        """Get a scraper instance for ``key``"""
+        build = self._entries[key][2]
+        cls = self.load(key)
+        return build(cls, settings) if build else cls()
+
+    def match(self, uniqueids):
+        """First registered key present in ``uniqueids``, or None"""
+        for key in self._entries:
+            if key in uniqueids:
+                return key
+        return None
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Settings snapshot for the scraper.
+
+Every getSetting* call on xbmcaddon.Addon is an IPC round-trip into Kodi.
+The snapshot reads each setting declared in resources/settings.xml once,
+converts and validates it according to its declared type, and then answers
+all lookups from memory. It is cached across calls of the reused language
+invoker and rebuilt after the user changes the addon settings.
+
+A snapshot offers the same getters as xbmcaddon.Addon (getSettingString,
+getSettingBool, getSettingInt, ...), so it can be passed anywhere a
+``settings`` object is expected.
+"""
+
+import os
+import threading
+from xml.etree import ElementTree as ET
+
+import xbmc
+import xbmcaddon
+
+try:
+    import xbmcvfs
+except ImportError:
+    xbmcvfs = None
+
+from lib.py_common import metrics
+
+SETTINGS_XML = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources', 'settings.xml')
+
+# Requests to the entry point rather than scraper configuration: snapshots
+# differing only in these are equal, so they never rebuild pooled scrapers
+UNCOMPARED = frozenset(('profile_next_runs',))
+
+
+def _log(msg, level=xbmc.LOGDEBUG):
+    xbmc.log('[Stash Scraper] Settings: {}'.format(msg), level)
+
+
+class SettingDef(object):
+    """Declaration of one setting as found in settings.xml"""
+
+    __slots__ = ('id', 'type', 'default', 'values')
+
+    def __init__(self, id, type, default, values):
+        self.id = id
+        self.type = type
+        self.default = default
+        self.values = values
+
+    def parse(self, raw):
+        """Convert a raw value to this setting's type; raises ValueError if invalid"""
+        if self.type == 'bool':
+            if isinstance(raw, bool):
+                return raw
+            text = str(raw).strip().lower()
+            if text in ('true', '1'):
+                return True
+            if text in ('false', '0', ''):
+                return False
+            raise ValueError("not a boolean: {!r}".format(raw))
+        if self.type == 'number':
+            value = float(raw) if raw not in (None, '') else 0
+            # Whole numbers stay ints; fractions are kept for getSettingNumber
+            value = int(value) if float(value).is_integer() else value
+            if value < 0:
+                raise ValueError("negative number: {!r}".format(raw))
+            return value
+        value = '' if raw is None else str(raw)
+        if self.type == 'select' and self.values and value not in self.values:
+            raise ValueError("{!r} is not one of {}".format(value, '|'.join(self.values)))
+        return value
+
+    def default_value(self):
+        try:
+            return self.parse(self.default)
+        except ValueError:
+            return {'bool': False, 'number': 0}.get(self.type, '')
+
+
+_schema = None
+
+
+def load_schema(path=SETTINGS_XML):
+    """Parse the setting declarations from settings.xml (once per interpreter)"""
+    global _schema
+    if _schema is None:
+        schema = []
+        for node in ET.parse(path).getroot().iter('setting'):
+            setting_id = node.get('id')
+            if not setting_id:
+                continue  # separators and labels
+            values = node.get('values')
+            schema.append(SettingDef(
+                setting_id,
+                node.get('type', 'text'),
+                node.get('default', ''),
+                tuple(values.split('|')) if values else (),
+            ))
+        _schema = tuple(schema)
+    return _schema
+
+
+class SettingsSnapshot(object):
+    """
+    Immutable, typed view of all addon settings at one point in time.
+
+    Lookups of unknown ids behave like xbmcaddon.Addon (empty/False/0).
+    Equality and hashing ignore the settings in ``UNCOMPARED``.
+    """
+
+    __slots__ = ('_values', '_addon', '_key')
+
+    def __init__(self, values, addon=None):
+        object.__setattr__(self, '_values', dict(values))
+        object.__setattr__(self, '_addon', addon)
+        object.__setattr__(self, '_key', tuple(sorted(
+            (k, v) for k, v in self._values.items() if k not in UNCOMPARED)))
+
+    @classmethod
+    def read(cls, addon, schema=None):
+        """Read and validate every declared setting from ``addon``"""
+        values = {}
+        for setting in schema or load_schema():
+            try:
+                if setting.type == 'bool':
+                    raw = addon.getSettingBool(setting.id)
+                elif setting.type == 'number':
+                    # getSettingInt truncates fractions; parse() turns whole
+                    # numbers back into ints
+                    raw = addon.getSettingNumber(setting.id)
+                else:
+                    raw = addon.getSettingString(setting.id)
+            except (TypeError, RuntimeError):
+                # Stored value doesn't match the declared type
+                raw = addon.getSetting(setting.id)
+            try:
+                values[setting.id] = setting.parse(raw)
+            except ValueError as e:
+                _log("invalid value for '{}' ({}), using default".format(setting.id, e), xbmc.LOGWARNING)
+                values[setting.id] = setting.default_value()
+        return cls(values, addon)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingsSnapshot is immutable")
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __eq__(self, other):
+        return isinstance(other, SettingsSnapshot) and self._key == other._key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def get(self, setting_id, default=None):
+        return self._values.get(setting_id, default)
+
+    def as_dict(self):
+        return dict(self._values)
+
+    # xbmcaddon.Addon compatible getters
+    def getSetting(self, setting_id):
+        value = self._values.get(setting_id, '')
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
+
+    def getSettingString(self, setting_id):
+        return self.getSetting(setting_id)
+
+    def getSettingBool(self, setting_id):
+        value = self._values.get(setting_id, False)
+        return value if isinstance(value, bool) else self.getSetting(setting_id).lower() == 'true'
+
+    def getSettingInt(self, setting_id):
+        value = self._values.get(setting_id, 0)
+        if isinstance(value, bool):
+            return int(value)
+        try:
+            return int(value or 0)
+        except ValueError:
+            return 0
+
+    def getSettingNumber(self, setting_id):
+        value = self._values.get(setting_id, 0)
+        try:
+            return float(value or 0)
+        except ValueError:
+            return 0.0
+
+    def getLocalizedString(self, string_id):
+        """Not a setting, but callers use the settings object for strings too"""
+        addon = self._addon or xbmcaddon.Addon()
+        return addon.getLocalizedString(string_id)
+
+
+class _SettingsMonitor(xbmc.Monitor):
+    """Drops the cached snapshot when the user changes the addon settings"""
+
+    def onSettingsChanged(self):
+        _log("settings changed, invalidating snapshot", xbmc.LOGINFO)
+        invalidate()
+
+
+_lock = threading.Lock()
+_snapshot = None
+_stamp = None
+_monitor = None
+
+
+def _settings_file_stamp(addon):
+    """
+    Modification time of the user's stored settings file. Used as a second
+    invalidation signal in case onSettingsChanged is not delivered to the
+    reused interpreter. One stat(), no IPC.
+    """
+    try:
+        profile = addon.getAddonInfo('profile')
+        if xbmcvfs and hasattr(xbmcvfs, 'translatePath'):
+            profile = xbmcvfs.translatePath(profile)
+        else:
+            profile = xbmc.translatePath(profile)
+        return os.path.getmtime(os.path.join(profile, 'settings.xml'))
+    except Exception:
+        return None
+
+
+def get_settings(addon=None):
+    """
+    Current settings snapshot. Built on first use and after every settings
+    change; otherwise shared by all invocations of the reused interpreter.
+    """
+    global _snapshot, _stamp, _monitor
+    addon = addon or xbmcaddon.Addon()
+    stamp = _settings_file_stamp(addon)
+    with _lock:
+        if _monitor is None:
+            try:
+                _monitor = _SettingsMonitor()
+            except Exception as e:
+                _log("settings monitor unavailable: {}".format(e), xbmc.LOGWARNING)
+        if _snapshot is None or stamp != _stamp:
+            metrics.CACHE.inc(cache='settings', result='miss')
+            _snapshot = SettingsSnapshot.read(addon)
+            _stamp = stamp
+            _log("snapshot built with {} settings".format(len(_snapshot.as_dict())))
+        else:
+            metrics.CACHE.inc(cache='settings', result='hit')
+        return _snapshot
+
+
+def invalidate():
+    """Force the next get_settings() to re-read every setting"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
@@ -0,0 +1,170 @@
+"""
+Postprocess Benchmark - Compiled postprocessing against replace_all/replace_at chains
+This benchmark works outside of Kodi, using the mock_kodi shims
+
+Site postprocessors used to chain util.replace_all and util.replace_at, one
+call (and one copy of the scene) per rule. This micro-benchmark runs the
+same rules both ways over the Aylo fixture scenes, parsed by AyloAPI, for a
+growing number of rules:
+
+    chain      replace_all per URL rule, replace_at per path and tag rule
+    compiled   one py_common.postprocess.Postprocess, changing the scene in place
+    cow        the same Postprocess with copy=True (copy-on-write)
+
+Usage:
+    python tools/benchmark_postprocess.py [--rules 3 --rules 30] [--iterations 2000]
+    python tools/benchmark_postprocess.py --output postprocess.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+tools_path = os.path.dirname(os.path.abspath(__file__))
+base_path = os.path.dirname(tools_path)
+addon_path = os.path.join(base_path, 'metadata.stash.python')
+python_path = os.path.join(addon_path, 'python')
+mock_kodi_path = os.path.join(python_path, 'mock_kodi')
+
+sys.path.insert(0, tools_path)
+from benchmark_scrapers import setup_kodi  # noqa: E402
+from standin_server import FIXTURES_DIR  # noqa: E402
+
+DEFAULT_RULES = (3, 10, 30, 100)
+
+
+def load_scenes(fixtures_dir):
+    """(details, search page) parsed from the Aylo fixtures like AyloAPI does"""
+    from lib.AyloAPI import AyloAPI
+    api = AyloAPI()
+    with open(os.path.join(fixtures_dir, 'aylo.json')) as f:
+        routes = json.load(f)
+    items = next(r['body']['data'] for r in routes if r.get('contains') == 'id=')
+    details = api._parse_scene_detail(items[0])
+    # Tagged so the tag rules have something to match
+    details['tags'] = ['Brazzers Live'] + details['tags']
+    page = [api._parse_scene_summary(item) for item in items]
+    return details, page
+
+
+def make_rules(count):
+    """
+    Brazzers-like rules, ``count`` in total: the two URL rewrites, a studio
+    map and the Brazzers Live tag rule, padded with more URL rewrites and
+    tag rules that do not match.
+    """
+    urls = [('/scene/', '/video/'), ('/model/', '/pornstar/')]
+    tags = [('Brazzers Live', 'Brazzers Live')]
+    extra = max(0, count - 4)
+    urls += [('/unused{}/'.format(i), '/other{}/'.format(i)) for i in range(extra // 2)]
+    tags += [('Unused Tag {}'.format(i), 'Unused Studio {}'.format(i)) for i in range(extra - extra // 2)]
+    studio_map = {'JugFuckers': 'Jug Fuckers', "Shes Gonna Squirt": "She's Gonna Squirt"}
+    return urls, studio_map, tags
+
+
+def chain_postprocess(urls, studio_map, tags):
+    """The rules as replace_all/replace_at calls, the way site modules did it"""
+    from lib.py_common.util import dig, replace_all, replace_at
+
+    def run(obj):
+        fixed = obj
+        for old, new in urls:
+            fixed = replace_all(fixed, 'url', lambda x, old=old, new=new: x.replace(old, new))
+        fixed = replace_at(fixed, 'studio', 'name', replacement=lambda x: studio_map.get(x, x))
+        names = dig(obj, 'tags', default=[])
+        for tag, studio in tags:
+            if tag in names:
+                fixed = replace_at(fixed, 'studio', 'name', replacement=lambda _, studio=studio: studio)
+        return fixed
+    return run
+
+
+def compiled_postprocess(urls, studio_map, tags):
+    from lib.py_common.postprocess import Postprocess
+    postprocess = Postprocess().replace('url', dict(urls)).map_at(('studio', 'name'), studio_map)
+    for tag, studio in tags:
+        postprocess.set_when_tag(tag, ('studio', 'name'), studio)
+    return postprocess
+
+
+def measure(func, make_input, iterations, repeat):
+    """Best time per call in microseconds; inputs are copied before the clock starts"""
+    best = None
+    for _ in range(repeat):
+        inputs = [make_input() for _ in range(iterations)]
+        started = timeit.default_timer()
+        for item in inputs:
+            func(item)
+        elapsed = timeit.default_timer() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compiled postprocessing with replace_all/replace_at chains")
+    parser.add_argument('--rules', type=int, action='append', help="rule counts to measure (default 3, 10, 30, 100)")
+    parser.add_argument('--iterations', type=int, default=2000, help="calls per measurement (default 2000)")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements per case, the best is kept (default 5)")
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="fixtures directory")
+    parser.add_argument('--kodi', default=mock_kodi_path, help="directory with the Kodi shim modules")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    setup_kodi(args.kodi)
+    details, page = load_scenes(args.fixtures)
+    inputs = [('details', lambda: copy.deepcopy(details)), ('search_x20', lambda: copy.deepcopy(page))]
+
+    print("=" * 60)
+    print("Metadata Stash Addon - Postprocess Benchmark")
+    print("=" * 60)
+    print("{} iterations, best of {}\n".format(args.iterations, args.repeat))
+    print("{:<12} {:>6} {:>12} {:>12} {:>12} {:>9}".format(
+        'input', 'rules', 'chain us', 'compiled us', 'cow us', 'speedup'))
+
+    results = []
+    for rule_count in args.rules or DEFAULT_RULES:
+        urls, studio_map, tags = make_rules(rule_count)
+        chain = chain_postprocess(urls, studio_map, tags)
+        compiled = compiled_postprocess(urls, studio_map, tags)
+        for name, make_input in inputs:
+            if name == 'search_x20':
+                cases = [lambda obj: [chain(o) for o in obj], compiled,
+                         lambda obj: compiled(obj, copy=True)]
+            else:
+                cases = [chain, compiled, lambda obj: compiled(obj, copy=True)]
+            expected = cases[0](make_input())
+            for case in cases[1:]:
+                if case(make_input()) != expected:
+                    print("error: compiled result differs from the chain for {} with {} rules".format(
+                        name, rule_count))
+                    return 1
+            timings = [measure(case, make_input, args.iterations, args.repeat) for case in cases]
+            row = {'input': name, 'rules': rule_count, 'chain_us': timings[0], 'compiled_us': timings[1],
+                   'cow_us': timings[2], 'speedup': timings[0] / timings[1] if timings[1] else None}
+            results.append(row)
+            print("{input:<12} {rules:>6} {chain_us:>12.1f} {compiled_us:>12.1f} {cow_us:>12.1f} {speedup:>8.1f}x".format(
+                **row))
+
+    if args.output:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {'iterations': args.iterations, 'repeat': args.repeat},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("\nReport written to {}".format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Scraper Benchmarks - Search and details workloads against local stand-ins
+This benchmark works outside of Kodi, using the mock_kodi shims
+
+Starts the stand-in servers from standin_server.py, points StashScraper,
+AyloAPI, the Aylo adapters, AEBNScraper and WebImageSearch at them and
+runs every workload for a number of iterations, optionally from several
+threads. Reports p50/p95/p99 latency, throughput, request counts and bytes
+transferred per workload.
+
+Usage:
+    python tools/benchmark_scrapers.py [--iterations 50] [--concurrency 4]
+    python tools/benchmark_scrapers.py --latency 40 --jitter 20 --error-rate 0.05
+    python tools/benchmark_scrapers.py --workload stash_search --output bench.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+tools_path = os.path.dirname(os.path.abspath(__file__))
+base_path = os.path.dirname(tools_path)
+addon_path = os.path.join(base_path, 'metadata.stash.python')
+python_path = os.path.join(addon_path, 'python')
+mock_kodi_path = os.path.join(python_path, 'mock_kodi')
+
+sys.path.insert(0, tools_path)
+from standin_server import StandInServer, FIXTURES_DIR  # noqa: E402
+
+
+def setup_kodi(kodi_path):
+    """Make the addon and the Kodi shim modules importable"""
+    sys.path.insert(0, python_path)
+    sys.path.insert(0, kodi_path)
+    try:
+        from addondev import support
+        if hasattr(support, 'initializer'):
+            support.initializer(addon_path)
+    except ImportError:
+        pass  # other Kodi shims need no initialization
+
+
+def is_error(result):
+    return not result or (isinstance(result, dict) and 'error' in result)
+
+
+# ----------------------------
+# Workloads
+# ----------------------------
+def build_workloads(server, cache_dir, live_redirects=False):
+    """Map of workload name -> callable returning the scraper result"""
+    from scraper_settings import SettingsSnapshot
+    from lib.stashscraper.stash import StashScraper
+    from lib.stashscraper.aebn import AEBNScraper
+    from lib.stashscraper.web_image_search import WebImageSearch
+    from lib.stashscraper.brazzers_adapter import BrazzersScraper
+    from lib.stashscraper.fakehub_adapter import FakeHubScraper
+    from lib.stashscraper.czechhunter_adapter import CzechHunterScraper
+    from lib.stashscraper.gaywire_adapter import GayWireScraper
+    from lib.stashscraper.primalfetish_adapter import PrimalFetishScraper
+    from lib.AyloAPI import AyloAPI, scenes_from_ids
+    from lib.stashscraper.FakeHub import fakehub
+    from lib.AyloAPI.catalog import SceneCatalog
+
+    # Every Aylo client (module-level and adapter-owned) uses the class attribute
+    AyloAPI.API_BASE = server.url('aylo') + '/v2'
+    WebImageSearch.GOOGLE_API_URL = server.url('google') + '/customsearch/v1'
+    WebImageSearch.BING_API_URL = server.url('bing') + '/v7.0/images/search'
+
+    if not live_redirects:
+        # GayWire resolves scene URLs with a HEAD request to gaywire.com, which
+        # no stand-in can answer; skip it to keep the benchmark offline
+        from lib.stashscraper import GayWire, gaywire_adapter
+        GayWire.redirect = gaywire_adapter.redirect = lambda url: url
+
+    # Fewest retries StashScraper allows (0 means its default of 3); an
+    # injected Stash error costs one retry delay before it is reported
+    settings = SettingsSnapshot({'connection_timeout': 10, 'max_retries': 1})
+    stash = StashScraper(server.url('stash'), '', settings)
+    aylo = AyloAPI()
+    aebn = AEBNScraper(server.url('aebn'))
+    images = WebImageSearch(cache_dir=os.path.join(cache_dir, 'image_cache'), google_api_key='key',
+                            google_cx='cx', bing_api_key='key',
+                            search_db=os.path.join(cache_dir, 'image_searches.db'))
+    adapters = [('brazzers', BrazzersScraper()), ('fakehub', FakeHubScraper()),
+                ('czechhunter', CzechHunterScraper()), ('gaywire', GayWireScraper()),
+                ('primalfetish', PrimalFetishScraper(settings))]
+
+    def uncached(func):
+        """Details workloads measure the API, not the AyloAPI scene cache"""
+        def run():
+            AyloAPI.clear_scene_cache()
+            return func()
+        return run
+
+    def unsearched(func):
+        """Image search workloads measure the search APIs, not the search cache"""
+        def run():
+            images.searches.clear()
+            return func()
+        return run
+
+    def batch(func):
+        """Batch workloads fail when any of the scenes failed"""
+        def run():
+            results = func()
+            return next((r for r in results.values() if is_error(r)), results)
+        return run
+
+    # Local mirror for the catalog workloads, synced once up front
+    catalog = SceneCatalog(os.path.join(cache_dir, 'aylo_catalog.db'))
+    catalog.sync(aylo, AyloAPI.DOMAIN_MAP['brazzers'])
+
+    def with_catalog(func):
+        """Only the catalog workloads see the mirror"""
+        def run():
+            AyloAPI.attach_catalog(catalog)
+            try:
+                return func()
+            finally:
+                AyloAPI.attach_catalog(None)
+        return run
+
+    aylo_ids = [str(4000001 + i) for i in range(20)]
+    workloads = [
+        ('stash_search', lambda: stash.search('Example Scene')),
+        ('stash_details', lambda: stash.get_details('1')),
+        ('aylo_search', lambda: aylo.search_scenes('Example', ['brazzers'])),
+        ('aylo_details', uncached(lambda: aylo.get_scene('4000001'))),
+        ('aylo_details_x20', uncached(lambda: [aylo.get_scene(i) for i in aylo_ids][-1])),
+        ('aylo_batch_x20', uncached(batch(lambda: aylo.get_scenes(aylo_ids)))),
+        ('aylo_details_cached', lambda: aylo.get_scene('4000001')),
+        ('aylo_catalog_search', with_catalog(lambda: aylo.search_scenes('Example', ['brazzers']))),
+        ('aylo_catalog_details', with_catalog(uncached(lambda: aylo.get_scene('4000001')))),
+    ]
+    for name, adapter in adapters:
+        workloads.append(('{}_search'.format(name), lambda a=adapter: a.search('Example')))
+        workloads.append(('{}_details'.format(name), uncached(lambda a=adapter: a.get_details('4000001'))))
+    workloads.append(('fakehub_batch_x20', uncached(batch(lambda: scenes_from_ids(aylo_ids, postprocess=fakehub)))))
+    workloads += [
+        ('aebn_search', lambda: aebn.search('Example')),
+        ('aebn_details', lambda: aebn.get_details('900001')),
+        ('google_images', unsearched(lambda: images.search_images('Example Scene', 5, 'google'))),
+        ('bing_images', unsearched(lambda: images.search_images('Example Scene', 5, 'bing'))),
+        ('google_images_cached', lambda: images.search_images('Example Scene', 5, 'google')),
+        ('bing_images_cached', lambda: images.search_images('Example Scene', 5, 'bing')),
+    ]
+    return workloads
+
+
+# ----------------------------
+# Measurement
+# ----------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_workload(func, iterations, concurrency):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [iterations]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.time()
+            try:
+                failed = is_error(func())
+            except Exception:
+                failed = True
+            elapsed = (time.time() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+    start = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.time() - start
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'errors': errors[0],
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'throughput_per_s': round(iterations / wall, 2) if wall else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against local stand-in servers")
+    parser.add_argument('--iterations', type=int, default=50, help="calls per workload (default 50)")
+    parser.add_argument('--concurrency', type=int, default=1, help="threads per workload (default 1)")
+    parser.add_argument('--warmup', type=int, default=2, help="untimed calls per workload (default 2)")
+    parser.add_argument('--workload', action='append', help="only run these workloads")
+    parser.add_argument('--latency', type=float, default=0, help="stand-in latency per request in ms")
+    parser.add_argument('--jitter', type=float, default=0, help="random extra latency up to this many ms")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests failed by the stand-ins")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for jitter and errors")
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="fixtures directory")
+    parser.add_argument('--kodi', default=mock_kodi_path, help="directory with the Kodi shim modules")
+    parser.add_argument('--live-redirects', action='store_true',
+                        help="let the GayWire adapter resolve redirects against gaywire.com")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    setup_kodi(args.kodi)
+    cache_dir = tempfile.mkdtemp(prefix='stash_bench_')
+
+    try:
+        return benchmark(args, parser, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def benchmark(args, parser, cache_dir):
+    server = StandInServer(fixtures_dir=args.fixtures, latency_ms=args.latency, jitter_ms=args.jitter,
+                           error_rate=args.error_rate, seed=args.seed).start()
+    workloads = build_workloads(server, cache_dir, args.live_redirects)
+    if args.workload:
+        unknown = set(args.workload) - set(name for name, _ in workloads)
+        if unknown:
+            parser.error("unknown workload(s): {}".format(', '.join(sorted(unknown))))
+        workloads = [(name, func) for name, func in workloads if name in args.workload]
+
+    print("=" * 60)
+    print("Metadata Stash Addon - Scraper Benchmarks")
+    print("=" * 60)
+    print("{} iterations, concurrency {}, latency {}+{} ms, error rate {}\n".format(
+        args.iterations, args.concurrency, args.latency, args.jitter, args.error_rate))
+    print("{:<22} {:>8} {:>8} {:>8} {:>9} {:>6} {:>6} {:>10}".format(
+        'workload', 'p50 ms', 'p95 ms', 'p99 ms', 'ops/s', 'errors', 'reqs', 'bytes'))
+
+    results = {}
+    for name, func in workloads:
+        for _ in range(args.warmup):
+            try:
+                func()
+            except Exception:
+                pass
+        server.reset_stats()
+        result = run_workload(func, args.iterations, args.concurrency)
+        stats = server.stats()
+        result['requests'] = sum(s['requests'] for s in stats.values())
+        result['bytes_in'] = sum(s['bytes_in'] for s in stats.values())
+        result['bytes_out'] = sum(s['bytes_out'] for s in stats.values())
+        result['unmatched'] = sum(s['unmatched'] for s in stats.values())
+        results[name] = result
+        print("{:<22} {:>8.2f} {:>8.2f} {:>8.2f} {:>9.1f} {:>6} {:>6} {:>10}".format(
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['throughput_per_s'],
+            result['errors'], result['requests'], result['bytes_out']))
+        if result['unmatched']:
+            print("  warning: {} requests had no fixture".format(result['unmatched']))
+
+    server.stop()
+
+    if args.output:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {'iterations': args.iterations, 'concurrency': args.concurrency,
+                       'latency_ms': args.latency, 'jitter_ms': args.jitter, 'error_rate': args.error_rate},
+            'workloads': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("\nReport written to {}".format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""
+Startup Profiling - Measure cold and warm scraper invocations
+This profiling works outside of Kodi, using the mock_kodi shims
+
+Every action is run in a fresh interpreter started with ``-X importtime``:
+the first call is the cold start (nothing imported yet), the following calls
+reuse the interpreter like Kodi's reuselanguageinvoker does. A local Stash
+stand-in answers the GraphQL requests, so no real Stash is needed.
+
+Usage:
+    python tools/profile_startup.py [--runs 5] [--warm 3] [--output report.json]
+    python tools/profile_startup.py --compare baseline.json --output report.json
+
+The report is JSON and can be kept as a baseline; --compare exits with
+status 1 when a cold start got slower than --max-regression percent.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import re
+import runpy
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:  # py2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_path = os.path.join(base_path, 'metadata.stash.python')
+python_path = os.path.join(addon_path, 'python')
+entry_point = os.path.join(python_path, 'scraper.py')
+mock_kodi_path = os.path.join(python_path, 'mock_kodi')
+
+MARK = '--- profile_startup: begin ---'
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+# Actions and the plugin query strings Kodi would call them with
+ACTIONS = {
+    'find': '?action=find&title=Example+Scene&year=2020',
+    'getdetails': '?action=getdetails&url=%7B%22stash%22%3A%221%22%7D',
+}
+
+# Settings applied for every run; the stash_url is filled in by the child
+DEFAULT_SETTINGS = {
+    'scraper_type': 'stash',
+    'connection_timeout': '10',
+    'max_retries': '1',
+    'create_nfo': 'false',
+    'enable_web_image_search': 'false',
+    'enable_frame_extraction': 'false',
+    'enable_rapidgator': 'false',
+    'auto_scrape_external': 'false',
+}
+
+SCENE = {
+    "id": "1", "title": "Example Scene", "details": "Plot", "date": "2020-01-01",
+    "rating100": 80, "paths": {"screenshot": "http://127.0.0.1/screenshot/1.jpg"},
+    "files": [{"duration": 1800.0, "path": "/media/example.mp4"}],
+    "studio": {"name": "Example Studio"},
+    "performers": [{"name": "Performer", "image_path": "http://127.0.0.1/performer/1"}],
+    "tags": [{"name": "Tag"}],
+}
+
+
+# ----------------------------
+# Child process
+# ----------------------------
+class StashStandIn(BaseHTTPRequestHandler):
+    """Minimal Stash GraphQL endpoint answering findScenes/findScene"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        if 'findScenes' in body.get('query', ''):
+            data = {"findScenes": {"count": 1, "scenes": [SCENE]}}
+        else:
+            data = {"findScene": SCENE}
+        payload = json.dumps({"data": data}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FirstConnect(object):
+    """Records when the addon opens its first outgoing connection"""
+
+    def __init__(self):
+        self.at = None
+        self._connect = socket.socket.connect
+        recorder = self
+
+        def connect(sock, address):
+            if recorder.at is None:
+                recorder.at = time.time()
+            return recorder._connect(sock, address)
+
+        socket.socket.connect = connect
+
+    def reset(self):
+        self.at = None
+
+
+def apply_settings(settings):
+    """Set addon settings through whatever Kodi shim is on sys.path"""
+    import xbmcaddon
+    mock_data = getattr(xbmcaddon, 'mock_data', None)
+    if mock_data is not None:
+        mock_data.setdefault('setting', {}).update(settings)
+    else:
+        addon = xbmcaddon.Addon()
+        for key, value in settings.items():
+            addon.setSetting(key, value)
+
+
+def run_child(args):
+    """Run one action cold, then ``args.warm`` more times in the same interpreter"""
+    sys.path.insert(0, python_path)
+    sys.path.insert(0, args.kodi)
+    try:
+        from addondev import support
+        if hasattr(support, 'initializer'):
+            support.initializer(addon_path)
+    except ImportError:
+        pass  # other Kodi shims need no initialization
+
+    server = HTTPServer(('127.0.0.1', 0), StashStandIn)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    connect = FirstConnect()
+
+    settings = dict(DEFAULT_SETTINGS)
+    settings['stash_url'] = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    settings.update(args.setting or {})
+
+    # Kodi's own modules are built in, so the shims are not part of the profile
+    apply_settings(settings)
+    sys.stderr.write(MARK + '\n')
+    sys.stderr.flush()
+
+    runs = []
+    for _ in range(1 + args.warm):
+        connect.reset()
+        sys.argv = [entry_point, '1', ACTIONS[args.action]]
+        start = time.time()
+        runpy.run_path(entry_point, run_name='__main__')
+        end = time.time()
+        runs.append({
+            'total_ms': round((end - start) * 1000, 3),
+            'first_request_ms': round((connect.at - start) * 1000, 3) if connect.at else None,
+        })
+
+    server.shutdown()
+    print(json.dumps(runs))
+
+
+# ----------------------------
+# Parent process
+# ----------------------------
+def parse_importtime(stderr):
+    """Per-module import costs logged after the start mark"""
+    lines = stderr.splitlines()
+    if MARK in lines:
+        lines = lines[lines.index(MARK) + 1:]
+    modules = {}
+    total = 0
+    for line in lines:
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        modules[name] = {'self_us': self_us, 'cumulative_us': cumulative_us}
+        if len(indent) <= 1:
+            total += cumulative_us
+    return total, modules
+
+
+def median(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.0
+
+
+def profile_action(action, args):
+    cold, warm, import_totals, modules = [], [], [], {}
+    for _ in range(args.runs):
+        cmd = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--child',
+               '--action', action, '--warm', str(args.warm), '--kodi', args.kodi]
+        for key, value in (args.setting or {}).items():
+            cmd += ['--setting', '{}={}'.format(key, value)]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, cwd=python_path)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError("{} run failed:\n{}".format(action, err[-2000:]))
+        runs = json.loads(out.strip().splitlines()[-1])
+        cold.append(runs[0])
+        warm.extend(runs[1:])
+        total, run_modules = parse_importtime(err)
+        import_totals.append(total)
+        for name, cost in run_modules.items():
+            modules.setdefault(name, []).append(cost['cumulative_us'])
+
+    slowest = sorted(((median(v), k) for k, v in modules.items()), reverse=True)[:args.top]
+    return {
+        'cold': {
+            'total_ms': median([r['total_ms'] for r in cold]),
+            'first_request_ms': median([r['first_request_ms'] for r in cold]),
+            'import_ms': round(median(import_totals) / 1000.0, 3),
+        },
+        'warm': {
+            'total_ms': median([r['total_ms'] for r in warm]),
+            'first_request_ms': median([r['first_request_ms'] for r in warm]),
+        },
+        'imports': [{'module': name, 'cumulative_us': us} for us, name in slowest],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=base_path,
+                                       universal_newlines=True).strip()
+    except Exception:
+        return None
+
+
+def compare(report, baseline, max_regression):
+    """Print cold-start deltas against a baseline report; returns False on regression"""
+    ok = True
+    for action, result in sorted(report['actions'].items()):
+        old = baseline.get('actions', {}).get(action)
+        if not old:
+            continue
+        for metric in ('total_ms', 'first_request_ms', 'import_ms'):
+            new_value, old_value = result['cold'].get(metric), old['cold'].get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) * 100.0 / old_value
+            # Ignore sub-millisecond noise on very small values
+            regressed = change > max_regression and new_value - old_value > 1.0
+            print("  {:<12} cold {:<17} {:>9.1f} ms -> {:>9.1f} ms  {:+6.1f}%{}".format(
+                action, metric, old_value, new_value, change, '  REGRESSION' if regressed else ''))
+            ok = ok and not regressed
+    return ok
+
+
+def parse_setting(value):
+    key, _, setting = value.partition('=')
+    return key, setting
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile scraper startup under mock Kodi")
+    parser.add_argument('--runs', type=int, default=5, help="cold runs per action (default 5)")
+    parser.add_argument('--warm', type=int, default=3, help="warm runs after each cold run (default 3)")
+    parser.add_argument('--action', choices=sorted(ACTIONS), action='append',
+                        help="action to profile (default: all)")
+    parser.add_argument('--setting', type=parse_setting, action='append',
+                        help="override an addon setting, e.g. --setting scraper_type=stash")
+    parser.add_argument('--kodi', default=mock_kodi_path, help="directory with the Kodi shim modules")
+    parser.add_argument('--top', type=int, default=25, help="slowest imports to report (default 25)")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help="allowed cold-start slowdown in percent (default 20)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.setting = dict(args.setting or [])
+
+    if args.child:
+        args.action = args.action[0]
+        run_child(args)
+        return 0
+
+    print("=" * 60)
+    print("Metadata Stash Addon - Startup Profile")
+    print("=" * 60)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': args.runs,
+        'warm': args.warm,
+        'actions': {},
+    }
+    for action in args.action or sorted(ACTIONS):
+        result = profile_action(action, args)
+        report['actions'][action] = result
+        print("\n{}".format(action))
+        print("  cold: {total_ms} ms total, {import_ms} ms imports, first request after {first_request_ms} ms".format(
+            **result['cold']))
+        print("  warm: {total_ms} ms total, first request after {first_request_ms} ms".format(**result['warm']))
+        for entry in result['imports'][:5]:
+            print("    {:>9} us  {}".format(entry['cumulative_us'], entry['module']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("\nReport written to {}".format(args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("\nCompared with {} (revision {}):".format(args.compare, baseline.get('revision')))
+        if not compare(report, baseline, args.max_regression):
+            print("\nStartup regression above {}%".format(args.max_regression))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+Soak Test - Many actions through one reused interpreter
+This test works outside of Kodi, using the mock_kodi shims
+
+addon.xml enables reuselanguageinvoker, so everything the addon keeps at
+module level (pooled scrapers, SSL contexts, sessions, caches, metrics)
+lives for the whole Kodi session. This harness runs the addon entry point
+tens of thousands of times in one interpreter, the way Kodi does, against
+the stand-in servers from standin_server.py (started in a separate process
+so their own objects and sockets are not counted).
+
+After a warmup it samples RSS, live object counts, open file descriptors,
+sockets and threads, and fails when any of them grew beyond its threshold.
+The fastest growing object types are listed to point at the leak.
+
+Every action's outcome is checked too, through the xbmcplugin calls the
+addon makes: a getdetails must resolve with succeeded=True, a find must end
+its directory, and neither may raise or hit the entry point's catch-all
+error handler. Any failed action fails the run.
+
+Usage:
+    python tools/soak_invoker.py [--actions 20000] [--sample-every 500]
+    python tools/soak_invoker.py --scraper stash --scraper aebn --max-rss-mb 8 --output soak.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import gc
+import json
+import os
+import runpy
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from urllib.parse import quote
+except ImportError:  # py2
+    from urllib import quote
+
+tools_path = os.path.dirname(os.path.abspath(__file__))
+base_path = os.path.dirname(tools_path)
+addon_path = os.path.join(base_path, 'metadata.stash.python')
+python_path = os.path.join(addon_path, 'python')
+entry_point = os.path.join(python_path, 'scraper.py')
+mock_kodi_path = os.path.join(python_path, 'mock_kodi')
+
+sys.path.insert(0, tools_path)
+from profile_startup import apply_settings  # noqa: E402
+
+# uniqueid each scraper answers getdetails for from the stand-in fixtures
+SCENE_IDS = collections.OrderedDict([
+    ('stash', '1'),
+    ('aebn', '900001'),
+    ('brazzers', '4000001'),
+    ('fakehub', '4000001'),
+    ('czechhunter', '4000001'),
+    ('gaywire', '4000001'),
+    ('primalfetish', '4000001'),
+])
+
+THRESHOLDS = (
+    ('rss_kib', 'max_rss_mb', 1024.0, 'RSS'),
+    ('objects', 'max_objects', 1, 'live objects'),
+    ('fds', 'max_fds', 1, 'open file descriptors'),
+    ('sockets', 'max_sockets', 1, 'open sockets'),
+    ('threads', 'max_threads', 1, 'threads'),
+)
+
+
+# ----------------------------
+# Process measurements
+# ----------------------------
+def rss_kib():
+    """Current resident set size; the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (IOError, OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def open_descriptors():
+    """(file descriptors, sockets) open in this process, or (None, None)"""
+    for fd_dir in ('/proc/self/fd', '/dev/fd'):
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        sockets = 0
+        for fd in fds:
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)).startswith('socket:'):
+                    sockets += 1
+            except OSError:
+                pass
+        return len(fds), sockets if fd_dir == '/proc/self/fd' else None
+    return None, None
+
+
+def type_counts():
+    counts = collections.Counter()
+    for obj in gc.get_objects():
+        counts[type(obj).__module__ + '.' + type(obj).__name__] += 1
+    return counts
+
+
+def sample(actions, started):
+    gc.collect()
+    fds, sockets = open_descriptors()
+    return {
+        'actions': actions,
+        'elapsed_s': round(time.time() - started, 1),
+        'rss_kib': rss_kib(),
+        'objects': len(gc.get_objects()),
+        'fds': fds,
+        'sockets': sockets,
+        'threads': threading.active_count(),
+    }
+
+
+# ----------------------------
+# Stand-ins and addon setup
+# ----------------------------
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_standins(latency_ms):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(tools_path, 'standin_server.py'),
+                             '--port', str(port), '--latency', str(latency_ms)],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc, 'http://127.0.0.1:{}'.format(port)
+        except socket.error:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("stand-in servers did not start on port {}".format(port))
+
+
+def setup_addon(kodi_path, standin_url, find_scraper, nfo_path):
+    sys.path.insert(0, python_path)
+    sys.path.insert(0, kodi_path)
+    try:
+        from addondev import support
+        if hasattr(support, 'initializer'):
+            support.initializer(addon_path)
+    except ImportError:
+        pass  # other Kodi shims need no initialization
+
+    apply_settings({
+        'scraper_type': find_scraper,
+        'stash_url': standin_url + '/stash',
+        'aebn_url': standin_url + '/aebn',
+        'connection_timeout': '10',
+        'max_retries': '1',
+        'create_nfo': 'true' if nfo_path else 'false',
+        'nfo_path': nfo_path or '',
+        'enable_web_image_search': 'false',
+        'enable_frame_extraction': 'false',
+        'enable_rapidgator': 'false',
+        'auto_scrape_external': 'false',
+    })
+
+    # Backends without a URL setting are pointed at the stand-ins directly
+    from lib.AyloAPI import AyloAPI
+    from lib.stashscraper import GayWire, gaywire_adapter
+    AyloAPI.API_BASE = standin_url + '/aylo/v2'
+    # GayWire resolves scene URLs with a HEAD request to gaywire.com
+    GayWire.redirect = gaywire_adapter.redirect = lambda url: url
+
+
+def action_argv(index, scrapers, find_every):
+    if find_every and index % find_every == 0:
+        return '?action=find&title=Example+Scene&year=2020'
+    scraper = scrapers[index % len(scrapers)]
+    return '?action=getdetails&url={}'.format(quote(json.dumps({scraper: SCENE_IDS[scraper]})))
+
+
+class ActionRecorder(object):
+    """
+    Records what each action reported to Kodi by wrapping xbmcplugin's
+    setResolvedUrl, addDirectoryItem and endOfDirectory, and counts the
+    actions that failed, per action type.
+    """
+
+    MAX_EXAMPLES = 10
+
+    def __init__(self):
+        import xbmcplugin
+        from lib.py_common import metrics
+        self._errors = metrics.ERRORS
+        self.counts = collections.defaultdict(collections.Counter)  # action -> outcome -> count
+        self.examples = []
+        self._current = None
+        for name in ('setResolvedUrl', 'addDirectoryItem', 'endOfDirectory'):
+            setattr(xbmcplugin, name, self._wrap(name, getattr(xbmcplugin, name)))
+
+    def _wrap(self, name, original):
+        def record(*args, **kwargs):
+            if self._current is not None:
+                if name == 'setResolvedUrl':
+                    succeeded = kwargs['succeeded'] if 'succeeded' in kwargs else args[1]
+                    self._current['resolved'] = bool(succeeded)
+                elif name == 'addDirectoryItem':
+                    self._current['items'] += 1
+                else:
+                    self._current['ended'] = True
+            return original(*args, **kwargs)
+        return record
+
+    def _caught_errors(self):
+        # run() logs and swallows what escapes an action; it counts them here
+        return sum(sample['value'] for sample in self._errors.samples() if sample['labels'].get('stage') == 'run')
+
+    def run(self, query):
+        action = 'find' if 'action=find' in query else 'getdetails'
+        self._current = {'resolved': None, 'items': 0, 'ended': False}
+        caught = self._caught_errors()
+        error = None
+        try:
+            sys.argv = [entry_point, '1', query]
+            runpy.run_path(entry_point, run_name='__main__')
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+        outcome = self._current
+        self._current = None
+
+        if error is None and self._caught_errors() > caught:
+            error = 'error caught in run()'
+        if error is not None:
+            result = 'exception'
+        elif action == 'getdetails':
+            result = {True: 'ok', False: 'not_succeeded', None: 'not_resolved'}[outcome['resolved']]
+        else:
+            result = 'ok' if outcome['ended'] else 'directory_not_ended'
+        self.counts[action][result] += 1
+        if result != 'ok' and len(self.examples) < self.MAX_EXAMPLES:
+            self.examples.append({'query': query, 'result': result, 'error': error})
+
+    def failed(self):
+        return dict((action, sum(n for result, n in counts.items() if result != 'ok'))
+                    for action, counts in self.counts.items()
+                    if any(result != 'ok' for result in counts))
+
+
+# ----------------------------
+# Evaluation
+# ----------------------------
+def evaluate(baseline, final, args):
+    """List of (name, growth, limit, failed)"""
+    results = []
+    for key, option, scale, name in THRESHOLDS:
+        if baseline[key] is None or final[key] is None:
+            continue
+        growth = final[key] - baseline[key]
+        limit = getattr(args, option)
+        results.append((name, growth / scale, limit, growth / scale > limit))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak the reused language invoker against the stand-in servers")
+    parser.add_argument('--actions', type=int, default=20000, help="measured actions (default 20000)")
+    parser.add_argument('--warmup', type=int, default=500, help="actions before the baseline sample (default 500)")
+    parser.add_argument('--sample-every', type=int, default=500, help="actions between samples (default 500)")
+    parser.add_argument('--scraper', action='append', choices=list(SCENE_IDS),
+                        help="scrapers to call getdetails on in turn (default: all)")
+    parser.add_argument('--find-scraper', default='stash', choices=list(SCENE_IDS) + ['federated'],
+                        help="scraper_type used for find actions (default stash)")
+    parser.add_argument('--find-every', type=int, default=3,
+                        help="every Nth action is a find, the rest getdetails; 0 for no finds (default 3)")
+    parser.add_argument('--no-nfo', action='store_true', help="do not write NFO files")
+    parser.add_argument('--latency', type=float, default=0, help="stand-in latency per request in ms")
+    parser.add_argument('--max-rss-mb', type=float, default=16, help="allowed RSS growth in MB (default 16)")
+    parser.add_argument('--max-objects', type=int, default=2000, help="allowed live object growth (default 2000)")
+    parser.add_argument('--max-fds', type=int, default=4, help="allowed file descriptor growth (default 4)")
+    parser.add_argument('--max-sockets', type=int, default=2, help="allowed socket growth (default 2)")
+    parser.add_argument('--max-threads', type=int, default=2, help="allowed thread growth (default 2)")
+    parser.add_argument('--top', type=int, default=15, help="fastest growing object types to list (default 15)")
+    parser.add_argument('--kodi', default=mock_kodi_path, help="directory with the Kodi shim modules")
+    parser.add_argument('--output', help="write samples and results as JSON to this file")
+    args = parser.parse_args()
+    scrapers = args.scraper or list(SCENE_IDS)
+
+    proc, standin_url = start_standins(args.latency)
+    nfo_path = None if args.no_nfo else tempfile.mkdtemp(prefix='stash_soak_nfo_')
+    try:
+        setup_addon(args.kodi, standin_url, args.find_scraper, nfo_path)
+        recorder = ActionRecorder()
+
+        print("=" * 60)
+        print("Metadata Stash Addon - Reused Invoker Soak Test")
+        print("=" * 60)
+        print("{} warmup + {} actions, getdetails on {}, find every {}\n".format(
+            args.warmup, args.actions, ', '.join(scrapers), args.find_every or '-'))
+
+        started = time.time()
+        for index in range(args.warmup):
+            recorder.run(action_argv(index, scrapers, args.find_every))
+        baseline = sample(0, started)
+        baseline_types = type_counts()
+        samples = [baseline]
+
+        print("{:>8} {:>9} {:>10} {:>9} {:>5} {:>7} {:>7}".format(
+            'actions', 'seconds', 'rss KiB', 'objects', 'fds', 'sockets', 'threads'))
+        row = "{actions:>8} {elapsed_s:>9} {rss_kib:>10} {objects:>9} {fds!s:>5} {sockets!s:>7} {threads:>7}"
+        print(row.format(**baseline))
+        for done in range(1, args.actions + 1):
+            recorder.run(action_argv(args.warmup + done, scrapers, args.find_every))
+            if done % args.sample_every == 0 or done == args.actions:
+                samples.append(sample(done, started))
+                print(row.format(**samples[-1]))
+        final = samples[-1]
+        growth_types = (type_counts() - baseline_types).most_common(args.top)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    results = evaluate(baseline, final, args)
+    print("\nGrowth after {} actions:".format(args.actions))
+    for name, growth, limit, failed in results:
+        print("  {:<22} {:>+10.1f}  (limit {}){}".format(name, growth, limit, '  FAIL' if failed else ''))
+    if growth_types:
+        print("\nFastest growing object types:")
+        for name, count in growth_types:
+            print("  {:>+8}  {}".format(count, name))
+
+    failed_actions = recorder.failed()
+    print("\nAction outcomes (warmup included):")
+    for action in sorted(recorder.counts):
+        print("  {:<22} {}{}".format(action, ', '.join('{} {}'.format(n, result) for result, n in
+                                                         sorted(recorder.counts[action].items())),
+                                     '  FAIL' if action in failed_actions else ''))
+    for example in recorder.examples:
+        print("  {result}: {query}{}".format(' ({})'.format(example['error']) if example['error'] else '',
+                                              **example))
+
+    if args.output:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {'actions': args.actions, 'warmup': args.warmup, 'scrapers': scrapers,
+                       'find_every': args.find_every, 'latency_ms': args.latency},
+            'samples': samples,
+            'growth': dict((name, growth) for name, growth, _, _ in results),
+            'failed': [name for name, _, _, failed in results if failed],
+            'growing_types': growth_types,
+            'actions': dict((action, dict(counts)) for action, counts in recorder.counts.items()),
+            'failed_actions': failed_actions,
+            'failed_examples': recorder.examples,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("\nReport written to {}".format(args.output))
+
+    if failed_actions or any(failed for _, _, _, failed in results):
+        print("\nSoak test FAILED")
+        return 1
+    print("\nSoak test passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
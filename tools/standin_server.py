@@ -0,0 +1,305 @@
+"""
+Stand-in Servers - Local replacements for every scraper backend
+This server works outside of Kodi and needs no network access
+
+Serves recorded fixtures for the Stash GraphQL API, the Aylo site-api, AEBN
+HTML pages and the Google/Bing image search APIs, each under its own path
+prefix on one local port:
+
+    /stash   -> stash_url            (POST /graphql)
+    /aylo    -> AyloAPI.API_BASE     (GET /v2/scenes, /v2/scenes/<id>, ...)
+    /aebn    -> aebn_url             (GET /search/scenes/page/1, /content/<id>)
+    /google  -> WebImageSearch.GOOGLE_API_URL
+    /bing    -> WebImageSearch.BING_API_URL
+
+Latency and errors can be injected to see how the scrapers behave on slow or
+flaky backends. With --record, requests no fixture answers are forwarded to
+the real backend and the responses are saved as new fixtures.
+
+Usage:
+    python tools/standin_server.py [--port 8765] [--latency 50] [--error-rate 0.05]
+    python tools/standin_server.py --record stash=http://192.168.1.10:9999
+
+Fixture files (tools/fixtures/<backend>.json) hold a list of routes:
+    {"method": "POST", "path": "/graphql", "contains": "findScenes",
+     "status": 200, "content_type": "application/json", "body": {...}}
+``path`` is a regular expression matched against the request path, and
+``contains`` must appear in the request body or query string. Instead of
+``body`` (JSON) a route can give ``body_text`` or ``body_file`` (relative
+to the fixtures directory). The first matching route wins.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qsl, urlencode
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:  # py2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qsl
+    from urllib import urlencode
+    from urllib2 import Request, urlopen, HTTPError
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BACKENDS = ('stash', 'aylo', 'aebn', 'google', 'bing')
+
+# Request parameters kept in recorded fixtures; API keys and the like are dropped
+RECORDED_PARAMS = ('q', 'query', 'search')
+GRAPHQL_FIELD = re.compile(r'\{\s*(\w+)')
+
+
+class Route(object):
+    """One recorded response"""
+
+    def __init__(self, data, fixtures_dir):
+        self.data = data
+        self.method = data.get('method', 'GET').upper()
+        self.path = re.compile(data.get('path', '/') + '$')
+        self.contains = data.get('contains', '')
+        self.status = int(data.get('status', 200))
+        self.content_type = data.get('content_type', 'application/json')
+        if 'body' in data:
+            self.body = json.dumps(data['body']).encode('utf-8')
+        elif 'body_file' in data:
+            with open(os.path.join(fixtures_dir, data['body_file']), 'rb') as f:
+                self.body = f.read()
+        else:
+            self.body = data.get('body_text', '').encode('utf-8')
+
+    def matches(self, method, path, text):
+        return method == self.method and self.path.match(path) and self.contains in text
+
+
+class Backend(object):
+    """Routes, upstream and counters of one backend"""
+
+    def __init__(self, name, fixtures_dir):
+        self.name = name
+        self.fixtures_dir = fixtures_dir
+        self.fixture_file = os.path.join(fixtures_dir, '{}.json'.format(name))
+        self.routes = []
+        self.upstream = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+        if os.path.exists(self.fixture_file):
+            with open(self.fixture_file) as f:
+                self.routes = [Route(r, fixtures_dir) for r in json.load(f)]
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'errors_injected': 0, 'unmatched': 0}
+
+    def count(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def find(self, method, path, text):
+        for route in self.routes:
+            if route.matches(method, path, text):
+                return route
+        return None
+
+    def record(self, method, path, query, body):
+        """Forward to the upstream backend and keep the response as a fixture"""
+        url = self.upstream.rstrip('/') + path + ('?' + query if query else '')
+        request = Request(url, data=body if method == 'POST' else None,
+                          headers={'Content-Type': 'application/json', 'Accept': '*/*'})
+        try:
+            response = urlopen(request, timeout=60)
+            status = response.getcode()
+        except HTTPError as e:
+            response, status = e, e.code
+        payload = response.read()
+        content_type = response.headers.get('Content-Type', 'application/octet-stream')
+
+        route = {'method': method, 'path': re.escape(path), 'status': status,
+                 'content_type': content_type.split(';')[0]}
+        if method == 'POST' and body:
+            try:
+                field = GRAPHQL_FIELD.search(json.loads(body.decode('utf-8')).get('query', ''))
+                route['contains'] = field.group(1) if field else ''
+            except ValueError:
+                pass
+        elif query:
+            kept = [(k, v) for k, v in parse_qsl(query) if k in RECORDED_PARAMS]
+            if kept:
+                route['contains'] = urlencode(kept[:1])
+        if 'json' in content_type:
+            route['body'] = json.loads(payload.decode('utf-8'))
+        else:
+            body_file = os.path.join(self.name, 'recorded_{}.html'.format(int(time.time() * 1000)))
+            if not os.path.isdir(os.path.join(self.fixtures_dir, self.name)):
+                os.makedirs(os.path.join(self.fixtures_dir, self.name))
+            with open(os.path.join(self.fixtures_dir, body_file), 'wb') as f:
+                f.write(payload)
+            route['body_file'] = body_file
+
+        with self.lock:
+            self.routes.append(Route(route, self.fixtures_dir))
+            with open(self.fixture_file, 'w') as f:
+                json.dump([r.data for r in self.routes], f, indent=2, sort_keys=True)
+        print("Recorded {} {} {} -> {}".format(self.name, method, path, status))
+        return Route(route, self.fixtures_dir)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        server = self.server
+        parts = urlsplit(self.path)
+        prefix, _, rest = parts.path.lstrip('/').partition('/')
+        backend = server.backends.get(prefix)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+
+        if backend is None:
+            return self._send(404, 'text/plain', b'unknown backend')
+
+        backend.count(requests=1, bytes_in=len(body))
+        server.delay()
+
+        if server.error_rate and server.random.random() < server.error_rate:
+            backend.count(errors_injected=1)
+            return self._send(server.error_status, 'text/plain', b'injected error', backend)
+
+        path = '/' + rest
+        text = body.decode('utf-8', 'replace') + '?' + parts.query
+        route = backend.find(method, path, text)
+        if route is None and backend.upstream:
+            route = backend.record(method, path, parts.query, body)
+        if route is None:
+            backend.count(unmatched=1)
+            return self._send(404, 'text/plain', 'no fixture for {} {}'.format(method, path).encode('utf-8'), backend)
+        self._send(route.status, route.content_type, route.body, backend)
+
+    def _send(self, status, content_type, payload, backend=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type + ('; charset=utf-8' if 'text' in content_type else ''))
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        if backend is not None:
+            backend.count(bytes_out=len(payload))
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """
+    All backend stand-ins on one local port.
+
+    Example:
+        server = StandInServer(latency_ms=20, error_rate=0.01).start()
+        scraper = StashScraper(server.url('stash'), '')
+        ...
+        print(server.stats())
+        server.stop()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, fixtures_dir=FIXTURES_DIR, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, error_status=503, seed=None, host='127.0.0.1'):
+        HTTPServer.__init__(self, (host, port), StandInHandler)
+        self.backends = dict((name, Backend(name, fixtures_dir)) for name in BACKENDS)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self._thread = None
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep((self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000.0)
+
+    def url(self, backend):
+        """Base URL to configure a scraper with"""
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/{}'.format(host, port, backend)
+
+    def set_upstream(self, backend, url):
+        """Record unmatched requests for ``backend`` from the real ``url``"""
+        self.backends[backend].upstream = url
+
+    def stats(self):
+        return dict((name, dict(b.stats)) for name, b in self.backends.items())
+
+    def reset_stats(self):
+        for backend in self.backends.values():
+            backend.reset_stats()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_upstream(value):
+    backend, _, url = value.partition('=')
+    if backend not in BACKENDS or not url:
+        raise argparse.ArgumentTypeError("expected BACKEND=URL with BACKEND one of {}".format(', '.join(BACKENDS)))
+    return backend, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in servers for the scraper backends")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="fixtures directory")
+    parser.add_argument('--latency', type=float, default=0, help="added latency per request in ms")
+    parser.add_argument('--jitter', type=float, default=0, help="random extra latency up to this many ms")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, help="random seed for jitter and errors")
+    parser.add_argument('--record', type=parse_upstream, action='append', default=[],
+                        help="forward unmatched requests to BACKEND=URL and save them as fixtures")
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, args.fixtures, args.latency, args.jitter,
+                           args.error_rate, args.error_status, args.seed, args.host)
+    for backend, url in args.record:
+        server.set_upstream(backend, url)
+
+    print("Stand-in servers listening:")
+    for backend in BACKENDS:
+        print("  {:<7} {}{}".format(backend, server.url(backend),
+                                    '  (recording from {})'.format(server.backends[backend].upstream)
+                                    if server.backends[backend].upstream else ''))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""
+Stash Simulator - Synthetic large library behind a local Stash GraphQL API
+This simulator works outside of Kodi and needs no real Stash
+
+Generates a deterministic library of 50k-200k+ scenes and answers the
+GraphQL operations StashScraper uses (findScenes, findScene,
+scrapeSingleScene, sceneUpdate) from it, so search, details, bulk and
+caching behaviour can be measured against library size.
+
+The dataset is shaped like real libraries:
+    - titles come from a small vocabulary plus series numbers, so many
+      scenes share words and some share the exact same title
+    - performer and tag popularity is heavily skewed (a few performers
+      appear in thousands of scenes)
+    - studios belong to networks; image paths look like Stash's own
+
+Scenes are derived from (seed, id) on demand; only a word index is kept in
+memory, so 200k scenes start in a few seconds.
+
+Usage:
+    python tools/stash_simulator.py --scenes 100000 [--port 9999] [--latency 5]
+    python tools/stash_simulator.py --scenes 50000 --export library.jsonl
+
+Then set the addon's stash_url (or StashScraper's) to the printed URL.
+"""
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import json
+import random
+import re
+import sys
+import threading
+import time
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit
+except ImportError:  # py2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit
+
+ADJECTIVES = ['Summer', 'Midnight', 'Secret', 'Golden', 'Wild', 'Private', 'Sweet', 'Hidden', 'Lost',
+              'First', 'Last', 'Perfect', 'Endless', 'Silent', 'Electric', 'Velvet', 'Crimson', 'Lucky',
+              'Forbidden', 'Sunny', 'Late', 'Early', 'Blue', 'Red', 'Young', 'Dirty', 'Little', 'Big']
+NOUNS = ['Nights', 'Affair', 'Encounter', 'Getaway', 'Desire', 'Lessons', 'Dreams', 'Games', 'Party',
+         'Diaries', 'Session', 'Adventure', 'Weekend', 'Holiday', 'Confessions', 'Fantasy', 'Story',
+         'Meeting', 'Escape', 'Roommates', 'Neighbors', 'Vacation', 'Audition', 'Massage', 'Visit']
+PLACES = ['in Paris', 'at the Beach', 'in the City', 'at Home', 'in the Office', 'by the Pool',
+          'in Prague', 'on the Road', 'at the Hotel', 'in the Woods', '', '', '', '', '']
+FIRST_NAMES = ['Anna', 'Bella', 'Chloe', 'Dana', 'Eva', 'Fiona', 'Gina', 'Holly', 'Ivy', 'Jade', 'Kira',
+               'Lena', 'Mia', 'Nina', 'Olivia', 'Paige', 'Quinn', 'Rosa', 'Sofia', 'Tara', 'Uma',
+               'Vera', 'Wendy', 'Xena', 'Yara', 'Zoe', 'Alex', 'Ben', 'Carl', 'Dean', 'Eric', 'Finn']
+LAST_NAMES = ['Stone', 'Rivers', 'Lane', 'Fox', 'Knight', 'Blake', 'Rose', 'Hart', 'Steel', 'Vance',
+              'Monroe', 'Winter', 'Summers', 'Black', 'White', 'Gold', 'Silver', 'Storm', 'Reed', 'Cruz']
+TAGS = ['HD', '4K Available', 'Interview', 'Behind the Scenes', 'Outdoor', 'Indoor', 'Romance', 'Drama',
+        'Comedy', 'Fantasy', 'Roleplay', 'Couples', 'Solo', 'Threesome', 'Group', 'POV', 'Amateur',
+        'Professional', 'Vintage', 'Compilation', 'Short', 'Feature', 'Series', 'Exclusive', 'Parody']
+TAGS += ['Tag {}'.format(n) for n in range(1, 276)]
+NETWORKS = ['Example Network', 'Northern Lights Media', 'Harbor Group', 'Red Oak Holdings', 'Independent']
+
+WORD = re.compile(r'\w+', re.U)
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+ARGUMENTS = re.compile(r'\([^()]*\)')
+SELECTION_TOKEN = re.compile(r'[{}]|[A-Za-z_][A-Za-z0-9_]*')
+
+
+def _skewed(rng, size, skew=1.3):
+    """Index in [0, size) with a heavy head: index 0 is picked most often"""
+    return min(size - 1, int(size * rng.random() ** (skew * 2)))
+
+
+class Library(object):
+    """
+    Deterministic synthetic Stash library.
+
+    ``scene(id)`` rebuilds a scene from the seed, so the full dataset never
+    has to be held in memory; edits made through sceneUpdate are kept as
+    overrides.
+    """
+
+    def __init__(self, scenes=50000, seed=1, base_url='http://localhost:9999'):
+        self.size = scenes
+        self.seed = seed
+        self.base_url = base_url.rstrip('/')
+        self.performers = max(50, scenes // 8)
+        self.studios = max(10, scenes // 200)
+        self.overrides = {}
+        self.lock = threading.Lock()
+
+        started = time.time()
+        self.titles = [None] * (scenes + 1)
+        self.index = {}
+        for scene_id in range(1, scenes + 1):
+            title = self._title(scene_id)
+            self.titles[scene_id] = title
+            for word in set(WORD.findall(title.lower())):
+                self.index.setdefault(word, []).append(scene_id)
+        self.build_seconds = time.time() - started
+
+    # ----------------------------
+    # Generation
+    # ----------------------------
+    def _rng(self, kind, number):
+        return random.Random('{}:{}:{}'.format(self.seed, kind, number))
+
+    def _title(self, scene_id):
+        rng = self._rng('title', scene_id)
+        # Series titles collide on purpose: the same name exists across studios
+        title = '{} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS), rng.choice(PLACES)).strip()
+        if rng.random() < 0.6:
+            title = '{} {}'.format(title, 1 + _skewed(rng, 30))
+        return title
+
+    def performer(self, performer_id):
+        rng = self._rng('performer', performer_id)
+        name = '{} {}'.format(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+        if performer_id > len(FIRST_NAMES) * len(LAST_NAMES):
+            name = '{} {}'.format(name, performer_id)  # keep names unique-ish
+        return {
+            'id': str(performer_id),
+            'stored_id': str(performer_id),
+            'name': name,
+            'image_path': '{}/performer/{}/image?t={}'.format(self.base_url, performer_id, 1600000000 + performer_id),
+        }
+
+    def studio(self, studio_id):
+        rng = self._rng('studio', studio_id)
+        return {
+            'id': str(studio_id),
+            'stored_id': str(studio_id),
+            'name': '{} {}'.format(rng.choice(ADJECTIVES), rng.choice(['Studios', 'Films', 'Media', 'Pictures', 'Productions'])) +
+                    (' {}'.format(studio_id) if studio_id > 40 else ''),
+            'image_path': '{}/studio/{}/image'.format(self.base_url, studio_id),
+            'parent_studio': {'name': NETWORKS[studio_id % len(NETWORKS)]},
+        }
+
+    def scene(self, scene_id):
+        """Full scene record, or None if the id does not exist"""
+        try:
+            scene_id = int(scene_id)
+        except (TypeError, ValueError):
+            return None
+        if not 1 <= scene_id <= self.size:
+            return None
+
+        rng = self._rng('scene', scene_id)
+        performer_count = 1 + _skewed(rng, 6, 0.8)
+        performers = sorted(set(1 + _skewed(rng, self.performers) for _ in range(performer_count)))
+        tags = sorted(set(_skewed(rng, len(TAGS), 0.9) for _ in range(3 + rng.randint(0, 22))))
+        year = 2005 + _skewed(rng, 20, 0.4)
+        width, height = rng.choice([(1920, 1080), (1280, 720), (3840, 2160), (854, 480)])
+        stamp = 1600000000 + scene_id
+        scene = {
+            'id': str(scene_id),
+            'title': self.titles[scene_id],
+            'details': ' '.join(rng.choice(NOUNS + ADJECTIVES).lower() for _ in range(rng.randint(10, 80))).capitalize() + '.',
+            'date': '{:04d}-{:02d}-{:02d}'.format(year, rng.randint(1, 12), rng.randint(1, 28)),
+            'rating100': rng.choice([None, 20, 40, 60, 80, 100]),
+            'code': 'SC-{:06d}'.format(scene_id),
+            'paths': {
+                'screenshot': '{}/scene/{}/screenshot?t={}'.format(self.base_url, scene_id, stamp),
+                'stream': '{}/scene/{}/stream'.format(self.base_url, scene_id),
+            },
+            'files': [{
+                'path': '/media/library/{:03d}/{}.mp4'.format(scene_id % 1000, scene_id),
+                'duration': float(rng.randint(300, 7200)),
+                'video_codec': rng.choice(['h264', 'hevc']),
+                'audio_codec': 'aac',
+                'width': width,
+                'height': height,
+            }],
+            'studio': self.studio(1 + _skewed(rng, self.studios)),
+            'performers': [self.performer(p) for p in performers],
+            'tags': [{'id': str(t + 1), 'stored_id': str(t + 1), 'name': TAGS[t]} for t in tags],
+        }
+        with self.lock:
+            scene.update(self.overrides.get(scene_id, {}))
+        return scene
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def search(self, q, page=1, per_page=25, sort='title', direction='ASC'):
+        """Scenes whose title contains every word of ``q``; returns (count, ids)"""
+        words = WORD.findall((q or '').lower())
+        if words:
+            postings = sorted((self.index.get(w, []) for w in words), key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids.intersection_update(posting)
+        else:
+            ids = range(1, self.size + 1)
+        if sort == 'title':
+            ordered = sorted(ids, key=lambda i: (self.titles[i], i))
+        else:
+            ordered = sorted(ids)
+        if str(direction).upper() == 'DESC':
+            ordered.reverse()
+        if per_page is None or int(per_page) < 0:
+            return len(ordered), ordered
+        start = (max(1, int(page)) - 1) * int(per_page)
+        return len(ordered), ordered[start:start + int(per_page)]
+
+    def update(self, fields):
+        scene_id = int(fields['id'])
+        if not 1 <= scene_id <= self.size:
+            return None
+        changes = {}
+        for key in ('title', 'details', 'date', 'code'):
+            if key in fields:
+                changes[key] = fields[key]
+        if 'studio_id' in fields:
+            changes['studio'] = self.studio(int(fields['studio_id']))
+        if 'performer_ids' in fields:
+            changes['performers'] = [self.performer(int(p)) for p in fields['performer_ids']]
+        if 'tag_ids' in fields:
+            changes['tags'] = [{'id': str(t), 'stored_id': str(t), 'name': TAGS[(int(t) - 1) % len(TAGS)]}
+                               for t in fields['tag_ids']]
+        with self.lock:
+            self.overrides.setdefault(scene_id, {}).update(changes)
+            if 'title' in changes:
+                self._reindex(scene_id, changes['title'])
+        return {'id': str(scene_id)}
+
+    def _reindex(self, scene_id, title):
+        for word in set(WORD.findall(self.titles[scene_id].lower())):
+            posting = self.index.get(word, [])
+            at = bisect.bisect_left(posting, scene_id)
+            if at < len(posting) and posting[at] == scene_id:
+                del posting[at]
+        self.titles[scene_id] = title
+        for word in set(WORD.findall(title.lower())):
+            bisect.insort(self.index.setdefault(word, []), scene_id)
+
+    def scrape(self, scene_id, source):
+        """What a stash-box/TPDB lookup of the scene would return; some scenes have no match"""
+        scene = self.scene(scene_id)
+        if scene is None:
+            return None
+        rng = self._rng('scrape:{}'.format(source), scene_id)
+        if rng.random() < 0.2:
+            return None
+        return {
+            'title': scene['title'],
+            'details': scene['details'],
+            'date': scene['date'],
+            'studio': {'stored_id': scene['studio']['stored_id'], 'name': scene['studio']['name']},
+            'performers': [{'stored_id': p['stored_id'], 'name': p['name']} for p in scene['performers']],
+            'tags': [{'stored_id': t['stored_id'], 'name': t['name']} for t in scene['tags']],
+            'image': scene['paths']['screenshot'],
+        }
+
+    def export(self, fp):
+        for scene_id in range(1, self.size + 1):
+            fp.write(json.dumps(self.scene(scene_id), sort_keys=True))
+            fp.write('\n')
+
+
+# ----------------------------
+# GraphQL
+# ----------------------------
+def parse_selection(query):
+    """
+    Nested field selection of a GraphQL document, e.g.
+    ``{findScene: {id: None, paths: {screenshot: None}}}``. Enough for the
+    queries the addon sends: arguments, variables and aliases are ignored.
+    """
+    text = STRING.sub('""', query)
+    while ARGUMENTS.search(text):
+        text = ARGUMENTS.sub('', text)
+    body = text[text.index('{'):] if '{' in text else ''
+    stack = [{}]
+    last = None
+    for token in SELECTION_TOKEN.findall(body):
+        if token == '{':
+            if last is None:
+                stack.append(stack[-1])  # the operation's own braces
+            else:
+                stack[-1][last] = {}
+                stack.append(stack[-1][last])
+            last = None
+        elif token == '}':
+            stack.pop()
+            last = None
+        else:
+            stack[-1][token] = None
+            last = token
+    return stack[0]
+
+
+def project(value, selection):
+    """Keep only the selected fields, like a GraphQL server does"""
+    if selection is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, selection) for item in value]
+    return dict((key, project(value.get(key), sub)) for key, sub in selection.items())
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        started = time.time()
+        try:
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            data = server.execute(request.get('query', ''), request.get('variables') or {})
+            payload = {'data': data}
+        except Exception as e:
+            payload = {'errors': [{'message': str(e)}]}
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000.0)
+        body = json.dumps(payload).encode('utf-8')
+        server.count(self._operation(payload), length, len(body), time.time() - started)
+        self._send(200, 'application/json', body)
+
+    def do_GET(self):
+        # Screenshots and performer/studio images: small fixed-size payloads
+        path = urlsplit(self.path).path
+        if path == '/stats':
+            return self._send(200, 'application/json', json.dumps(self.server.stats()).encode('utf-8'))
+        if re.match(r'^/(scene/\d+/screenshot|performer/\d+/image|studio/\d+/image)$', path):
+            body = self.server.image_bytes
+            self.server.count('image', 0, len(body), 0)
+            return self._send(200, 'image/jpeg', body)
+        self._send(404, 'text/plain', b'not found')
+
+    @staticmethod
+    def _operation(payload):
+        data = payload.get('data') or {}
+        return next(iter(data), 'error')
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StashSimulator(ThreadingMixIn, HTTPServer):
+    """
+    Local Stash GraphQL server backed by a synthetic ``Library``.
+
+    Example:
+        simulator = StashSimulator(scenes=100000).start()
+        scraper = StashScraper(simulator.url, '')
+        scraper.search('Summer Nights')
+    """
+
+    daemon_threads = True
+
+    def __init__(self, scenes=50000, seed=1, port=0, host='127.0.0.1', latency_ms=0, image_size=24 * 1024):
+        HTTPServer.__init__(self, (host, port), SimulatorHandler)
+        self.url = 'http://{}:{}'.format(host, self.server_address[1])
+        self.library = Library(scenes, seed, self.url)
+        self.latency_ms = latency_ms
+        self.image_bytes = b'\xff\xd8\xff\xe0' + b'\0' * max(0, image_size - 6) + b'\xff\xd9'
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def execute(self, query, variables):
+        library = self.library
+        data = {}
+        for field, selection in parse_selection(query).items():
+            if field == 'findScenes':
+                find = variables.get('filter') or {}
+                count, ids = library.search(find.get('q'), find.get('page', 1), find.get('per_page', 25),
+                                            find.get('sort', 'title'), find.get('direction', 'ASC'))
+                value = {'count': count, 'scenes': [library.scene(i) for i in ids]}
+            elif field == 'findScene':
+                value = library.scene(variables.get('id'))
+            elif field == 'scrapeSingleScene':
+                source = variables.get('source') or {}
+                scene_id = (variables.get('input') or {}).get('scene_id')
+                scraped = library.scrape(scene_id, source.get('scraper_id') or 'stash-box')
+                value = [scraped] if scraped else []
+            elif field == 'sceneUpdate':
+                value = library.update(variables.get('input') or {})
+            else:
+                raise ValueError("Cannot query field '{}' on the simulator".format(field))
+            data[field] = project(value, selection)
+        return data
+
+    def count(self, operation, bytes_in, bytes_out, seconds):
+        with self._lock:
+            stats = self._stats.setdefault(operation, {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0})
+            stats['requests'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['seconds'] += seconds
+
+    def stats(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic large-library Stash server")
+    parser.add_argument('--scenes', type=int, default=50000, help="library size (default 50000)")
+    parser.add_argument('--seed', type=int, default=1, help="dataset seed (default 1)")
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--latency', type=float, default=0, help="added latency per GraphQL request in ms")
+    parser.add_argument('--image-size', type=int, default=24 * 1024, help="bytes per served image")
+    parser.add_argument('--export', help="write the generated scenes as JSON lines and exit")
+    args = parser.parse_args()
+
+    simulator = StashSimulator(args.scenes, args.seed, args.port, args.host, args.latency, args.image_size)
+    library = simulator.library
+    print("Generated {} scenes, {} performers, {} studios, {} index words in {:.1f}s".format(
+        library.size, library.performers, library.studios, len(library.index), library.build_seconds))
+
+    if args.export:
+        with open(args.export, 'w') as f:
+            library.export(f)
+        print("Exported to {}".format(args.export))
+        simulator.server_close()
+        return 0
+
+    print("Stash simulator listening on {}  (stats: {}/stats)".format(simulator.url, simulator.url))
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server_close()
+        print(json.dumps(simulator.stats(), indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
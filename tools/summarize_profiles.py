@@ -0,0 +1,202 @@
+"""
+Profile Summary - Aggregate the captures written by scraper_profiler.py
+This tool works outside of Kodi and needs no addon code
+
+Reads the ``.pstats``, ``.tracemalloc`` and ``.alloc.txt`` files the addon
+writes to ``profiles/`` in its profile directory when profiling is armed
+(hidden ``profile_next_runs`` setting or ``STASH_SCRAPER_PROFILE=N``) and
+prints, per action:
+
+- the captures with their duration and peak traced memory
+- the functions with the most cumulative and own time, summed over captures
+- the source lines holding the most memory at the end of the action
+
+Usage:
+    python tools/summarize_profiles.py ~/.kodi/userdata/addon_data/metadata.stash.python/profiles
+    python tools/summarize_profiles.py PROFILES --action getdetails --top 30 --all
+    python tools/summarize_profiles.py PROFILES --output summary.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import fnmatch
+import json
+import os
+import pstats
+import re
+import sys
+
+try:
+    import tracemalloc
+except ImportError:  # py2
+    tracemalloc = None
+
+CAPTURE_NAME = re.compile(r'^(\d{8}-\d{6}(?:-\d{3})?)_([a-z]+)(?:_(.*))?$')
+ALLOC_HEADER = re.compile(r'^(duration|traced memory):\s*([\d.]+)\s*(?:ms|KiB current,\s*([\d.]+) KiB peak)')
+
+# Path fragments that identify the addon's own code
+ADDON_MARKERS = ('metadata.stash.python', 'scraper', 'stashscraper', 'AyloAPI', 'py_common')
+
+
+def find_captures(paths):
+    """Map of capture base path -> {'stamp', 'action', 'label', 'files'}"""
+    captures = {}
+    for path in paths:
+        names = [os.path.join(path, n) for n in os.listdir(path)] if os.path.isdir(path) else [path]
+        for name in names:
+            base, ext = os.path.splitext(name)
+            if ext == '.txt' and base.endswith('.alloc'):
+                base, ext = base[:-len('.alloc')], '.alloc.txt'
+            if ext not in ('.pstats', '.tracemalloc', '.alloc.txt'):
+                continue
+            m = CAPTURE_NAME.match(os.path.basename(base))
+            if not m:
+                continue
+            entry = captures.setdefault(base, {'stamp': m.group(1), 'action': m.group(2),
+                                               'label': m.group(3) or '', 'files': {}})
+            entry['files'][ext] = name
+    return captures
+
+
+def read_alloc_header(path):
+    """Duration and peak memory from an .alloc.txt report"""
+    result = {}
+    with open(path) as f:
+        for line in f:
+            m = ALLOC_HEADER.match(line)
+            if not m:
+                continue
+            if m.group(1) == 'duration':
+                result['duration_ms'] = float(m.group(2))
+            else:
+                result['current_kib'] = float(m.group(2))
+                result['peak_kib'] = float(m.group(3))
+    return result
+
+
+def short_path(filename):
+    for marker in ('metadata.stash.python' + os.sep + 'python' + os.sep, 'site-packages' + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+def is_addon(filename):
+    return any(marker in filename for marker in ADDON_MARKERS) and 'summarize_profiles' not in filename
+
+
+def top_functions(files, top, include_all):
+    """Functions by cumulative and by own time, summed over the .pstats files"""
+    stats = pstats.Stats(*files)
+    rows = []
+    for (filename, line, func), (_, calls, own, cumulative, _) in stats.stats.items():
+        if not include_all and not is_addon(filename):
+            continue
+        rows.append({'function': '{}:{}({})'.format(short_path(filename), line, func),
+                     'calls': calls, 'own_ms': own * 1000, 'cumulative_ms': cumulative * 1000})
+    by_cumulative = sorted(rows, key=lambda r: -r['cumulative_ms'])[:top]
+    by_own = sorted(rows, key=lambda r: -r['own_ms'])[:top]
+    return by_cumulative, by_own
+
+
+def top_allocations(files, top, include_all):
+    """Source lines holding the most memory, averaged over the snapshots"""
+    if tracemalloc is None or not files:
+        return []
+    totals = {}
+    for path in files:
+        snapshot = tracemalloc.Snapshot.load(path)
+        for stat in snapshot.statistics('lineno'):
+            frame = stat.traceback[0]
+            if not include_all and not is_addon(frame.filename):
+                continue
+            key = '{}:{}'.format(short_path(frame.filename), frame.lineno)
+            size, count = totals.get(key, (0, 0))
+            totals[key] = (size + stat.size, count + stat.count)
+    rows = [{'line': key, 'avg_kib': size / 1024.0 / len(files), 'avg_blocks': count / float(len(files))}
+            for key, (size, count) in totals.items()]
+    return sorted(rows, key=lambda r: -r['avg_kib'])[:top]
+
+
+def summarize(captures, top, include_all):
+    actions = {}
+    for base, capture in sorted(captures.items()):
+        actions.setdefault(capture['action'], []).append((base, capture))
+
+    report = {}
+    for action, items in sorted(actions.items()):
+        runs = []
+        for base, capture in items:
+            run = {'capture': os.path.basename(base), 'label': capture['label']}
+            if '.alloc.txt' in capture['files']:
+                run.update(read_alloc_header(capture['files']['.alloc.txt']))
+            runs.append(run)
+        pstat_files = [c['files']['.pstats'] for _, c in items if '.pstats' in c['files']]
+        snapshot_files = [c['files']['.tracemalloc'] for _, c in items if '.tracemalloc' in c['files']]
+        by_cumulative, by_own = top_functions(pstat_files, top, include_all) if pstat_files else ([], [])
+        report[action] = {
+            'captures': runs,
+            'top_cumulative': by_cumulative,
+            'top_own': by_own,
+            'top_allocations': top_allocations(snapshot_files, top, include_all),
+        }
+    return report
+
+
+def print_report(report):
+    for action, result in sorted(report.items()):
+        print("=" * 60)
+        print("{} ({} captures)".format(action, len(result['captures'])))
+        print("=" * 60)
+        for run in result['captures']:
+            print("  {:<40} {:>9} ms  peak {:>8} KiB".format(
+                run['capture'], run.get('duration_ms', '?'), run.get('peak_kib', '?')))
+
+        for title, key, column in (("By cumulative time (summed)", 'top_cumulative', 'cumulative_ms'),
+                                   ("By own time (summed)", 'top_own', 'own_ms')):
+            if result[key]:
+                print("\n  {}:".format(title))
+                for row in result[key]:
+                    print("  {:>10.1f} ms {:>8} calls  {}".format(row[column], row['calls'], row['function']))
+
+        if result['top_allocations']:
+            print("\n  Memory held at the end of the action (average per capture):")
+            for row in result['top_allocations']:
+                print("  {:>10.1f} KiB {:>8.0f} blocks  {}".format(row['avg_kib'], row['avg_blocks'], row['line']))
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize profiles captured by the addon")
+    parser.add_argument('paths', nargs='+', help="profiles directories or capture files")
+    parser.add_argument('--action', action='append', help="only these actions (e.g. getdetails)")
+    parser.add_argument('--label', help="only captures whose scene/title label matches this glob")
+    parser.add_argument('--top', type=int, default=20, help="rows per table (default 20)")
+    parser.add_argument('--all', action='store_true', help="include Python and Kodi code, not just the addon")
+    parser.add_argument('--output', help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    captures = find_captures(args.paths)
+    if args.action:
+        captures = dict((k, v) for k, v in captures.items() if v['action'] in args.action)
+    if args.label:
+        captures = dict((k, v) for k, v in captures.items() if fnmatch.fnmatch(v['label'], args.label))
+    if not captures:
+        print("No captures found in {}".format(', '.join(args.paths)))
+        return 1
+
+    report = summarize(captures, args.top, args.all)
+    print_report(report)
+    if tracemalloc is None:
+        print("tracemalloc is not available on this Python; allocation tables skipped")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("Summary written to {}".format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
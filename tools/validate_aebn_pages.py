@@ -0,0 +1,140 @@
+"""
+AEBN page parsing validation
+Checks that AEBNScraper keeps every performer and every embedded JSON blob
+of a page, using the mock_kodi shims and no network access
+
+The details page lists three performers with the tags in a second JSON blob
+after the cast; the search page splits its results over two blobs. Both are
+served by a local stand-in, then the stand-in fixtures from
+standin_server.py are scraped as well.
+
+Usage:
+    python tools/validate_aebn_pages.py [--kodi DIR]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import tempfile
+import shutil
+
+tools_path = os.path.dirname(os.path.abspath(__file__))
+base_path = os.path.dirname(tools_path)
+python_path = os.path.join(base_path, 'metadata.stash.python', 'python')
+mock_kodi_path = os.path.join(python_path, 'mock_kodi')
+
+sys.path.insert(0, tools_path)
+from benchmark_scrapers import setup_kodi  # noqa: E402
+from standin_server import StandInServer, FIXTURES_DIR  # noqa: E402
+
+PERFORMERS = ['Alice One', 'Bea Two', 'Cleo Three']
+
+DETAILS_PAGE = """<!DOCTYPE html>
+<html><head>
+<title>Three Stars - AEBN</title>
+<meta property="og:title" content="Three Stars">
+<meta property="og:image" content="https://pic.example.com/1/poster.jpg">
+<meta property="og:description" content="A scene with three performers.">
+</head><body>
+<dl><dt>Release Date:</dt><dd>May 1, 2019</dd></dl>
+<script>window.__STATE__ = {"content": {"title": "Three Stars", "duration": 32}};</script>
+<ul class="stars">
+<li><a href="/search/stars/page/1?starId=1">Alice One</a></li>
+<li><a href="/search/stars/page/1?starId=2">Bea Two</a></li>
+<li><a href="/search/stars/page/1?starId=3">Cleo Three</a></li>
+</ul>
+<script>window.__INITIAL_STATE__ = {"content": {"categories": [{"name": "Drama"}, {"name": "Outdoor"}]}};</script>
+</body></html>
+"""
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><title>Search - AEBN</title></head><body>
+<script>window.__STATE__ = {"results": [{"id": 1, "title": "First"}, {"id": 2, "title": "Second"}]};</script>
+<script>window.__INITIAL_STATE__ = {"data": [{"id": 3, "title": "Third"}]};</script>
+</body></html>
+"""
+
+
+def check(description, actual, expected):
+    if actual == expected:
+        print("? {}".format(description))
+        return True
+    print("? {}: expected {!r}, got {!r}".format(description, expected, actual))
+    return False
+
+
+def validate_pages(fixtures_dir):
+    """Multi-performer details page and multi-blob search page"""
+    from lib.stashscraper.aebn import AEBNScraper
+
+    with open(os.path.join(fixtures_dir, 'aebn', 'content.html'), 'w') as f:
+        f.write(DETAILS_PAGE)
+    with open(os.path.join(fixtures_dir, 'aebn', 'search.html'), 'w') as f:
+        f.write(SEARCH_PAGE)
+
+    server = StandInServer(fixtures_dir=fixtures_dir).start()
+    try:
+        aebn = AEBNScraper(server.url('aebn'))
+        # Small reads, so the page arrives in many chunks as it would from AEBN
+        aebn.CHUNK_SIZE = 64
+        details = aebn.get_details('1')
+        search = aebn.search('Three')
+    finally:
+        server.stop()
+
+    results = [
+        check("details keep every performer", [member.name for member in details.cast], PERFORMERS),
+        check("details keep tags from a later JSON blob", list(details.tags), ['Drama', 'Outdoor']),
+        check("search merges results from every JSON blob", [scene['id'] for scene in search], ['1', '2', '3']),
+    ]
+    return results
+
+
+def validate_fixtures():
+    """The stand-in fixtures used by the benchmarks"""
+    from lib.stashscraper.aebn import AEBNScraper
+
+    server = StandInServer().start()
+    try:
+        aebn = AEBNScraper(server.url('aebn'))
+        aebn.CHUNK_SIZE = 64
+        details = aebn.get_details('900001')
+        search = aebn.search('Example')
+    finally:
+        server.stop()
+
+    return [
+        check("fixture details keep every performer", len(details.cast), 3),
+        check("fixture details keep every tag", len(details.tags), 7),
+        check("fixture search returns every result", len(search), 20),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate AEBN page parsing against local stand-in pages")
+    parser.add_argument('--kodi', default=mock_kodi_path, help="directory with the Kodi shim modules")
+    args = parser.parse_args()
+    setup_kodi(args.kodi)
+
+    print("=" * 60)
+    print("AEBN Page Parsing - Validation")
+    print("=" * 60)
+
+    fixtures_dir = tempfile.mkdtemp(prefix='aebn_pages_')
+    try:
+        os.makedirs(os.path.join(fixtures_dir, 'aebn'))
+        shutil.copy(os.path.join(FIXTURES_DIR, 'aebn.json'), fixtures_dir)
+        results = validate_pages(fixtures_dir)
+    finally:
+        shutil.rmtree(fixtures_dir, ignore_errors=True)
+    results += validate_fixtures()
+
+    print("\nPassed: {}".format(sum(results)))
+    print("Failed: {}".format(len(results) - sum(results)))
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
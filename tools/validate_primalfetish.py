@@ -75,9 +75,8 @@ def test_scraper_registration():
             content = f.read()
         
         checks = [
-            ('PrimalFetishScraper import', 'from lib.stashscraper.primalfetish_adapter import PrimalFetishScraper'),
-            ('get_active_scraper registration', "scraper_type == 'primalfetish'"),
-            ('get_details registration', "'primalfetish' in input_uniqueids")
+            ('registry entry', "SCRAPERS.register('primalfetish', 'lib.stashscraper.primalfetish_adapter', 'PrimalFetishScraper'"),
+            ('scraper builder', 'def _build_primalfetish(')
         ]
         
         all_passed = True
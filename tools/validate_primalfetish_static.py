@@ -69,7 +69,7 @@ def main():
     pf_path = os.path.join(addon_path, 'python', 'lib', 'stashscraper', 'PrimalFetish.py')
     results.append(check_file_contains(
         pf_path,
-        ['def primalfetish(obj, _):', 'primalfetish', 'primalfetishnetwork', 'scene_search'],
+        ['def primalfetish(obj, api):', 'primalfetish', 'primalfetishnetwork', 'scene_search'],
         'PrimalFetish.py'
     ))
     
@@ -97,9 +97,8 @@ def main():
     results.append(check_file_contains(
         scraper_path,
         [
-            'from lib.stashscraper.primalfetish_adapter import PrimalFetishScraper',
-            "scraper_type == 'primalfetish'",
-            "'primalfetish' in input_uniqueids"
+            "SCRAPERS.register('primalfetish', 'lib.stashscraper.primalfetish_adapter', 'PrimalFetishScraper'",
+            'def _build_primalfetish('
         ],
         'scraper.py'
     ))